@@ -0,0 +1,72 @@
+"""Import-time regression check for the kudos package.
+
+Imports each lightweight module in a fresh interpreter and fails if it
+pulls in a heavy dependency or takes longer than the time limit:
+
+    python -m benchmarks.check_imports --max-seconds 1.0
+
+Model code (easy_llm, constrained_decoding) must only be imported when a
+model is actually loaded.
+"""
+import argparse
+import json
+import subprocess
+import sys
+from typing import Any, Dict, List
+
+LIGHT_MODULES = [
+    "kudos",
+    "kudos.post_manager",
+    "kudos.post_storage",
+    "kudos.scoring",
+    "kudos.llm_wrapper",
+    "kudos.posting_interface",
+    "kudos.game_manager",
+    "kudos.game_simulator",
+    "kudos.experiment_runner",
+    "kudos.model_server",
+    "kudos.instrumentation",
+]
+
+HEAVY_MODULES = ["torch", "transformers", "pydantic", "networkx", "pandas", "sklearn", "sentence_transformers"]
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "heavy": [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+
+def check_module(module: str) -> Dict[str, Any]:
+    """Import module in a fresh interpreter and report its import time and heavy dependencies."""
+    completed = subprocess.run([sys.executable, "-c", _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+                               capture_output=True, text=True, check=True)
+    return {"module": module, **json.loads(completed.stdout.strip().splitlines()[-1])}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Check that kudos modules import without heavy dependencies.")
+    parser.add_argument("--max-seconds", type=float, default=1.0, help="Maximum import time per module")
+    args = parser.parse_args()
+
+    failures: List[str] = []
+    for module in LIGHT_MODULES:
+        result = check_module(module)
+        print(f"{module:<28}{result['seconds']:>8.3f}s  {', '.join(result['heavy'])}")
+        if result['heavy']:
+            failures.append(f"{module} imports {', '.join(result['heavy'])}")
+        if result['seconds'] > args.max_seconds:
+            failures.append(f"{module} took {result['seconds']:.2f}s to import")
+    if failures:
+        print("\nImport regressions:")
+        for failure in failures:
+            print(f"  {failure}")
+        return 1
+    print("\nAll modules import without heavy dependencies.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,321 @@
+"""Synthetic-load benchmarks for storage, scoring and round execution.
+
+Runs on CPU with a StubBackend, so no model is needed:
+
+    python -m benchmarks.run_benchmarks --scale default --output results.json
+    python -m benchmarks.run_benchmarks --baseline results.json
+
+Each result row reports the time per operation at one workload size. Rows
+are compared against a stored baseline by benchmark name and parameters,
+and the growth of the time per operation with workload size is reported as
+a log-log scaling exponent, which makes O(n) per-operation costs (O(n^2)
+over a long run) visible on small workloads already.
+"""
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from kudos.fileutil import write_json_atomic
+from kudos.game_rules import game_rules
+from kudos.game_simulator import GameSimulator
+from kudos.interaction_graph import InteractionGraph
+from kudos.llm_backends import StubBackend
+from kudos.misc import create_graph_and_get_centrality
+from kudos.post_manager import PostManager
+from kudos.scoring import UserScoreTracker
+
+from .workloads import GROUPS, make_posts, make_users
+
+SCALES = {
+    'smoke': {'posts': [1_000, 5_000], 'users': [10, 100], 'players': [6]},
+    'default': {'posts': [1_000, 10_000, 100_000], 'users': [10, 100, 1_000], 'players': [10, 40]},
+    'full': {'posts': [1_000, 10_000, 100_000, 1_000_000], 'users': [10, 100, 1_000, 10_000],
+             'players': [10, 40, 160]},
+}
+
+# Largest preloaded store per engine; the JSON store rewrites the whole file on every change
+STORE_LIMITS = {'json': 100_000, 'jsonl': 1_000_000, 'sqlite': 1_000_000}
+STORE_EXTENSIONS = {'json': '.json', 'jsonl': '.jsonl', 'sqlite': '.db'}
+
+# Runs of read-only measurements, the fastest is reported to reduce noise
+REPEAT = 3
+
+
+def _timed(function: Callable[[], Any], repeat: int = 1) -> float:
+    """Return the fastest of repeat runs; only side-effect free functions should be repeated."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _row(benchmark: str, params: Dict[str, Any], seconds: float, ops: int) -> Dict[str, Any]:
+    return {'benchmark': benchmark, 'params': params, 'seconds': seconds, 'ops': ops,
+            'per_op_us': 1e6 * seconds / ops}
+
+
+def _preload(path: str, storage: str, posts: List[Dict[str, Any]]) -> None:
+    """Write posts into a new store the fast way for its engine."""
+    if storage == 'jsonl':
+        write_json_atomic(f"{path}.snapshot.json", {'posts': posts})
+    elif storage == 'json':
+        write_json_atomic(path, posts)
+    else:
+        PostManager(path, storage).store.add_posts(posts)
+
+
+def bench_storage(sizes: List[int], rng: random.Random) -> List[Dict[str, Any]]:
+    """PostManager open, insert, like, lookup and round query cost at increasing store sizes."""
+    rows = []
+    for storage, limit in STORE_LIMITS.items():
+        for size in sizes:
+            if size > limit:
+                continue
+            # 100 posts per round at every size, so round queries should not slow down as the store grows
+            posts = make_posts(size, num_users=1_000, num_rounds=max(10, size // 100))
+            rounds = posts[-1]['round']
+            writes = 10 if storage == 'json' else 200
+            params = {'storage': storage, 'size': size}
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, f"posts{STORE_EXTENSIONS[storage]}")
+                _preload(path, storage, posts)
+                del posts
+
+                manager = None
+
+                def open_store() -> None:
+                    nonlocal manager
+                    manager = PostManager(path, storage)
+                    manager.get_post_by_id(1)
+                rows.append(_row('storage.open', params, _timed(open_store), 1))
+
+                def insert() -> None:
+                    for i in range(writes):
+                        manager.add_post(f"benchmark post {i}", f"user{i % 1_000}", rounds, "Casual users")
+                rows.append(_row('storage.insert', params, _timed(insert), writes))
+
+                def like() -> None:
+                    for i in range(writes):
+                        manager.like_post(rng.randint(1, size), f"liker{i}")
+                rows.append(_row('storage.like', params, _timed(like), writes))
+
+                def lookup() -> None:
+                    for _ in range(1_000):
+                        manager.get_post_by_id(rng.randint(1, size))
+                rows.append(_row('storage.lookup', params, _timed(lookup, REPEAT), 1_000))
+
+                def round_query() -> None:
+                    for _ in range(20):
+                        manager.get_posts_by_round(rng.randint(1, rounds))
+                rows.append(_row('storage.round_query', params, _timed(round_query, REPEAT), 20))
+                if hasattr(manager.store, 'close'):
+                    manager.store.close()
+    return rows
+
+
+def bench_centrality(sizes: List[int]) -> List[Dict[str, Any]]:
+    """Centrality of a round's posts: networkx rebuild versus the incremental InteractionGraph."""
+    rows = []
+    for size in sizes:
+        posts = make_posts(size, num_users=min(10_000, max(10, size // 10)), num_rounds=1)
+        params = {'size': size}
+        rows.append(_row('centrality.networkx', params,
+                         _timed(lambda: create_graph_and_get_centrality(posts), REPEAT), 1))
+        rows.append(_row('centrality.incremental_build', params,
+                         _timed(lambda: InteractionGraph.from_posts(posts), REPEAT), size))
+        graph = InteractionGraph.from_posts(posts)
+        rows.append(_row('centrality.top_5_percent', params,
+                         _timed(lambda: graph.top(max(1, len(graph) // 20)), REPEAT), 1))
+    return rows
+
+
+def bench_scoring(user_counts: List[int], rng: random.Random, num_rounds: int = 20) -> List[Dict[str, Any]]:
+    """UserScoreTracker updates and queries with increasing numbers of users."""
+    rows = []
+    for num_users in user_counts:
+        users = make_users(num_users)
+        user_groups = {user['username']: user['group'] for user in users}
+        params = {'users': num_users}
+        tracker = UserScoreTracker()
+        rows.append(_row('scoring.add_users', params,
+                         _timed(lambda: [tracker.add_user(user['username']) for user in users]), num_users))
+
+        updates = 20 * num_users
+
+        def add_points() -> None:
+            for _ in range(updates):
+                tracker.add_points(users[rng.randrange(num_users)]['username'], 1, rng.randint(1, num_rounds))
+        rows.append(_row('scoring.add_points', params, _timed(add_points), updates))
+        rows.append(_row('scoring.get_scores', params, _timed(tracker.get_scores, REPEAT), 1))
+        rows.append(_row('scoring.leaderboard', params, _timed(lambda: tracker.leaderboard(10), REPEAT), 1))
+        rows.append(_row('scoring.group_scores', params, _timed(lambda: tracker.group_scores(user_groups), REPEAT), 1))
+
+        posts = make_posts(10 * num_users, num_users, num_rounds=1, users=users)
+        rows.append(_row('scoring.centrality_points', params,
+                         _timed(lambda: tracker.centrality_points(posts, 1)), len(posts)))
+    return rows
+
+
+def bench_rounds(player_counts: List[int], num_rounds: int = 3) -> List[Dict[str, Any]]:
+    """Full GameSimulator rounds with a StubBackend; one row per round to expose growth over rounds."""
+    rows = []
+    for num_players in player_counts:
+        for storage in ('json', 'jsonl', 'sqlite'):
+            with tempfile.TemporaryDirectory() as directory:
+                backend = StubBackend(seed=0, field_choices={'dominant_group': list(GROUPS)})
+                with contextlib.redirect_stdout(io.StringIO()):
+                    simulator = GameSimulator(
+                        GROUPS, "Benchmark network", game_rules, num_ai_players=num_players,
+                        posts_file=os.path.join(directory, f"posts{STORE_EXTENSIONS[storage]}"),
+                        backend=backend, seed=0
+                    )
+                actions = num_players * simulator.actions_per_user
+                for round_number in range(1, num_rounds + 1):
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        seconds = _timed(lambda: simulator.run_simulation(
+                            num_rounds=round_number, min_delay=0, max_delay=0, pause_between_rounds=False))
+                    rows.append(_row('rounds.round', {'players': num_players, 'storage': storage,
+                                                      'round': round_number}, seconds, actions))
+    return rows
+
+
+def _key(row: Dict[str, Any]) -> str:
+    return row['benchmark'] + json.dumps(row['params'], sort_keys=True)
+
+
+def scaling_exponents(rows: List[Dict[str, Any]]) -> Dict[str, float]:
+    """Fit per-operation time ~ size^k for each benchmark and fixed other parameters.
+
+    Returns:
+        Exponent k by benchmark and parameters; about 0 means constant cost per
+        operation, about 1 means it grows linearly with the workload
+    """
+    series: Dict[str, List[Tuple[float, float]]] = {}
+    for row in rows:
+        params = dict(row['params'])
+        size_name = next((name for name in ('size', 'users', 'players') if name in params), None)
+        if size_name is None or row['per_op_us'] <= 0:
+            continue
+        size = params.pop(size_name)
+        name = f"{row['benchmark']} {json.dumps(params, sort_keys=True)}"
+        series.setdefault(name, []).append((math.log(size), math.log(row['per_op_us'])))
+    exponents = {}
+    for name, points in series.items():
+        if len({x for x, _ in points}) < 2:
+            continue
+        mean_x = sum(x for x, _ in points) / len(points)
+        mean_y = sum(y for _, y in points) / len(points)
+        exponents[name] = (sum((x - mean_x) * (y - mean_y) for x, y in points)
+                           / sum((x - mean_x) ** 2 for x, _ in points))
+    return exponents
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float,
+            exponent_tolerance: float) -> List[str]:
+    """Return descriptions of results slower than the baseline beyond the tolerances."""
+    regressions = []
+    baseline_rows = {_key(row): row for row in baseline['results']}
+    for row in results['results']:
+        reference = baseline_rows.get(_key(row))
+        if reference is None:
+            continue
+        ratio = row['per_op_us'] / reference['per_op_us'] if reference['per_op_us'] else float('inf')
+        if ratio > 1 + tolerance:
+            regressions.append(f"{row['benchmark']} {row['params']}: {ratio:.2f}x baseline "
+                               f"({row['per_op_us']:.1f} vs {reference['per_op_us']:.1f} us/op)")
+    for name, exponent in results['scaling'].items():
+        reference = baseline.get('scaling', {}).get(name)
+        if reference is not None and exponent > reference + exponent_tolerance:
+            regressions.append(f"{name}: scaling exponent {exponent:.2f}, baseline {reference:.2f}")
+    return regressions
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Run the Kudos synthetic-load benchmarks.")
+    parser.add_argument("--scale", choices=sorted(SCALES), default='smoke', help="Workload sizes to run")
+    parser.add_argument("--only", nargs="+", choices=['storage', 'centrality', 'scoring', 'rounds'],
+                        help="Benchmark groups to run (default: all)")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare against results previously written with --output")
+    parser.add_argument("--tolerance", type=float, default=0.5,
+                        help="Allowed slowdown per operation relative to the baseline (0.5 = 50%%)")
+    parser.add_argument("--exponent-tolerance", type=float, default=0.3,
+                        help="Allowed increase of a scaling exponent relative to the baseline")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    scale = SCALES[args.scale]
+    groups = args.only or ['storage', 'centrality', 'scoring', 'rounds']
+    rng = random.Random(args.seed)
+    rows: List[Dict[str, Any]] = []
+    for group in groups:
+        print(f"Running {group} benchmarks...", file=sys.stderr)
+        if group == 'storage':
+            rows += bench_storage(scale['posts'], rng)
+        elif group == 'centrality':
+            rows += bench_centrality(scale['posts'])
+        elif group == 'scoring':
+            rows += bench_scoring(scale['users'], rng)
+        else:
+            rows += bench_rounds(scale['players'])
+
+    results = {
+        'meta': {
+            'scale': args.scale,
+            'groups': groups,
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'time': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        'results': rows,
+        'scaling': scaling_exponents(rows),
+    }
+
+    print(f"{'benchmark':<30}{'params':<48}{'us/op':>14}")
+    for row in rows:
+        params = ", ".join(f"{name}={value}" for name, value in row['params'].items())
+        print(f"{row['benchmark']:<30}{params:<48}{row['per_op_us']:>14.1f}")
+    print(f"\n{'scaling exponent':<78}{'k':>14}")
+    for name, exponent in results['scaling'].items():
+        print(f"{name:<78}{exponent:>14.2f}")
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r') as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, args.tolerance, args.exponent_tolerance)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("\nNo regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+import random
+from typing import Any, Dict, List, Optional
+
+GROUPS = {
+    "Casual users": "Regular social media users sharing daily content.",
+    "Political activists": "Users who are politically active.",
+    "Conspiracy theorists": "Users who believe in conspiracy theories.",
+    "Commercial spammers": "Accounts promoting products or services.",
+}
+
+_WORDS = [
+    "honestly", "this", "is", "wild", "lol", "cannot", "believe", "people", "still", "think",
+    "that", "news", "today", "vibes", "thread", "wake", "up", "deal", "check", "out",
+]
+
+
+def make_users(num_users: int) -> List[Dict[str, str]]:
+    """Return players with usernames user0..userN spread evenly over GROUPS."""
+    groups = list(GROUPS)
+    return [{'username': f"user{i}", 'group': groups[i % len(groups)]} for i in range(num_users)]
+
+
+def make_posts(num_posts: int, num_users: int, num_rounds: int = 10, reply_ratio: float = 0.3,
+               mention_ratio: float = 0.2, likes_per_post: float = 2.0, seed: int = 0,
+               users: Optional[List[Dict[str, str]]] = None) -> List[Dict[str, Any]]:
+    """Generate posts shaped like those a long simulation stores.
+
+    Posts get consecutive ids and are spread evenly over the rounds. Replies
+    point to one of the 100 most recent posts, as agents only see recent
+    posts, and mentions name a random user.
+
+    Args:
+        num_posts: Number of posts
+        num_users: Number of distinct authors
+        num_rounds: Number of rounds the posts are spread over
+        reply_ratio: Fraction of posts replying to an earlier post
+        mention_ratio: Fraction of posts mentioning a user
+        likes_per_post: Mean number of likes per post
+        seed: Seed of the generator
+        users: Players as returned by make_users, generated if None
+
+    Returns:
+        Complete post dictionaries
+    """
+    rng = random.Random(seed)
+    users = users or make_users(num_users)
+    posts_per_round = max(1, num_posts // num_rounds)
+    posts = []
+    for post_id in range(1, num_posts + 1):
+        author = users[rng.randrange(len(users))]
+        words = rng.choices(_WORDS, k=rng.randint(4, 14))
+        if rng.random() < mention_ratio:
+            words.append(f"@{users[rng.randrange(len(users))]['username']}")
+        reply_to = None
+        if post_id > 1 and rng.random() < reply_ratio:
+            reply_to = rng.randint(max(1, post_id - 100), post_id - 1)
+        like_count = min(len(users), int(rng.expovariate(1 / likes_per_post))) if likes_per_post else 0
+        posts.append({
+            'message': " ".join(words),
+            'username': author['username'],
+            'poster_group': author['group'],
+            'likes': [user['username'] for user in rng.sample(users, like_count)],
+            'reply_to': reply_to,
+            'post_id': post_id,
+            'is_removed': False,
+            'round': min(num_rounds, (post_id - 1) // posts_per_round + 1),
+            'timestamp': "2025-01-01T00:00:00",
+        })
+    return posts
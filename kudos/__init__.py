@@ -1,21 +1,33 @@
-"""Main Wargame package initialization.
+"""Kudos package initialization.
 
-This package contains the main classes and functions for the Wargame application.
-It includes the Player and Enemy classes, as well as various interfaces and managers
-for handling game logic and posting functionality.
+Provides the game managers, the posting interface, score tracking and the
+EasyLLM model wrapper. Exported names are imported lazily on first access,
+so ``import kudos`` does not load torch or transformers until a model
+class is actually used.
 """
 
-from .posting_interface import PostingInterface
-from .post_manager import PostManager
-from .game_manager import GameManager
-from .scoring import UserScoreTracker
-from .easy_llm import EasyLLM
-
-__all__ = [
-    "Player",
-    "Enemy",
-    "PostingInterface",
-    "PostManager",
-    "GameManager",
-    "determine_top_player",
-]
+import importlib
+from typing import Any, List
+
+_EXPORTS = {
+    "PostingInterface": ".posting_interface",
+    "PostManager": ".post_manager",
+    "GameManager": ".game_manager",
+    "GameSimulator": ".game_simulator",
+    "UserScoreTracker": ".scoring",
+    "EasyLLM": ".easy_llm",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(__all__))
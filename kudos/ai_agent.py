@@ -1,60 +1,18 @@
 import random
-from typing import Dict, List, Any
-from .llm_wrapper import ask_question
+from typing import Dict, List, Any, Optional
+from .llm_wrapper import ask_question, ask_question_async
+from .llm_backends import LLMBackend
+from .prompt_templates import Prompt, PromptTemplate
 
-class AIAgent:
-    """AI agent that generates social network actions based on group identity and beliefs."""
-
-    def __init__(self, username: str, group_name: str, game_rules: str, 
-                 groups: Dict[str, str]) -> None:
-        """
-        Initialize AI agent with identity and game parameters.
-
-        Args:
-            username: Agent's unique identifier
-            group_name: Agent's assigned social group
-            game_rules: Ruleset governing agent behavior
-            groups: Mapping of group names to their characteristics
-        """
-        self.username = username
-        self.group_name = group_name
-        self.game_rules = game_rules
-        self.groups = groups
-
-    def generate_action(self, round_number: int, current_score: int,
-                       posts: List[Dict[str, Any]], users: List[str], 
-                       social_network_biography: str) -> Dict[str, Any]:
-        """        
-        Generate next social network action. The LLM itself decides whether to:
-        - like an existing post,
-        - reply to an existing post,
-        - or make a brand-new post.
-
-        It should base this decision on what might increase its social influence (e.g.,
-        liking a user who liked your content, replying to spark engagement, or posting
-        new and interesting content for broader reach).
-
-        Args:
-            round_number: Current game round
-            current_score: Agent's current score
-            posts: Available posts in current round
-            users: Active usernames in the network
-            social_network_biography: Network context description
-
-        Returns:
-            Action dictionary containing "action_type", "post_id", and "message".
-        """
-
-        # 1) Build a prompt that instructs the LLM to choose an action that maximizes influence.
-        prompt = f"""
-You are a social media user who believes and follows the group perspective and persona of '{self.groups[self.group_name]}'. You are a user on the following social network: '{social_network_biography}'.
-
-You are a user of a social network with the username: '{self.username}'.
+# Instructions shared by every agent and round. Kept at the start of the prompt
+# so the model can reuse the cached prefill of this block.
+AGENT_PROMPT_PREFIX = """
+You are a user on a social network. Your persona, the network and your username are described under YOUR PERSONA below.
 
 BACKGROUND:
 • You want to gain influence on this social network.
 • You can choose to 'like', 'reply', or 'post'.
-• You should post following your persona above.
+• You should post following your persona.
 • Think about which action might lead to the greatest engagement or reception.
     - Liking is a quick way to build goodwill with a user.
     - Replying directly can spark conversation and draw people in.
@@ -80,62 +38,151 @@ INSTRUCTIONS FOR ACTION:
 • Never, under any cercumstances, mention your group name.
 • Ensure to speak naturally, not be pretentious, and to rpelicate language as used on common social media platforms, i.e. Twitter, Facebook, 4Chan, etc. 
 
-RECENT POSTS:
-{[{'post_id': p['post_id'], 'username': p['username'], 'message': p['message'], 'likes': p['likes']} for p in posts]}
-
 ### Examples of Actions:
 
 **Like Example:**
 ```json
-{{
+{
     "action_type": "like",
     "post_id": 101,
     "message": null
-}}
+}
 ```
 *Scenario:* A popular user in your group posted an inspiring quote that aligns with your group's interests. Liking their post builds rapport without needing further engagement.
 
 **Reply Example:**
 ```json
-{{
+{
     "action_type": "reply",
     "post_id": 87,
     "message": "I completely agree with you! This is such an interesting perspective – what do you think about its impact on future trends?"
-}}
+}
 ```
 *Scenario:* A post discusses a trending topic in your group's niche. By replying, you start a conversation and invite further engagement from both the original poster and others.
 
 **Post Example:**
 ```json
-{{
+{
     "action_type": "post",
     "post_id": null,
     "message": "I Fucking hate this TV Presenter on channel four. When will they get someone else on! #News #Channel4 #TVGate"
-}}
+}
 ```
 *Scenario:* No relevant posts to engage with, so you create a new post to introduce fresh, relevant content to your network, potentially attracting engagement from various users.
-        """
 
-        schema = {
-                "type": "object",
-                "properties": {
-                    "action_type": {
-                        "type": "string",
-                        "enum": ["post", "like", "reply"]
-                    },
-                    "post_id": {
-                        "type": "string"
-                    },
-                    "message": {
-                        "type": "string"
-                    }
-                },
-                "required": ["action_type"]
+"""
+
+# Token budget of an action prompt; the oldest recent posts are dropped to stay within it.
+AGENT_PROMPT_MAX_TOKENS = 8192
+
+AGENT_PROMPT_TEMPLATE = PromptTemplate("""
+YOUR PERSONA:
+You are a social media user who believes and follows the group perspective and persona of '{persona}'. You are a user on the following social network: '{biography}'.
+
+You are a user of a social network with the username: '{username}'.
+
+RECENT POSTS:
+{posts}
+        """, prefix=AGENT_PROMPT_PREFIX, list_slots=("posts",), max_tokens=AGENT_PROMPT_MAX_TOKENS)
+
+AGENT_ACTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "action_type": {
+            "type": "string",
+            "enum": ["post", "like", "reply"]
+        },
+        "post_id": {
+            "type": ["integer", "null"]
+        },
+        "message": {
+            "type": "string"
         }
+    },
+    "required": ["action_type"]
+}
+
+class AIAgent:
+    """AI agent that generates social network actions based on group identity and beliefs."""
+
+    def __init__(self, username: str, group_name: str, game_rules: str, 
+                 groups: Dict[str, str], backend: Optional[LLMBackend] = None) -> None:
+        """
+        Initialize AI agent with identity and game parameters.
+
+        Args:
+            username: Agent's unique identifier
+            group_name: Agent's assigned social group
+            game_rules: Ruleset governing agent behavior
+            groups: Mapping of group names to their characteristics
+            backend: LLM backend to use, the process-wide default if None
+        """
+        self.username = username
+        self.group_name = group_name
+        self.game_rules = game_rules
+        self.groups = groups
+        self.backend = backend
+
+    def build_action_prompt(self, round_number: int, current_score: int,
+                            posts: List[Dict[str, Any]], users: List[str],
+                            social_network_biography: str) -> Prompt:
+        """Build the prompt asking the LLM for this agent's next action.
+
+        Args:
+            round_number: Current game round
+            current_score: Agent's current score
+            posts: Available posts in current round
+            users: Active usernames in the network
+            social_network_biography: Network context description
+
+        Returns:
+            Prompt starting with AGENT_PROMPT_PREFIX
+        """
+        # The static AGENT_PROMPT_PREFIX comes first so its KV cache is shared by every agent.
+        return AGENT_PROMPT_TEMPLATE.render(
+            persona=self.groups[self.group_name],
+            biography=social_network_biography,
+            username=self.username,
+            posts=[{'post_id': p['post_id'], 'username': p['username'], 'message': p['message'], 'likes': p['likes']} for p in posts]
+        )
+
+    def generate_action(self, round_number: int, current_score: int,
+                       posts: List[Dict[str, Any]], users: List[str], 
+                       social_network_biography: str) -> Dict[str, Any]:
+        """        
+        Generate next social network action. The LLM itself decides whether to:
+        - like an existing post,
+        - reply to an existing post,
+        - or make a brand-new post.
+
+        It should base this decision on what might increase its social influence (e.g.,
+        liking a user who liked your content, replying to spark engagement, or posting
+        new and interesting content for broader reach).
+
+        Args:
+            round_number: Current game round
+            current_score: Agent's current score
+            posts: Available posts in current round
+            users: Active usernames in the network
+            social_network_biography: Network context description
+
+        Returns:
+            Action dictionary containing "action_type", "post_id", and "message".
+        """
+
+        # 1) Build a prompt that instructs the LLM to choose an action that maximizes influence.
+        prompt = self.build_action_prompt(round_number, current_score, posts, users, social_network_biography)
 
         print(prompt)
                            
         # 2) Use the LLM to generate the action based on the prompt.
-        response = ask_question(prompt, schema)
+        response = ask_question(prompt, AGENT_ACTION_SCHEMA, prefix=AGENT_PROMPT_PREFIX, backend=self.backend)
 
         return response
+
+    async def generate_action_async(self, round_number: int, current_score: int,
+                                    posts: List[Dict[str, Any]], users: List[str],
+                                    social_network_biography: str) -> Dict[str, Any]:
+        """Async variant of generate_action."""
+        prompt = self.build_action_prompt(round_number, current_score, posts, users, social_network_biography)
+        return await ask_question_async(prompt, AGENT_ACTION_SCHEMA, prefix=AGENT_PROMPT_PREFIX, backend=self.backend)
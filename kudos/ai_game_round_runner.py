@@ -1,6 +1,10 @@
+import asyncio
 import random
 import time
-from typing import List, Any, Dict
+from typing import List, Any, Callable, Dict, Optional, Sequence, Tuple
+from .ai_agent import AGENT_ACTION_SCHEMA, AGENT_PROMPT_PREFIX
+from .llm_wrapper import RequestCoalescer, coalescer_for
+from . import instrumentation
 
 class AIGameRoundRunner:
     """
@@ -28,18 +32,134 @@ class AIGameRoundRunner:
         Returns:
             Dictionary describing the performed action
         """
+        with instrumentation.collect('action', round=round_number, username=agent.username) as record:
+            score, posts, other_users = self._action_inputs(agent, round_number)
+
+            with instrumentation.span("agent_decision"):
+                action = agent.generate_action(round_number, score, posts, other_users, self.social_network_biography)
+            with instrumentation.span("apply_action"):
+                self._apply_action(agent.username, action, round_number)
+            record['action_type'] = action['action_type']
+        return action
+
+    async def process_actions_async(self, agents: List[Any], round_number: int,
+                                    max_concurrency: int = 8,
+                                    after_action: Optional[Callable[[int, Optional[List[Any]]], None]] = None,
+                                    before_action: Optional[Callable[[int], None]] = None,
+                                    is_checkpoint: Optional[Callable[[int], bool]] = None,
+                                    answers: Sequence[Any] = ()) -> List[Dict[str, Any]]:
+        """Process a sequence of agent actions with up to max_concurrency decisions in flight.
+
+        Decisions are requested through a sliding window: once an action is
+        applied, the prompt of the next action not yet asked is built from
+        the posts and scores at that point, keeping max_concurrency decisions
+        outstanding. Actions are applied in sequence order as their answers
+        arrive, so a slow answer only holds back the actions after it, not
+        a whole wave.
+
+        Questions go through the backend's coalescer (see
+        llm_wrapper.enable_coalescing), or one created for this call, so
+        decisions in flight reach the backend together in ask_batch calls
+        with the same schema and prefix as sequential rounds. Given a
+        deterministic backend the outcome depends only on the sequence, not
+        on how the backend schedules the batches.
+
+        As in sequential rounds, each action is traced with
+        instrumentation.collect; its agent_decision phase is the time spent
+        waiting for the answer after the previous action was applied.
+
+        Args:
+            agents: AIAgent instances in the order their actions are applied.
+                An agent may appear several times.
+            round_number: Current round number
+            max_concurrency: Maximum number of decisions requested at once
+            after_action: Called after each action with the number of actions
+                applied so far and, where is_checkpoint is true, the answers of
+                the decisions already requested for later actions, None elsewhere
+            before_action: Called with the sequence index of each action before it is applied
+            is_checkpoint: Returns whether after_action checkpoints once the given
+                number of actions is applied. The decisions in flight are then
+                awaited, so their answers can be saved with the checkpoint.
+            answers: Answers of the first actions, saved with a checkpoint, used
+                instead of asking again
+
+        Returns:
+            List of performed actions, in sequence order
+        """
+        loop = asyncio.get_running_loop()
+        coalescers: Dict[int, RequestCoalescer] = {}
+        owned: List[RequestCoalescer] = []
+
+        def coalescer(backend: Any) -> RequestCoalescer:
+            if id(backend) not in coalescers:
+                shared = coalescer_for(backend)
+                if shared is None:
+                    shared = RequestCoalescer(backend, max_batch_size=max_concurrency)
+                    owned.append(shared)
+                coalescers[id(backend)] = shared
+            return coalescers[id(backend)]
+
+        def ask(agent: Any) -> "asyncio.Future[Any]":
+            prompt = agent.build_action_prompt(round_number, *self._action_inputs(agent, round_number),
+                                               self.social_network_biography)
+            return asyncio.wrap_future(coalescer(agent.backend).submit(prompt, AGENT_ACTION_SCHEMA,
+                                                                       prefix=AGENT_PROMPT_PREFIX))
+
+        async def answer(future: "asyncio.Future[Any]") -> Any:
+            try:
+                return await future
+            except Exception as e:
+                print(f"Question failed: {e}")
+                return None
+
+        pending: List["asyncio.Future[Any]"] = []
+        for saved in answers:
+            pending.append(loop.create_future())
+            pending[-1].set_result(saved)
+        actions: List[Dict[str, Any]] = []
+        try:
+            while len(actions) < len(agents):
+                index = len(actions)
+                while len(pending) < len(agents) and len(pending) - index < max_concurrency:
+                    pending.append(ask(agents[len(pending)]))
+
+                agent = agents[index]
+                with instrumentation.collect('action', round=round_number, username=agent.username) as record:
+                    with instrumentation.span("agent_decision"):
+                        action = await answer(pending[index])
+                    print("Response:", action)
+                    if before_action is not None:
+                        before_action(index)
+                    if not isinstance(action, dict) or "action_type" not in action:
+                        print(f"{agent.username} produced no valid action: {action}")
+                        action = {"action_type": None}
+                    with instrumentation.span("apply_action"):
+                        self._apply_action(agent.username, action, round_number)
+                    record['action_type'] = action['action_type']
+                actions.append(action)
+
+                in_flight = None
+                if is_checkpoint is not None and is_checkpoint(len(actions)):
+                    in_flight = [await answer(future) for future in pending[len(actions):]]
+                if after_action is not None:
+                    after_action(len(actions), in_flight)
+        finally:
+            for future in pending[len(actions):]:
+                future.cancel()
+            for owned_coalescer in owned:
+                await asyncio.to_thread(owned_coalescer.close)
+        return actions
+
+    def _action_inputs(self, agent, round_number: int) -> Tuple[int, List[Dict[str, Any]], List[str]]:
+        """Collect the score, visible posts and other users an agent decides on."""
         self.game_manager.score_tracker.initialize_round_scores(round_number)
         score = self._get_score_for_round(agent.username, round_number)
         posts = self.game_manager.post_manager.get_posts_by_round(round_number) + self.game_manager.post_manager.get_posts_by_round(round_number-1)
         other_users = [p['username'] for p in self.game_manager.players if p['username'] != agent.username]
-        
-        action = agent.generate_action(round_number, score, posts, other_users, self.social_network_biography)
-        self._apply_action(agent.username, action, round_number)
-        return action
+        return score, posts, other_users
 
     def _get_score_for_round(self, username: str, round_number: int) -> int:
-        scores = self.game_manager.get_scores_for_round(round_number)
-        return scores.get(username, 0)
+        return self.game_manager.score_tracker.get_score(username, round_number)
 
     def _is_valid_post_id(self, post_id: int) -> bool:
 
@@ -0,0 +1,329 @@
+import json
+import torch
+from typing import Any, Dict, Generator, List, Optional, Sequence
+from . import instrumentation
+
+# Generator of one prompt's answer: yields the mask of allowed tokens, receives the sampled token
+_Steps = Generator[torch.Tensor, int, Any]
+
+
+class _Row:
+    """Decoding state of one prompt of a batch."""
+
+    def __init__(self, index: int, pending_ids: List[int], length: int) -> None:
+        self.index = index
+        self.pending_ids = pending_ids
+        self.pending_text = ""
+        self.length = length  # Tokens in the KV cache, the position of the next one
+        self.steps: Optional[_Steps] = None
+        self.mask: Optional[torch.Tensor] = None
+
+    def emit(self, text: str) -> None:
+        self.pending_text += text
+
+    def take_pending(self, tokenizer: Any) -> List[int]:
+        """Return the forced tokens not yet fed to the model."""
+        token_ids = self.pending_ids
+        if self.pending_text:
+            token_ids = token_ids + tokenizer.encode(self.pending_text, add_special_tokens=False)
+        self.pending_ids = []
+        self.pending_text = ""
+        return token_ids
+
+
+def _cache_length(past_key_values: Optional[Any]) -> int:
+    if past_key_values is None:
+        return 0
+    if hasattr(past_key_values, "get_seq_length"):
+        return past_key_values.get_seq_length()
+    return past_key_values[0][0].shape[-2]
+
+
+def _repeat_cache(past_key_values: Any, repeats: int) -> Any:
+    """Repeat a batch-of-one KV cache for every row of a batch."""
+    if hasattr(past_key_values, "batch_repeat_interleave"):
+        past_key_values.batch_repeat_interleave(repeats)
+        return past_key_values
+    return tuple(tuple(tensor.repeat_interleave(repeats, dim=0) for tensor in layer) for layer in past_key_values)
+
+
+def _select_cache(past_key_values: Any, indices: torch.Tensor) -> Any:
+    """Keep the rows at indices of a KV cache."""
+    if hasattr(past_key_values, "batch_select_indices"):
+        past_key_values.batch_select_indices(indices)
+        return past_key_values
+    return tuple(tuple(tensor[indices] for tensor in layer) for layer in past_key_values)
+
+
+class JsonSchemaDecoder:
+    """Generates JSON matching a schema in one KV-cached pass over the model.
+
+    Structural text (braces, keys, separators and quotes) is forced: it is
+    tokenized and fed to the model without sampling, and consecutive forced
+    text is fed in a single forward pass. Values are sampled token by token
+    under a mask allowing only tokens valid at that point:
+
+    - enums and booleans: a trie over the token sequences of the choices
+    - strings: tokens free of quotes, backslashes and control characters,
+      until a closing quote token is sampled or the token limit is reached
+    - integers and numbers: digit tokens, until a "," or "}" token is sampled
+
+    Supported schemas are objects (all properties are generated in order),
+    strings, integers, numbers, booleans, null and enums. A list of types may
+    add "null" to an integer, number or boolean type; for other lists the
+    first non-null type is generated.
+
+    generate_batch answers several prompts together: prompts are left-padded,
+    each step is one forward pass over the unfinished prompts with a mask per
+    prompt, and finished prompts leave the batch.
+    """
+
+    def __init__(self, model: Any, tokenizer: Any, device: str) -> None:
+        """Initialize the decoder.
+
+        Args:
+            model: Causal language model
+            tokenizer: Tokenizer of the model
+            device: Device the model inputs are placed on
+        """
+        self.model = model
+        self.tokenizer = tokenizer
+        self.device = device
+        self.forward_passes = 0
+        self._masks: Dict[str, torch.Tensor] = {}
+        self._token_text: Dict[int, str] = {}
+        self._tries: Dict[tuple, Dict[Any, Any]] = {}
+
+    def _build_masks(self) -> None:
+        """Classify every token of the vocabulary once per tokenizer."""
+        output_embeddings = self.model.get_output_embeddings()
+        vocab_size = output_embeddings.weight.shape[0] if output_embeddings is not None else self.model.config.vocab_size
+        names = ("string", "quote", "digits", "number", "stop")
+        masks = {name: torch.zeros(vocab_size, dtype=torch.bool) for name in names}
+        special_ids = set(self.tokenizer.all_special_ids)
+        for token_id in range(min(vocab_size, len(self.tokenizer))):
+            if token_id in special_ids:
+                continue
+            text = self.tokenizer.decode([token_id])
+            stripped = text.strip()
+            if text == '"':
+                masks["quote"][token_id] = True
+            elif text and '"' not in text and "\\" not in text and all(ord(c) >= 32 for c in text):
+                masks["string"][token_id] = True
+            if stripped and all(c in "0123456789." for c in stripped) and stripped.count(".") <= 1:
+                masks["number"][token_id] = True
+                self._token_text[token_id] = stripped
+                if "." not in stripped:
+                    masks["digits"][token_id] = True
+            if stripped in (",", "}"):
+                masks["stop"][token_id] = True
+        self._masks = {name: mask.to(self.device) for name, mask in masks.items()}
+
+    def _trie(self, choices: List[str]) -> Dict[Any, Any]:
+        """Return a token trie over the choices; a None key marks the index of a complete choice."""
+        key = tuple(choices)
+        if key not in self._tries:
+            root: Dict[Any, Any] = {}
+            for index, choice in enumerate(choices):
+                node = root
+                for token_id in self.tokenizer.encode(choice, add_special_tokens=False):
+                    node = node.setdefault(token_id, {})
+                node.setdefault(None, index)
+            self._tries[key] = root
+        return self._tries[key]
+
+    def generate(self, input_ids: torch.Tensor, json_schema: Dict[str, Any],
+                 past_key_values: Optional[Any] = None, temperature: float = 1.0,
+                 max_string_tokens: int = 128, max_number_tokens: int = 12) -> Any:
+        """Generate a value matching json_schema as the continuation of a prompt.
+
+        Args:
+            input_ids: Prompt token ids of shape (1, length)
+            json_schema: Schema of the value to generate
+            past_key_values: KV cache covering a prefix of input_ids, extended in place
+            temperature: Sampling temperature
+            max_string_tokens: Maximum tokens per string value
+            max_number_tokens: Maximum tokens per number value
+
+        Returns:
+            The generated value
+        """
+        value = self.generate_batch([input_ids[0].tolist()], [json_schema], past_key_values, temperature,
+                                    max_string_tokens, max_number_tokens)[0]
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+    def generate_batch(self, input_ids: Sequence[List[int]], json_schemas: Sequence[Dict[str, Any]],
+                       past_key_values: Optional[Any] = None, temperature: float = 1.0,
+                       max_string_tokens: int = 128, max_number_tokens: int = 12) -> List[Any]:
+        """Generate values matching a schema per prompt, decoding the prompts together.
+
+        Args:
+            input_ids: Token ids of each prompt
+            json_schemas: Schema of the value to generate for each prompt
+            past_key_values: KV cache of a batch of one covering a prefix shared by
+                all prompts, repeated for the batch and extended in place
+            temperature: Sampling temperature
+            max_string_tokens: Maximum tokens per string value
+            max_number_tokens: Maximum tokens per number value
+
+        Returns:
+            The generated values in input order. A prompt whose schema cannot be
+            decoded gets the exception instead; the other prompts are unaffected.
+        """
+        if not self._masks:
+            self._build_masks()
+        self.forward_passes = 0
+        self._temperature = temperature
+        self._max_string_tokens = max_string_tokens
+        self._max_number_tokens = max_number_tokens
+        past_length = _cache_length(past_key_values)
+        results: List[Any] = [None] * len(input_ids)
+        rows = []
+        for index, (token_ids, json_schema) in enumerate(zip(input_ids, json_schemas)):
+            row = _Row(index, list(token_ids[past_length:]), past_length)
+            row.steps = self._value(row, json_schema)
+            if self._advance(row, None, results):
+                rows.append(row)
+        if not rows:
+            return results
+
+        past = _repeat_cache(past_key_values, len(rows)) if past_key_values is not None and len(rows) > 1 \
+            else past_key_values
+        attention_mask = torch.ones((len(rows), past_length), dtype=torch.long, device=self.device)
+        pad_token_id = self.tokenizer.pad_token_id if self.tokenizer.pad_token_id is not None else 0
+        while rows:
+            chunks = [row.take_pending(self.tokenizer) for row in rows]
+            width = max(len(chunk) for chunk in chunks)
+            padded = [[pad_token_id] * (width - len(chunk)) + chunk for chunk in chunks]
+            chunk_mask = [[0] * (width - len(chunk)) + [1] * len(chunk) for chunk in chunks]
+            positions = [[0] * (width - len(chunk)) + list(range(row.length, row.length + len(chunk)))
+                         for row, chunk in zip(rows, chunks)]
+            attention_mask = torch.cat([attention_mask, torch.tensor(chunk_mask, device=self.device)], dim=1)
+            # The first pass of a generation processes the prompts
+            with torch.no_grad(), instrumentation.span("prefill" if self.forward_passes == 0 else "decode"):
+                outputs = self.model(
+                    input_ids=torch.tensor(padded, device=self.device),
+                    attention_mask=attention_mask,
+                    position_ids=torch.tensor(positions, device=self.device),
+                    past_key_values=past,
+                    use_cache=True
+                )
+            self.forward_passes += 1
+            past = outputs.past_key_values
+            for row, chunk in zip(rows, chunks):
+                row.length += len(chunk)
+
+            instrumentation.count("tokens_generated", len(rows))
+            scores = outputs.logits[:, -1].float() / self._temperature
+            allowed = torch.stack([row.mask for row in rows]).to(scores.device)
+            scores = scores.masked_fill(~allowed, float("-inf"))
+            tokens = torch.multinomial(torch.softmax(scores, dim=-1), 1)[:, 0].tolist()
+
+            keep = [i for i, (row, token_id) in enumerate(zip(rows, tokens)) if self._advance(row, token_id, results)]
+            if len(keep) < len(rows):
+                rows = [rows[i] for i in keep]
+                if rows:
+                    indices = torch.tensor(keep, device=attention_mask.device)
+                    attention_mask = attention_mask[indices]
+                    past = _select_cache(past, indices)
+        return results
+
+    def _advance(self, row: _Row, token_id: Optional[int], results: List[Any]) -> bool:
+        """Send a sampled token to a row; return False once the row is finished or failed."""
+        try:
+            row.mask = row.steps.send(token_id)
+        except StopIteration as stop:
+            results[row.index] = stop.value
+            return False
+        except Exception as e:
+            results[row.index] = e
+            return False
+        if not row.pending_ids and not row.pending_text:
+            # Every sample follows forced or sampled tokens, so the logits always belong to this row
+            results[row.index] = RuntimeError("Constrained decoding has no token to feed before sampling.")
+            return False
+        return True
+
+    def _ids_mask(self, token_ids: List[int]) -> torch.Tensor:
+        mask = torch.zeros_like(self._masks["quote"])
+        mask[token_ids] = True
+        return mask
+
+    def _value(self, row: _Row, schema: Dict[str, Any]) -> _Steps:
+        if "enum" in schema:
+            return (yield from self._choice(row, [json.dumps(option) for option in schema["enum"]], schema["enum"]))
+        value_type = schema.get("type", "string")
+        nullable = False
+        if isinstance(value_type, list):
+            nullable = "null" in value_type
+            value_type = next((t for t in value_type if t != "null"), "null")
+        if value_type == "object":
+            return (yield from self._object(row, schema))
+        if value_type == "string":
+            return (yield from self._string(row))
+        if value_type in ("integer", "number"):
+            return (yield from self._number(row, value_type == "number", nullable))
+        if value_type == "boolean":
+            if nullable:
+                return (yield from self._choice(row, ["true", "false", "null"], [True, False, None]))
+            return (yield from self._choice(row, ["true", "false"], [True, False]))
+        if value_type == "null":
+            row.emit("null")
+            return None
+        raise ValueError(f"Unsupported schema type for constrained decoding: {value_type}")
+
+    def _object(self, row: _Row, schema: Dict[str, Any]) -> _Steps:
+        row.emit("{")
+        result = {}
+        for index, (key, sub_schema) in enumerate(schema.get("properties", {}).items()):
+            row.emit((", " if index else "") + json.dumps(key) + ": ")
+            result[key] = yield from self._value(row, sub_schema)
+        row.emit("}")
+        return result
+
+    def _choice(self, row: _Row, texts: List[str], values: List[Any], node: Optional[Dict[Any, Any]] = None) -> _Steps:
+        """Sample one of several fixed texts by walking their token trie, optionally from a given node."""
+        if node is None:
+            node = self._trie(texts)
+        while None not in node:
+            token_id = yield self._ids_mask(list(node))
+            row.pending_ids.append(token_id)
+            node = node[token_id]
+        return values[node[None]]
+
+    def _string(self, row: _Row) -> _Steps:
+        row.emit('"')
+        quote = self._masks["quote"]
+        mask = self._masks["string"] | quote
+        token_ids: List[int] = []
+        for _ in range(self._max_string_tokens):
+            token_id = yield mask
+            if quote[token_id]:
+                break
+            token_ids.append(token_id)
+            row.pending_ids.append(token_id)
+        row.emit('"')
+        return self.tokenizer.decode(token_ids, skip_special_tokens=True).strip()
+
+    def _number(self, row: _Row, allow_fraction: bool, nullable: bool = False) -> _Steps:
+        digits, number, stop = self._masks["digits"], self._masks["number"], self._masks["stop"]
+        null_trie = self._trie(["null"])
+        text = ""
+        for _ in range(self._max_number_tokens):
+            if not text:
+                mask = (digits | self._ids_mask(list(null_trie))) if nullable else digits
+            elif allow_fraction and "." not in text:
+                mask = number | stop
+            else:
+                mask = digits | stop
+            token_id = yield mask
+            if not text and nullable and token_id in null_trie and not digits[token_id]:
+                row.pending_ids.append(token_id)
+                return (yield from self._choice(row, ["null"], [None], null_trie[token_id]))
+            if stop[token_id]:
+                break
+            text += self._token_text[token_id]
+            row.pending_ids.append(token_id)
+        return float(text) if "." in text else int(text)
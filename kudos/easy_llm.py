@@ -1,61 +1,409 @@
-import json
-import re
+import copy
 import torch
 import random
-from typing import Optional, Dict, Any, Type, Union
-from transformers import AutoModelForCausalLM, AutoTokenizer
-from jsonformer.main import Jsonformer
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Iterator, Tuple, Type, Union, List
+from transformers import (AutoModelForCausalLM, AutoTokenizer, LogitsProcessor, LogitsProcessorList,
+                          MinPLogitsWarper, NoRepeatNGramLogitsProcessor, RepetitionPenaltyLogitsProcessor,
+                          StoppingCriteria, StoppingCriteriaList, TemperatureLogitsWarper,
+                          TopKLogitsWarper, TopPLogitsWarper, TypicalLogitsWarper)
 from pydantic import BaseModel, create_model, Field
+from . import instrumentation
+from .constrained_decoding import JsonSchemaDecoder
+from .prompt_templates import encode_prompt, get_budget_tokenizer, set_budget_tokenizer
 
 class EasyLLM:
     """Wrapper for language model interactions with simplified interface."""
 
-    def __init__(self, model_path: str, max_memory: Optional[Dict[Union[int, str], str]] = None) -> None:
+    def __init__(self, model_path: str, max_memory: Optional[Dict[Union[int, str], str]] = None,
+                 prefix_cache_size: int = 4) -> None:
         """Initialize language model with specified parameters.
 
         Args:
             model_path: Path or identifier for the model
             max_memory: Memory allocation settings per device
+            prefix_cache_size: Number of prompt prefixes whose KV cache is kept
         """
         self.model_path = model_path
         self._model = None
         self._tokenizer = None
+        self.prefix_cache_size = prefix_cache_size
+        self._prefix_cache: "OrderedDict[str, Any]" = OrderedDict()
+        self._decoder: Optional[JsonSchemaDecoder] = None
+        self._stream_lock = threading.Lock()
+        self._stream_stats: Dict[str, Any] = {
+            'streams': 0,
+            'tokens': 0,
+            'first_token_s': 0.0,
+            'decode_s': 0.0,
+            'stop_reasons': {},
+        }
         self.max_memory = max_memory or {0: "12GiB", "cpu": "30GiB"}
         self._device = "cuda" if torch.cuda.is_available() else "cpu"
         self._load_model()
 
     def _load_model(self):
         print(f"Loading model from '{self.model_path}' ...")
-        self._tokenizer = AutoTokenizer.from_pretrained(self.model_path)
-        self._model = AutoModelForCausalLM.from_pretrained(
-            self.model_path,
-            device_map="auto",
-            max_memory=self.max_memory,
-            low_cpu_mem_usage=True
-        )
+        with instrumentation.span("model_load"):
+            self._tokenizer = AutoTokenizer.from_pretrained(self.model_path)
+            self._model = AutoModelForCausalLM.from_pretrained(
+                self.model_path,
+                device_map="auto",
+                max_memory=self.max_memory,
+                low_cpu_mem_usage=True
+            )
         if self._tokenizer.pad_token_id is None:
             self._tokenizer.pad_token_id = self._tokenizer.eos_token_id or 0
+        # Prompt templates rendered in this process count their budget with this tokenizer
+        set_budget_tokenizer(self._tokenizer)
         print("Model loaded successfully.")
 
-    def ask_question(self, prompt: str, max_new_tokens: int = 300) -> str:
-        temperature = random.uniform(1.3, 1.5)
-        
-        inputs = self._tokenizer(prompt, return_tensors="pt")
-        input_ids = inputs["input_ids"].to(self._device)
+    def cache_prefix(self, prefix: str) -> None:
+        """Precompute and keep the KV cache of a prompt prefix shared by many prompts.
+
+        Any later prompt whose tokens start with the prefix tokens skips the
+        prefill of that prefix. The least recently used prefix is dropped once
+        more than prefix_cache_size prefixes are cached.
+
+        Args:
+            prefix: Text every reusing prompt starts with
+        """
+        if prefix in self._prefix_cache:
+            self._prefix_cache.move_to_end(prefix)
+            return
+        with instrumentation.span("tokenize"):
+            prefix_ids = self._tokenizer(prefix, return_tensors="pt")["input_ids"].to(self._device)
+        with torch.no_grad(), instrumentation.span("prefill"):
+            past_key_values = self._model(input_ids=prefix_ids, use_cache=True).past_key_values
+        self._prefix_cache[prefix] = (prefix_ids, past_key_values)
+        while len(self._prefix_cache) > self.prefix_cache_size:
+            self._prefix_cache.popitem(last=False)
+
+    def clear_prefix_cache(self) -> None:
+        """Drop all cached prompt prefixes."""
+        self._prefix_cache.clear()
+
+    def _cached_past_for(self, input_ids: torch.Tensor) -> Optional[Any]:
+        """Return a copy of the longest cached prefix KV cache matching input_ids."""
+        return self._shared_past_for(input_ids.tolist())
+
+    def _shared_past_for(self, token_ids: List[List[int]]) -> Optional[Any]:
+        """Return a copy of the longest cached prefix KV cache that every token id list starts with."""
+        best = None
+        shortest = min(len(ids) for ids in token_ids)
+        for prefix, (prefix_ids, past_key_values) in self._prefix_cache.items():
+            length = prefix_ids.shape[-1]
+            if length >= shortest or (best is not None and length <= best[0]):
+                continue
+            prefix_list = prefix_ids[0].tolist()
+            if all(ids[:length] == prefix_list for ids in token_ids):
+                best = (length, prefix, past_key_values)
+        if best is None:
+            return None
+        self._prefix_cache.move_to_end(best[1])
+        # generate() extends the cache in place, so each call gets its own copy
+        return copy.deepcopy(best[2])
+
+    def _encode(self, prompt: str) -> torch.Tensor:
+        """Tokenize a prompt, taking a template Prompt's ids from its token caches."""
+        with instrumentation.span("tokenize"):
+            return torch.tensor([encode_prompt(self._tokenizer, prompt)], device=self._device)
 
+    def _generate(self, input_ids: torch.Tensor, **kwargs: Any) -> torch.Tensor:
+        """Run model.generate, recording prefill and decode time and generated tokens when instrumented."""
+        if not instrumentation.enabled():
+            with torch.no_grad():
+                return self._model.generate(input_ids=input_ids, **kwargs)
+        timer = _FirstLogitsTimer()
+        start = time.perf_counter()
         with torch.no_grad():
-            outputs = self._model.generate(
-                input_ids=input_ids,
-                max_new_tokens=max_new_tokens,
-                do_sample=True,
-                temperature=temperature,
-                pad_token_id=self._tokenizer.pad_token_id
-            )
+            outputs = self._model.generate(input_ids=input_ids, logits_processor=LogitsProcessorList([timer]), **kwargs)
+        end = time.perf_counter()
+        first_logits = timer.first_logits or end
+        instrumentation.add_timing("prefill", first_logits - start)
+        instrumentation.add_timing("decode", end - first_logits)
+        generated = outputs[:, input_ids.shape[-1]:]
+        instrumentation.count("tokens_generated", int((generated != self._tokenizer.pad_token_id).sum()))
+        return outputs
+
+    def ask_question(self, prompt: str, max_new_tokens: int = 300, prefix: Optional[str] = None,
+                     stop: Optional[List[str]] = None, stop_at_json_end: bool = False) -> str:
+        """Generate a free-text answer; see stream_question for the arguments."""
+        return "".join(self.stream_question(prompt, max_new_tokens, prefix, stop, stop_at_json_end))
+
+    def stream_question(self, prompt: str, max_new_tokens: int = 300, prefix: Optional[str] = None,
+                        stop: Optional[List[str]] = None, stop_at_json_end: bool = False,
+                        cancel: Optional[threading.Event] = None) -> Iterator[str]:
+        """Generate a free-text answer token by token, yielding text as it is produced.
+
+        Generation ends at the end-of-sequence token or after max_new_tokens,
+        or earlier at the first stop string, once the first JSON object of the
+        answer is closed, when cancel is set or when the caller closes the
+        generator. Text that may be the start of a stop string is held back
+        until the next tokens decide it. See stream_stats for time to first
+        token and stop reasons.
+
+        Args:
+            prompt: Prompt to answer
+            max_new_tokens: Maximum tokens generated
+            prefix: Leading part of the prompt whose KV cache is kept for reuse
+            stop: Strings ending the answer; the stop string itself is not yielded
+            stop_at_json_end: End the answer at the brace closing its first JSON object
+            cancel: Event the caller sets to end generation after the current token
+
+        Yields:
+            Consecutive pieces of the answer text
+        """
+        temperature = random.uniform(1.3, 1.5)
+        if prefix is not None:
+            self.cache_prefix(prefix)
+
+        input_ids = self._encode(prompt)
+        past_key_values = self._cached_past_for(input_ids)
+        past_length = past_key_values.get_seq_length() if past_key_values is not None else 0
+        next_ids = input_ids[:, past_length:]
+        processors = self._logits_processors(temperature)
+        eos_token_ids = self._eos_token_ids()
+        stop = [text for text in stop or [] if text]
+        json_end = _JsonEndTracker() if stop_at_json_end else None
+        # Prompt and generated tokens, seen by processors such as the repetition penalty
+        prompt_length = input_ids.shape[-1]
+        sequence = torch.empty((1, prompt_length + max_new_tokens), dtype=input_ids.dtype, device=self._device)
+        sequence[:, :prompt_length] = input_ids
+
+        start = time.perf_counter()
+        first_token: Optional[float] = None
+        generated: List[int] = []
+        detokenizer = _IncrementalDetokenizer(self._tokenizer)
+        text = ""
+        checked = 0  # Length of the text searched for stop conditions
+        emitted = 0
+        end: Optional[int] = None
+        reason = "length"
+        try:
+            for step in range(max_new_tokens):
+                if cancel is not None and cancel.is_set():
+                    reason = "cancelled"
+                    break
+                with torch.no_grad(), instrumentation.span("prefill" if step == 0 else "decode"):
+                    outputs = self._model(input_ids=next_ids, past_key_values=past_key_values, use_cache=True)
+                past_key_values = outputs.past_key_values
+                scores = processors(sequence[:, :prompt_length + step], outputs.logits[:, -1].float())
+                token = int(torch.multinomial(torch.softmax(scores, dim=-1), 1).item())
+                if first_token is None:
+                    first_token = time.perf_counter()
+                    instrumentation.add_timing("first_token", first_token - start)
+                if token in eos_token_ids:
+                    reason = "eos"
+                    break
+                instrumentation.count("tokens_generated")
+                generated.append(token)
+                sequence[0, prompt_length + step] = token
+                next_ids = sequence[:, prompt_length + step:prompt_length + step + 1]
+
+                piece = detokenizer.add(token)
+                if piece is None:
+                    # Incomplete multi-byte character, decided by the next token
+                    continue
+                text += piece
+                end, reason = _stop_position(text, checked, stop, json_end)
+                if end is not None:
+                    break
+                checked = len(text)
+                ready = len(text) - _partial_stop_length(text, stop)
+                if ready > emitted:
+                    yield text[emitted:ready]
+                    emitted = ready
+
+            if end is not None:
+                text = text[:end]
+            else:
+                text += detokenizer.flush().rstrip("\ufffd")
+            if len(text) > emitted:
+                yield text[emitted:]
+        except GeneratorExit:
+            reason = "cancelled"
+            raise
+        finally:
+            self._record_stream(reason, len(generated), start, first_token)
+
+    def stream_stats(self) -> Dict[str, Any]:
+        """Return totals of stream_question calls, including ask_question.
+
+        Returns:
+            Dictionary with the number of streams and generated tokens, the mean
+            time to first token, decode tokens per second and the number of
+            streams per stop reason ("eos", "length", "stop", "json_end", "cancelled")
+        """
+        with self._stream_lock:
+            stats = dict(self._stream_stats, stop_reasons=dict(self._stream_stats['stop_reasons']))
+        streams = stats['streams']
+        stats['mean_first_token_s'] = stats['first_token_s'] / streams if streams else 0.0
+        stats['decode_tokens_per_s'] = stats['tokens'] / stats['decode_s'] if stats['decode_s'] else 0.0
+        return stats
+
+    def _record_stream(self, reason: str, tokens: int, start: float, first_token: Optional[float]) -> None:
+        end = time.perf_counter()
+        first_token = first_token or end
+        with self._stream_lock:
+            stats = self._stream_stats
+            stats['streams'] += 1
+            stats['tokens'] += tokens
+            stats['first_token_s'] += first_token - start
+            stats['decode_s'] += end - first_token
+            stats['stop_reasons'][reason] = stats['stop_reasons'].get(reason, 0) + 1
+
+    def _logits_processors(self, temperature: float) -> LogitsProcessorList:
+        """Return the processors and warpers generate() samples with, from the model's generation_config.
+
+        Covers the repetition penalty, n-gram blocking, temperature, top-k,
+        top-p, min-p and typical sampling, in the order generate() applies them.
+        """
+        config = self._model.generation_config
+        processors = LogitsProcessorList()
+        if config.repetition_penalty is not None and config.repetition_penalty != 1.0:
+            processors.append(RepetitionPenaltyLogitsProcessor(penalty=config.repetition_penalty))
+        if config.no_repeat_ngram_size:
+            processors.append(NoRepeatNGramLogitsProcessor(config.no_repeat_ngram_size))
+        processors.append(TemperatureLogitsWarper(temperature))
+        if config.top_k:
+            processors.append(TopKLogitsWarper(top_k=config.top_k))
+        if config.top_p is not None and config.top_p < 1.0:
+            processors.append(TopPLogitsWarper(top_p=config.top_p))
+        if config.min_p is not None:
+            processors.append(MinPLogitsWarper(min_p=config.min_p))
+        if config.typical_p is not None and config.typical_p < 1.0:
+            processors.append(TypicalLogitsWarper(mass=config.typical_p))
+        return processors
+
+    def _eos_token_ids(self) -> set:
+        eos_token_id = self._model.generation_config.eos_token_id
+        if eos_token_id is None:
+            eos_token_id = self._tokenizer.eos_token_id
+        if eos_token_id is None:
+            return set()
+        return set(eos_token_id) if isinstance(eos_token_id, (list, tuple)) else {eos_token_id}
+
+    def ask_questions(self, prompts: List[str], max_new_tokens: int = 300,
+                      batch_size: int = 8, stop_at_json_end: bool = False) -> List[Optional[str]]:
+        """Generate free-text answers for many prompts in left-padded micro-batches.
+
+        Args:
+            prompts: Prompts to answer
+            max_new_tokens: Maximum tokens generated per prompt
+            batch_size: Number of prompts sent through the model per generate call
+            stop_at_json_end: Stop each answer once its first JSON object is closed
+
+        Returns:
+            Answers in input order. An entry is None if generation failed for
+            that prompt; other prompts are unaffected.
+        """
+        results: List[Optional[str]] = [None] * len(prompts)
+        for start in range(0, len(prompts), batch_size):
+            indices = list(range(start, min(start + batch_size, len(prompts))))
+            try:
+                answers = self._generate_batch([prompts[i] for i in indices], max_new_tokens, stop_at_json_end)
+            except Exception as e:
+                print(f"Batch generation failed ({e}), retrying prompts individually.")
+                answers = []
+                for i in indices:
+                    try:
+                        answers.append(self.ask_question(prompts[i], max_new_tokens,
+                                                         stop_at_json_end=stop_at_json_end))
+                    except Exception as item_error:
+                        print(f"Generation failed for prompt {i}: {item_error}")
+                        answers.append(None)
+            for i, answer in zip(indices, answers):
+                results[i] = answer
+        return results
+
+    def ask_questions_with_schema(self, prompts: List[str],
+                                  json_schemas: Union[dict, List[dict]],
+                                  max_new_tokens: int = 128,
+                                  prefix: Optional[str] = None,
+                                  batch_size: int = 8) -> List[Optional[dict]]:
+        """Answer many prompts with JSON objects matching a schema per prompt.
+
+        Prompts are decoded together in micro-batches with
+        JsonSchemaDecoder.generate_batch: one forward pass per step for all
+        unfinished prompts, each with its own token mask, so every prompt gets
+        the same constrained decoding and token budget as with
+        ask_question_with_schema.
+
+        Args:
+            prompts: Prompts to answer
+            json_schemas: One schema for all prompts, or a list with one schema per prompt
+            max_new_tokens: Maximum tokens per string or number value
+            prefix: Leading part of the prompts whose KV cache is kept for reuse
+            batch_size: Number of prompts decoded together
+
+        Returns:
+            Parsed JSON answers in input order, None where an answer could not be
+            produced; other prompts are unaffected.
+        """
+        if isinstance(json_schemas, dict):
+            json_schemas = [json_schemas] * len(prompts)
+        if len(json_schemas) != len(prompts):
+            raise ValueError("Expected one schema per prompt.")
+        if prefix is not None:
+            self.cache_prefix(prefix)
+        if self._decoder is None:
+            self._decoder = JsonSchemaDecoder(self._model, self._tokenizer, self._device)
+
+        results: List[Optional[dict]] = [None] * len(prompts)
+        for start in range(0, len(prompts), batch_size):
+            indices = list(range(start, min(start + batch_size, len(prompts))))
+            try:
+                with instrumentation.span("tokenize"):
+                    encoded = [encode_prompt(self._tokenizer, prompts[i]) for i in indices]
+                answers = self._decoder.generate_batch(
+                    encoded,
+                    [json_schemas[i] for i in indices],
+                    past_key_values=self._shared_past_for(encoded),
+                    temperature=random.uniform(1.3, 1.5),
+                    max_string_tokens=max_new_tokens
+                )
+            except Exception as e:
+                print(f"Batched schema generation failed ({e}), retrying prompts individually.")
+                answers = []
+                for i in indices:
+                    try:
+                        answers.append(self.ask_question_with_schema(prompts[i], json_schemas[i], max_new_tokens))
+                    except Exception as item_error:
+                        answers.append(item_error)
+            for i, answer in zip(indices, answers):
+                if isinstance(answer, Exception):
+                    print(f"Schema generation failed for prompt {i}: {answer}")
+                else:
+                    results[i] = answer
+        return results
+
+    def _generate_batch(self, prompts: List[str], max_new_tokens: int, stop_at_json_end: bool = False) -> List[str]:
+        temperature = random.uniform(1.3, 1.5)
 
-        generated_ids = outputs[0]
-        gen_tokens = generated_ids[input_ids.shape[-1]:]
-        raw_text = self._tokenizer.decode(gen_tokens, skip_special_tokens=True)
-        return raw_text
+        with instrumentation.span("tokenize"):
+            encoded = [encode_prompt(self._tokenizer, prompt) for prompt in prompts]
+        width = max(len(ids) for ids in encoded)
+        pad_token_id = self._tokenizer.pad_token_id
+        input_ids = torch.tensor([[pad_token_id] * (width - len(ids)) + ids for ids in encoded],
+                                 device=self._device)
+        attention_mask = torch.tensor([[0] * (width - len(ids)) + [1] * len(ids) for ids in encoded],
+                                      device=self._device)
+
+        outputs = self._generate(
+            input_ids,
+            attention_mask=attention_mask,
+            max_new_tokens=max_new_tokens,
+            do_sample=True,
+            temperature=temperature,
+            pad_token_id=self._tokenizer.pad_token_id,
+            stopping_criteria=StoppingCriteriaList([_JsonEndCriteria(self._tokenizer)]) if stop_at_json_end else None
+        )
+
+        gen_tokens = outputs[:, input_ids.shape[-1]:]
+        return self._tokenizer.batch_decode(gen_tokens, skip_special_tokens=True)
 
     def create_pydantic_model_from_schema(self, schema: Dict[str, Any]) -> Type[BaseModel]:
         model_fields = {}
@@ -67,23 +415,42 @@ class EasyLLM:
         DynamicModel = create_model('DynamicModel', **model_fields)
         return DynamicModel
 
-    def ask_question_with_schema(self, prompt: str, json_schema: dict, max_new_tokens: int = 128) -> dict:
+    def ask_question_with_schema(self, prompt: str, json_schema: dict, max_new_tokens: int = 128,
+                                 prefix: Optional[str] = None) -> dict:
+        """Answer a prompt with JSON matching json_schema using constrained decoding.
+
+        The answer is generated in one pass that reuses the KV cache between
+        tokens, with the JSON structure forced and values masked to valid tokens.
+
+        Args:
+            prompt: Prompt to answer
+            json_schema: Schema the answer must follow
+            max_new_tokens: Maximum tokens per string or number value
+            prefix: Leading part of the prompt whose KV cache is kept for reuse
+
+        Returns:
+            The generated JSON value
+        """
         temperature = random.uniform(1.3, 1.5)
-        
-        # Set do_sample to True in the model's configuration
-        self._model.config.do_sample = True
-        
-        jsonformer = Jsonformer(
-            self._model,
-            self._tokenizer,
+        if prefix is not None:
+            self.cache_prefix(prefix)
+        if self._decoder is None:
+            self._decoder = JsonSchemaDecoder(self._model, self._tokenizer, self._device)
+
+        input_ids = self._encode(prompt)
+        return self._decoder.generate(
+            input_ids,
             json_schema,
-            prompt,
-            max_number_tokens=max_new_tokens,
-            max_string_token_length=max_new_tokens,
-            temperature=temperature
+            past_key_values=self._cached_past_for(input_ids),
+            temperature=temperature,
+            max_string_tokens=max_new_tokens
         )
-        generated_json = jsonformer()
-        return generated_json
+
+    def memory_footprint(self) -> int:
+        """Return the memory used by the loaded model weights in bytes."""
+        if self._model is None:
+            return 0
+        return self._model.get_memory_footprint()
 
     def unload_model(self):
         print("Unloading model...")
@@ -91,7 +458,145 @@ class EasyLLM:
             del self._model
             self._model = None
         if self._tokenizer:
+            if get_budget_tokenizer() is self._tokenizer:
+                set_budget_tokenizer(None)
             del self._tokenizer
             self._tokenizer = None
+        self._decoder = None
+        self._prefix_cache.clear()
         torch.cuda.empty_cache()
         print("Model unloaded.")
+
+
+class _FirstLogitsTimer(LogitsProcessor):
+    """Notes when generate() first produces logits, which ends the prefill."""
+
+    def __init__(self) -> None:
+        self.first_logits: Optional[float] = None
+
+    def __call__(self, input_ids: torch.Tensor, scores: torch.Tensor) -> torch.Tensor:
+        if self.first_logits is None:
+            self.first_logits = time.perf_counter()
+        return scores
+
+
+class _IncrementalDetokenizer:
+    """Decodes generated tokens one at a time without decoding the whole answer again.
+
+    Like TextIteratorStreamer, only a short window of the latest tokens is
+    decoded: the text of the new token is the decoded window minus the
+    decoded window without it, so spacing that depends on the previous token
+    comes out right.
+    """
+
+    def __init__(self, tokenizer: Any) -> None:
+        self.tokenizer = tokenizer
+        self.tokens: List[int] = []
+        self.prefix_offset = 0  # Start of the decoded window
+        self.read_offset = 0  # Tokens whose text has been returned
+
+    def add(self, token: int) -> Optional[str]:
+        """Add a token and return the text it completes, None while it ends in an incomplete character."""
+        self.tokens.append(token)
+        prefix_text = self.tokenizer.decode(self.tokens[self.prefix_offset:self.read_offset], skip_special_tokens=True)
+        text = self.tokenizer.decode(self.tokens[self.prefix_offset:], skip_special_tokens=True)
+        if text.endswith("\ufffd"):
+            return None
+        self.prefix_offset = self.read_offset
+        self.read_offset = len(self.tokens)
+        return text[len(prefix_text):]
+
+    def flush(self) -> str:
+        """Return the text of tokens held back by add, if any."""
+        if self.read_offset == len(self.tokens):
+            return ""
+        prefix_text = self.tokenizer.decode(self.tokens[self.prefix_offset:self.read_offset], skip_special_tokens=True)
+        text = self.tokenizer.decode(self.tokens[self.prefix_offset:], skip_special_tokens=True)
+        self.prefix_offset = self.read_offset = len(self.tokens)
+        return text[len(prefix_text):]
+
+
+class _JsonEndTracker:
+    """Finds the brace closing the first JSON object in text fed piece by piece.
+
+    Text before the first "{" is skipped and braces inside JSON strings are ignored.
+    """
+
+    def __init__(self) -> None:
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.closed = False
+
+    def feed(self, text: str) -> Optional[int]:
+        """Track the next piece of text.
+
+        Returns:
+            Offset in text just after the closing brace, None if the object is
+            not closed in this piece
+        """
+        if self.closed:
+            return None
+        for i, char in enumerate(text):
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"' and self.depth:
+                self.in_string = True
+            elif char == "{":
+                self.depth += 1
+            elif char == "}" and self.depth:
+                self.depth -= 1
+                if not self.depth:
+                    self.closed = True
+                    return i + 1
+        return None
+
+
+class _JsonEndCriteria(StoppingCriteria):
+    """Stops each sequence of a generate() batch once its first JSON object is closed."""
+
+    def __init__(self, tokenizer: Any) -> None:
+        self.tokenizer = tokenizer
+        self._trackers: Optional[List[_JsonEndTracker]] = None
+
+    def __call__(self, input_ids: torch.Tensor, scores: torch.Tensor, **kwargs: Any) -> torch.Tensor:
+        if self._trackers is None:
+            self._trackers = [_JsonEndTracker() for _ in range(input_ids.shape[0])]
+        # Braces and quotes are single characters, so decoding the newest token alone suffices
+        for tracker, token in zip(self._trackers, input_ids[:, -1].tolist()):
+            if not tracker.closed:
+                tracker.feed(self.tokenizer.decode([token]))
+        return torch.tensor([tracker.closed for tracker in self._trackers], device=input_ids.device)
+
+
+def _stop_position(text: str, checked: int, stop: List[str],
+                   json_end: Optional[_JsonEndTracker]) -> Tuple[Optional[int], str]:
+    """Return where the answer ends in text and why, searching from checked on."""
+    ends = []
+    for stop_text in stop:
+        index = text.find(stop_text, max(0, checked - len(stop_text) + 1))
+        if index != -1:
+            ends.append((index, "stop"))
+    if json_end is not None:
+        offset = json_end.feed(text[checked:])
+        if offset is not None:
+            ends.append((checked + offset, "json_end"))
+    if not ends:
+        return None, "length"
+    return min(ends)
+
+
+def _partial_stop_length(text: str, stop: List[str]) -> int:
+    """Return the length of the longest end of text that starts a stop string."""
+    longest = 0
+    for stop_text in stop:
+        for length in range(min(len(stop_text) - 1, len(text)), longest, -1):
+            if text.endswith(stop_text[:length]):
+                longest = length
+                break
+    return longest
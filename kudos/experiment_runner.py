@@ -0,0 +1,230 @@
+import argparse
+import contextlib
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional
+
+# run_simulation arguments; every other run parameter goes to the GameSimulator constructor
+RUN_PARAMETERS = ('num_rounds', 'min_delay', 'max_delay', 'max_concurrency')
+
+
+def _run_id(parameters: Dict[str, Any]) -> str:
+    encoded = json.dumps(parameters, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()[:12]
+
+
+def expand_sweep(spec: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Expand a sweep specification into one entry per simulation run.
+
+    The specification has three optional parts:
+
+    - "base": parameters shared by all runs
+    - "grid": parameter name -> list of values, or -> {label: value} for values
+      such as network_groups that are better reported by a short label
+    - "seeds": list of seeds, every grid point is run once per seed
+
+    Parameters are GameSimulator arguments, the run_simulation arguments in
+    RUN_PARAMETERS, and "backend", a dict with the create_backend name and
+    options. A stub backend without a seed gets the run's seed.
+
+    Args:
+        spec: The sweep specification
+
+    Returns:
+        Runs with "run_id", "labels" (grid values as reported) and "parameters".
+        The run_id is derived from the parameters, so it is stable across
+        invocations and identifies runs to skip when a sweep is resumed.
+    """
+    base = spec.get('base', {})
+    grid = spec.get('grid', {})
+    seeds = spec.get('seeds', [base.get('seed')])
+
+    axes = []
+    for name, values in grid.items():
+        if isinstance(values, dict):
+            axes.append([(name, label, value) for label, value in values.items()])
+        else:
+            axes.append([(name, value, value) for value in values])
+
+    runs = []
+    for point in itertools.product(*axes):
+        for seed in seeds:
+            parameters = {**base, **{name: value for name, _, value in point}, 'seed': seed}
+            labels = {name: label for name, label, _ in point}
+            labels['seed'] = seed
+            runs.append({'run_id': _run_id(parameters), 'labels': labels, 'parameters': parameters})
+    return runs
+
+
+def _group_scores(simulator: Any) -> Dict[str, int]:
+    user_groups = {agent.username: agent.group_name for agent in simulator.ai_agents}
+    return simulator.score_tracker.group_scores(user_groups)
+
+
+def run_single(run: Dict[str, Any], run_dir: str) -> Dict[str, Any]:
+    """Run one simulation in its own directory and return its results row.
+
+    The posts file, checkpoint and log of the run live in run_dir. If a
+    checkpoint from an interrupted attempt exists the run is resumed from it.
+
+    Args:
+        run: Entry produced by expand_sweep
+        run_dir: Directory for this run's files
+
+    Returns:
+        Results row with the run labels, status, scores and timing
+    """
+    from .game_rules import game_rules
+    from .game_simulator import GameSimulator
+    from .llm_backends import create_backend
+
+    os.makedirs(run_dir, exist_ok=True)
+    parameters = dict(run['parameters'])
+    backend_spec = dict(parameters.pop('backend', None) or {'name': 'transformers'})
+    if backend_spec.get('name') == 'stub':
+        backend_spec.setdefault('seed', parameters.get('seed') or 0)
+    run_arguments = {key: parameters.pop(key) for key in RUN_PARAMETERS if key in parameters}
+    parameters.setdefault('game_rules', game_rules)
+    extension = os.path.splitext(parameters.get('posts_file', 'posts.json'))[1] or '.json'
+    parameters['posts_file'] = os.path.join(run_dir, f"posts{extension}")
+    checkpoint_path = os.path.join(run_dir, "checkpoint.json")
+
+    row: Dict[str, Any] = {'run_id': run['run_id'], **run['labels']}
+    start = time.perf_counter()
+    with open(os.path.join(run_dir, "log.txt"), 'a') as log, contextlib.redirect_stdout(log):
+        try:
+            backend = create_backend(**backend_spec)
+            if os.path.exists(checkpoint_path):
+                simulator = GameSimulator.resume(checkpoint_path, backend=backend)
+            else:
+                simulator = GameSimulator(**parameters, backend=backend, checkpoint_path=checkpoint_path)
+            results = simulator.run_simulation(pause_between_rounds=False, **run_arguments)
+            group_scores = _group_scores(simulator)
+            row.update({
+                'status': 'ok',
+                'total_posts': results['total_posts'],
+                'rounds': simulator.game_manager.get_round() - 1,
+                'group_scores': group_scores,
+                'winner': max(group_scores, key=group_scores.get) if group_scores else None,
+            })
+        except Exception as e:
+            traceback.print_exc(file=log)
+            row.update({'status': 'error', 'error': f"{type(e).__name__}: {e}"})
+    row['duration_s'] = round(time.perf_counter() - start, 3)
+    return row
+
+
+class ExperimentRunner:
+    """Runs the simulations of a sweep in parallel worker processes.
+
+    Every run gets its own directory under output_dir/runs holding its posts
+    store, checkpoint and log, and its own seed. Result rows are appended to
+    output_dir/results.jsonl as runs finish. Running the same sweep again
+    skips runs that already have a successful row and resumes interrupted
+    runs from their checkpoints.
+    """
+
+    def __init__(self, spec: Dict[str, Any], output_dir: str, max_workers: Optional[int] = None) -> None:
+        """Initialize the runner.
+
+        Args:
+            spec: Sweep specification, see expand_sweep
+            output_dir: Directory for run directories and results.jsonl
+            max_workers: Worker processes, the CPU count if None. Each worker
+                running the transformers backend loads its own model copy.
+        """
+        self.spec = spec
+        self.output_dir = output_dir
+        self.max_workers = max_workers
+        self.results_path = os.path.join(output_dir, "results.jsonl")
+
+    def completed_runs(self) -> Dict[str, Dict[str, Any]]:
+        """Return the successful result rows recorded so far, by run_id."""
+        completed = {}
+        if os.path.exists(self.results_path):
+            with open(self.results_path, 'r') as file:
+                for line in file:
+                    if line.strip():
+                        row = json.loads(line)
+                        if row.get('status') == 'ok':
+                            completed[row['run_id']] = row
+        return completed
+
+    def run(self) -> List[Dict[str, Any]]:
+        """Run every run of the sweep that has not completed yet.
+
+        Returns:
+            Result rows of all runs in the sweep, in sweep order
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        runs = expand_sweep(self.spec)
+        rows = self.completed_runs()
+        pending = [run for run in runs if run['run_id'] not in rows]
+        print(f"{len(runs)} runs in sweep, {len(runs) - len(pending)} already completed.")
+
+        if pending:
+            # Spawned workers do not inherit model or CUDA state from this process
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context) as pool, \
+                    open(self.results_path, 'a') as results:
+                futures = {
+                    pool.submit(run_single, run, os.path.join(self.output_dir, "runs", run['run_id'])): run
+                    for run in pending
+                }
+                for done, future in enumerate(as_completed(futures), start=1):
+                    run = futures[future]
+                    try:
+                        row = future.result()
+                    except Exception as e:
+                        row = {'run_id': run['run_id'], **run['labels'], 'status': 'error',
+                               'error': f"{type(e).__name__}: {e}"}
+                    results.write(json.dumps(row, default=str) + "\n")
+                    results.flush()
+                    rows[row['run_id']] = row
+                    print(f"[{done}/{len(pending)}] {row['run_id']} {row['status']}")
+        return [rows[run['run_id']] for run in runs if run['run_id'] in rows]
+
+
+def load_results(output_dir: str) -> Any:
+    """Load the results of a sweep as a pandas DataFrame, one row per run.
+
+    Only the latest row of each run is kept and group scores are expanded
+    into "score_<group>" columns.
+    """
+    import pandas as pd
+    rows: Dict[str, Dict[str, Any]] = {}
+    with open(os.path.join(output_dir, "results.jsonl"), 'r') as file:
+        for line in file:
+            if line.strip():
+                row = json.loads(line)
+                rows[row['run_id']] = row
+    records = []
+    for row in rows.values():
+        record = {key: value for key, value in row.items() if key != 'group_scores'}
+        for group, score in (row.get('group_scores') or {}).items():
+            record[f"score_{group}"] = score
+        records.append(record)
+    return pd.DataFrame(records)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run a sweep of Kudos simulations in parallel.")
+    parser.add_argument("spec", help="JSON sweep specification")
+    parser.add_argument("output_dir", help="Directory for run files and results.jsonl")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    args = parser.parse_args()
+    with open(args.spec, 'r') as file:
+        spec = json.load(file)
+    rows = ExperimentRunner(spec, args.output_dir, args.workers).run()
+    failed = [row for row in rows if row['status'] != 'ok']
+    print(f"{len(rows) - len(failed)} runs succeeded, {len(failed)} failed. Results in {args.output_dir}/results.jsonl")
+
+
+if __name__ == "__main__":
+    main()
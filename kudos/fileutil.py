@@ -0,0 +1,68 @@
+import json
+import os
+import stat
+import tempfile
+from contextlib import contextmanager
+from typing import IO, Any, Iterator, Optional
+
+
+def _read_umask() -> int:
+    """Return the process umask, without changing it where the OS reports it."""
+    try:
+        with open("/proc/self/status") as file:
+            for line in file:
+                if line.startswith("Umask:"):
+                    return int(line.split()[1], 8)
+    except OSError:
+        pass
+    # Setting the umask is the only portable way to read it; this runs once at import
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+_UMASK = _read_umask()
+
+
+def replace_file(tmp_path: str, path: str) -> None:
+    """Rename tmp_path over path, giving it the permissions a plain open(path, "w") would.
+
+    mkstemp creates files readable only by their owner; the replacement keeps
+    the mode of the existing file instead, or gets the default for the umask
+    the process started with if new.
+    """
+    try:
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        mode = 0o666 & ~_UMASK
+    os.chmod(tmp_path, mode)
+    os.replace(tmp_path, path)
+
+
+@contextmanager
+def atomic_write(path: str, mode: str = 'w') -> Iterator[IO[Any]]:
+    """Open a temporary file that replaces path once the block completes.
+
+    Readers see either the old or the complete new file. If the block raises,
+    the temporary file is removed and path is left untouched.
+
+    Args:
+        path: File to replace
+        mode: Open mode of the temporary file, 'w' or 'wb'
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode) as file:
+            yield file
+        replace_file(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def write_json_atomic(path: str, data: Any, indent: Optional[int] = None) -> None:
+    """Write JSON to a temporary file and rename it over path."""
+    with atomic_write(path) as file:
+        json.dump(data, file, indent=indent)
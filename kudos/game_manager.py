@@ -1,9 +1,27 @@
 import random
-from typing import Dict, List
+from typing import Dict, List, Optional
 from .posting_interface import PostingInterface
 from .post_manager import PostManager
 from .llm_wrapper import ask_question
+from .llm_backends import LLMBackend
 from .scoring import UserScoreTracker
+from .prompt_templates import PromptTemplate
+from . import instrumentation
+
+# Token budget of the assessment prompt; the oldest posts are dropped to stay within it.
+ASSESSMENT_PROMPT_MAX_TOKENS = 16384
+
+ASSESSMENT_PROMPT_TEMPLATE = PromptTemplate(
+    "You are an expert in online community analysis and cultural trend recognition. "
+    "Your task is to analyze the following social media posts to assess the collective vibe or emotional atmosphere they convey. "
+    "Based on the overall tone, energy, and recurring themes, determine which of the listed groups best embodies the current mood. "
+    "Consider factors such as optimism, sarcasm, intensity, playfulness, or seriousness. "
+    "The goal is not to identify the most mentioned group, but to find the one whose identity, interests, and communication style "
+    "most closely reflect the prevailing sentiment in the posts. "
+    "Posts: '{posts}' Groups: '{groups}'",
+    list_slots=("posts",),
+    max_tokens=ASSESSMENT_PROMPT_MAX_TOKENS
+)
 
 class GameManager:
     def __init__(
@@ -11,7 +29,8 @@ class GameManager:
         post_manager: PostManager,
         score_tracker: UserScoreTracker,
         posting_interface: PostingInterface,
-        groups: Dict[str, str]
+        groups: Dict[str, str],
+        backend: Optional[LLMBackend] = None
     ) -> None:
         self.post_manager = post_manager
         self.score_tracker = score_tracker
@@ -19,6 +38,8 @@ class GameManager:
         self.round = 1
         self.players = []
         self.groups = groups
+        self.backend = backend
+        self.rng = random
 
     def add_player(self, username: str, player_group: str) -> None:
         """Add a player to the game if the username is unique.
@@ -43,7 +64,7 @@ class GameManager:
                 group_counts[p['group']] += 1
         min_count = min(group_counts.values())
         least_represented_groups = [g for g, count in group_counts.items() if count == min_count]
-        return random.choice(least_represented_groups)
+        return self.rng.choice(least_represented_groups)
 
     def get_player_group(self, username: str) -> str:
         """Return the group of the specified player."""
@@ -58,6 +79,8 @@ class GameManager:
 
     def increment_round(self) -> None:
         """Advance the game to the next round and handle end-of-round logic."""
+        if self.posting_interface is not None:
+            self.posting_interface.flush_moderation()
         self.score_tracker.initialize_round_scores(self.round + 1)
         posts = self.post_manager.get_posts_by_round(self.get_round())
         self.end_of_round_assessment(posts, self.get_round())
@@ -72,17 +95,8 @@ class GameManager:
         # Extract post content as a list
         posts_list = [post['message'] for post in posts]
 
-        question = (
-                "You are an expert in online community analysis and cultural trend recognition. "
-                "Your task is to analyze the following social media posts to assess the collective vibe or emotional atmosphere they convey. "
-                "Based on the overall tone, energy, and recurring themes, determine which of the listed groups best embodies the current mood. "
-                "Consider factors such as optimism, sarcasm, intensity, playfulness, or seriousness. "
-                "The goal is not to identify the most mentioned group, but to find the one whose identity, interests, and communication style "
-                "most closely reflect the prevailing sentiment in the posts. "
-                f"Posts: '{posts_list}' Groups: '{self.groups}'"
-            )
+        question = ASSESSMENT_PROMPT_TEMPLATE.render(posts=posts_list, groups=self.groups)
 
-        
         schema_dict = {
             "type": "object",
             "properties": {
@@ -90,7 +104,8 @@ class GameManager:
                     "type": "object",
                     "properties": {
                         "dominant_group": {
-                            "type": "string"
+                            "type": "string",
+                            "enum": list(self.groups)
                         },
                         "tone_summary": {
                             "type": "string"
@@ -104,7 +119,8 @@ class GameManager:
             }
         }
 
-        response = ask_question(question, schema_dict, 300)
+        with instrumentation.span("assessment"):
+            response = ask_question(question, schema_dict, 300, backend=self.backend)
         
         dominant_group = response["assessment"]["dominant_group"]
         for player in self.players:
@@ -114,6 +130,4 @@ class GameManager:
 
     def get_scores_for_round(self, round: int) -> Dict[str, int]:
         """Get user scores for a specific round."""
-        scores = self.score_tracker.get_scores()
-        round_scores = {user: scores[user].get(round, 0) for user in scores}
-        return round_scores
+        return self.score_tracker.round_scores(round)
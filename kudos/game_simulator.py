@@ -1,16 +1,31 @@
 from typing import Dict, List, Optional, Any
+from datetime import datetime
+import asyncio
+import json
 import random
-import time
 from collections import defaultdict
 import string
 import random
 
 from .post_manager import PostManager
+from .fileutil import write_json_atomic
+from .verdict_cache import VerdictCache
+from .moderation import ModerationCascade
 from .scoring import UserScoreTracker
 from .posting_interface import PostingInterface
 from .game_manager import GameManager
 from .ai_agent import AIAgent
 from .ai_game_round_runner import AIGameRoundRunner
+from .llm_backends import LLMBackend
+from .llm_wrapper import get_backend
+from .sim_clock import EventScheduler, VirtualClock
+from . import instrumentation
+
+# Bump when the checkpoint layout changes
+CHECKPOINT_VERSION = 4
+# Version 2 checkpoints differ only in their posts watermark, which the stores still accept,
+# and versions 2 and 3 in lacking the answers of agent decisions in flight
+_READABLE_CHECKPOINT_VERSIONS = (2, 3, CHECKPOINT_VERSION)
 
 class GameSimulator:
     """Provides a clean interface for running social network game simulations."""
@@ -22,7 +37,16 @@ class GameSimulator:
         game_rules: str,
         num_ai_players: int = 4,
         posts_file: str = 'simulation_posts.json',
-        actions_per_user: int = 3
+        actions_per_user: int = 3,
+        verdict_cache_dir: Optional[str] = None,
+        backend: Optional[LLMBackend] = None,
+        seed: Optional[int] = None,
+        deferred_moderation: bool = False,
+        moderation_batch_size: int = 16,
+        moderation_cascade: Optional[ModerationCascade] = None,
+        checkpoint_path: Optional[str] = None,
+        checkpoint_every: int = 0,
+        start_time: Optional[datetime] = None
     ) -> None:
         """Initialize the game simulation environment.
 
@@ -31,24 +55,78 @@ class GameSimulator:
             network_biography: Narrative describing the network
             game_rules: Overall rules for scoring and gameplay
             num_ai_players: Number of AI-controlled players
-            posts_file: JSON file path for storing posts
+            posts_file: File path for storing posts; a ".jsonl" extension selects
+                the append-only event log and ".db"/".sqlite" the SQLite storage
             actions_per_user: Max actions per user in one round
+            verdict_cache_dir: Directory for cached moderation verdicts, None disables caching
+            backend: LLM backend used by agents, moderation and assessment. Defaults
+                to the process-wide backend (transformers unless replaced).
+            seed: Seed for usernames, group assignment and action order
+            deferred_moderation: Store posts immediately and moderate them in batches,
+                at the latest at the end of each round
+            moderation_batch_size: Number of pending posts that triggers a moderation batch
+            moderation_cascade: Keyword rules and classifier consulted before the LLM
+                moderation check
+            checkpoint_path: File the simulation state is saved to after every round
+                and during rounds, None disables checkpoints. See resume.
+            checkpoint_every: Actions between checkpoints within a round, 0 to
+                checkpoint only at the end of rounds. Each checkpoint rewrites the
+                checkpoint file and reads the posts store's watermark, which is
+                constant time for the jsonl and SQLite stores but linear in the
+                number of posts for the JSON store.
+            start_time: Simulated time of the first round, the current time if None.
+                Post timestamps are taken from the simulated clock.
         """
+        self._config = {
+            'network_groups': network_groups,
+            'network_biography': network_biography,
+            'game_rules': game_rules,
+            'num_ai_players': num_ai_players,
+            'posts_file': posts_file,
+            'actions_per_user': actions_per_user,
+            'verdict_cache_dir': verdict_cache_dir,
+            'seed': seed,
+            'deferred_moderation': deferred_moderation,
+            'moderation_batch_size': moderation_batch_size,
+            'checkpoint_every': checkpoint_every,
+        }
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_every = checkpoint_every
+        self._schedule: Optional[List[AIAgent]] = None
+        self._schedule_times: List[float] = []
+        self._schedule_position = 0
+        self._checkpoint_position = 0
+        # Answers of agent decisions requested for later actions, saved with mid-round checkpoints
+        self._in_flight_answers: List[Any] = []
+        self.game_rules = game_rules
+        self.backend = backend
+        self.rng = random.Random(seed)
+        # Delays get their own generator, so they don't change the action order
+        self.timing_rng = random.Random(None if seed is None else f"{seed}-timing")
+        self.clock = VirtualClock(start_time)
         self.post_manager = PostManager(posts_file)
+        self.post_manager.clock = self.clock
         self.score_tracker = UserScoreTracker()
         self.game_manager = GameManager(
             self.post_manager,
             self.score_tracker,
             None,
-            network_groups
+            network_groups,
+            backend=backend
         )
         self.posting_interface = PostingInterface(
             self.post_manager,
             network_biography,
             self.game_manager,
-            self.score_tracker
+            self.score_tracker,
+            verdict_cache=VerdictCache(verdict_cache_dir) if verdict_cache_dir else None,
+            backend=backend,
+            deferred_moderation=deferred_moderation,
+            moderation_batch_size=moderation_batch_size,
+            moderation_cascade=moderation_cascade
         )
         self.game_manager.posting_interface = self.posting_interface
+        self.game_manager.rng = self.rng
         
         # Setup AI players
         self.ai_agents = self._initialize_ai_agents(num_ai_players, game_rules)
@@ -72,11 +150,11 @@ class GameSimulator:
             A unique username string.
         """
         def random_suffix(length=3):
-            return ''.join(random.choices(string.ascii_letters + string.digits, k=length))
+            return ''.join(self.rng.choices(string.ascii_letters + string.digits, k=length))
 
         # Attempt to generate a unique name
         for _ in range(100):  # Limit to 100 attempts to avoid infinite loop
-            base = random.choice(base_names)
+            base = self.rng.choice(base_names)
             candidate_name = f"{base}_{random_suffix()}"
             if candidate_name not in existing_names:
                 return candidate_name
@@ -105,7 +183,7 @@ class GameSimulator:
 
             group = self.game_manager.get_least_represented_group()
             self.game_manager.add_player(username, group)
-            agents.append(AIAgent(username, group, game_rules, self.game_manager.groups))
+            agents.append(AIAgent(username, group, game_rules, self.game_manager.groups, backend=self.backend))
 
         return agents
 
@@ -116,67 +194,281 @@ class GameSimulator:
         num_rounds: int = 4,
         min_delay: float = 0.5,
         max_delay: float = 2.0,
-        pause_between_rounds: bool = True
+        pause_between_rounds: bool = True,
+        max_concurrency: int = 1,
+        real_time: bool = False
     ) -> Dict[str, Any]:
         """Run the complete game simulation.
 
+        Actions are events on a simulated clock, each following the previous
+        one after a random delay. They are processed in time order without
+        waiting, unless real_time is set.
+
         Args:
             num_rounds: Number of rounds to simulate
-            min_delay: Minimum delay between actions (seconds)
-            max_delay: Maximum delay between actions (seconds)
+            min_delay: Minimum simulated delay between actions (seconds)
+            max_delay: Maximum simulated delay between actions (seconds)
             pause_between_rounds: Prompt user before proceeding
+            max_concurrency: Number of agent decisions requested from the backend
+                at once. Above 1 rounds run through the async round runner.
+            real_time: Sleep for the delays between actions, as the simulation
+                did before it had a simulated clock. Ignored above max_concurrency 1.
 
         Returns:
             Dictionary containing final scores and other stats
+
+        Rounds already completed, e.g. before a resume, count toward num_rounds.
         """
-        for current_round in range(num_rounds):
-            print(f"\n=== Starting Round {current_round + 1} ===")
-            self._run_round(min_delay, max_delay)
-            
-            if pause_between_rounds:
-                input("\nPress Enter to end round and see scores...")
-            
-            self.game_manager.increment_round()
+        if self.checkpoint_path and self._schedule is None:
+            # Gives an interrupted first round a checkpoint to resume from
+            self.save_checkpoint()
+        for current_round in range(self.game_manager.get_round() - 1, num_rounds):
+            if self._schedule is None:
+                print(f"\n=== Starting Round {current_round + 1} ===")
+            else:
+                print(f"\n=== Resuming Round {current_round + 1} at action {self._schedule_position + 1} ===")
+            with instrumentation.collect('round', round=current_round + 1):
+                if max_concurrency > 1:
+                    self._run_round_async(max_concurrency, min_delay, max_delay)
+                else:
+                    self._run_round(min_delay, max_delay, real_time)
+
+                if pause_between_rounds:
+                    input("\nPress Enter to end round and see scores...")
+
+                with instrumentation.span("end_of_round"):
+                    self.game_manager.increment_round()
+            self._schedule = None
+            self._schedule_times = []
+            self._schedule_position = self._checkpoint_position = 0
+            if self.checkpoint_path:
+                self.save_checkpoint()
             scores = self.game_manager.get_scores_for_round(self.game_manager.get_round() - 1)
             print(f"\nScores after Round {current_round + 1}:", scores)
 
+        if instrumentation.enabled():
+            instrumentation.print_summary()
         return self._get_final_results()
 
-    def _run_round(self, min_delay: float, max_delay: float) -> None:
-        """Execute a single round of the game.
+    def _run_round(self, min_delay: float, max_delay: float, real_time: bool = False) -> None:
+        """Execute a single round of the game, or the rest of a resumed round.
 
         Args:
-            min_delay: Minimum time to wait between actions
-            max_delay: Maximum time to wait between actions
+            min_delay: Minimum simulated time between actions
+            max_delay: Maximum simulated time between actions
+            real_time: Also wait the simulated time between actions
         """
-        actions_remaining = defaultdict(lambda: self.actions_per_user)
-        available_agents = self.ai_agents.copy()
-        
-        while available_agents:
-            time.sleep(random.uniform(min_delay, max_delay))
-            agent = random.choice(available_agents)
-            
+        schedule = self._start_schedule(min_delay, max_delay)
+        events = EventScheduler(self.clock, real_time)
+        for position in range(self._schedule_position, len(schedule)):
+            events.schedule_at(self._schedule_times[position], position)
+        while events:
+            agent = schedule[events.pop()]
             action = self.round_runner.process_single_action(
                 agent, 
                 self.game_manager.get_round()
             )
             print(f"{agent.username} performed: {action['action_type']}")
-            
+            self._schedule_position += 1
+            self._checkpoint_in_round()
+
+    def _run_round_async(self, max_concurrency: int, min_delay: float, max_delay: float) -> None:
+        """Execute a single round with several agent decisions in flight at once.
+
+        The clock is advanced to each action's simulated time before the
+        action is applied, so posts carry the same timestamps as in a
+        sequential run. A mid-round checkpoint stores the answers of the
+        decisions in flight, which a resumed round uses instead of asking
+        again, so it continues as the uninterrupted round would.
+
+        Args:
+            max_concurrency: Maximum number of concurrent agent decisions
+            min_delay: Minimum simulated time between actions
+            max_delay: Maximum simulated time between actions
+        """
+        schedule = self._start_schedule(min_delay, max_delay)
+        start = self._schedule_position
+
+        def after_action(done: int, in_flight: Optional[List[Any]]) -> None:
+            self._schedule_position = start + done
+            self._in_flight_answers = in_flight or []
+            self._checkpoint_in_round()
+
+        def before_action(index: int) -> None:
+            self.clock.advance_to(self._schedule_times[start + index])
+
+        remaining = schedule[start:]
+        answers, self._in_flight_answers = self._in_flight_answers, []
+        actions = asyncio.run(self.round_runner.process_actions_async(
+            remaining,
+            self.game_manager.get_round(),
+            max_concurrency,
+            after_action=after_action,
+            before_action=before_action,
+            is_checkpoint=lambda done: self._checkpoint_due(start + done),
+            answers=answers
+        ))
+        for agent, action in zip(remaining, actions):
+            print(f"{agent.username} performed: {action['action_type']}")
+
+    def _start_schedule(self, min_delay: float, max_delay: float) -> List[AIAgent]:
+        """Return the current round's schedule, drawing it unless a resumed round is in progress.
+
+        A new schedule also gets the simulated time of each action, in
+        _schedule_times, each following the previous one by a random delay.
+        """
+        if self._schedule is None:
+            self._schedule = self._build_round_schedule()
+            self._schedule_times = []
+            elapsed = self.clock.elapsed
+            for _ in self._schedule:
+                elapsed += self.timing_rng.uniform(min_delay, max_delay)
+                self._schedule_times.append(elapsed)
+            self._schedule_position = self._checkpoint_position = 0
+        return self._schedule
+
+    def _checkpoint_due(self, position: int) -> bool:
+        """Return whether a mid-round checkpoint is taken once position actions of the round are applied."""
+        return bool(self.checkpoint_path and self.checkpoint_every
+                    and position - self._checkpoint_position >= self.checkpoint_every)
+
+    def _checkpoint_in_round(self) -> None:
+        if self._checkpoint_due(self._schedule_position):
+            self.save_checkpoint()
+
+    def _build_round_schedule(self) -> List[AIAgent]:
+        """Draw the order in which agents act this round.
+
+        Returns:
+            Agents in action order, each appearing actions_per_user times
+        """
+        actions_remaining = defaultdict(lambda: self.actions_per_user)
+        available_agents = self.ai_agents.copy()
+        schedule = []
+
+        while available_agents:
+            agent = self.rng.choice(available_agents)
+            schedule.append(agent)
+
             actions_remaining[agent.username] -= 1
             if actions_remaining[agent.username] == 0:
                 available_agents.remove(agent)
+        return schedule
 
     def _get_final_results(self) -> Dict[str, Any]:
         """Compile final simulation results.
 
         Returns:
-            Dictionary of final scores, total posts, and agent groups
+            Dictionary of final scores, total posts, and agent groups, plus
+            moderation cascade statistics when a cascade is configured
         """
-        return {
+        results = {
             'final_scores': self.score_tracker.get_scores(),
-            'total_posts': len(self.post_manager._read_posts_from_json()),
+            'total_posts': len(self.post_manager.get_all_posts()),
             'groups': {agent.username: agent.group_name for agent in self.ai_agents}
         }
+        if self.posting_interface.moderation_cascade is not None:
+            results['moderation'] = self.posting_interface.moderation_cascade.stats()
+        return results
+
+    def save_checkpoint(self, path: Optional[str] = None) -> None:
+        """Atomically write the simulation state to a JSON checkpoint.
+
+        The checkpoint holds the round, the round's action schedule with its
+        simulated times, the position within it and the answers of agent
+        decisions already requested for later actions, players and agents,
+        scores, the simulated clock, the RNG states and pending moderation.
+        Posts stay in the posts file; the checkpoint only records the store's
+        watermark (see PostManager.watermark) so later changes can be rolled
+        back. The cost is the size of that state, not of the posts, except
+        for the JSON store whose watermark lists the like count of every
+        liked post.
+
+        Args:
+            path: Checkpoint file, defaults to checkpoint_path
+        """
+        path = path or self.checkpoint_path
+        state = {
+            'version': CHECKPOINT_VERSION,
+            'config': self._config,
+            'round': self.game_manager.round,
+            'players': self.game_manager.players,
+            'agents': [{'username': agent.username, 'group': agent.group_name} for agent in self.ai_agents],
+            'scores': self.score_tracker.get_state(),
+            'rng': _rng_state(self.rng),
+            'timing_rng': _rng_state(self.timing_rng),
+            'clock': self.clock.get_state(),
+            'schedule': [agent.username for agent in self._schedule] if self._schedule is not None else None,
+            'schedule_times': self._schedule_times,
+            'schedule_position': self._schedule_position,
+            'in_flight_answers': self._in_flight_answers,
+            'posts': self.post_manager.watermark(),
+            'pending_moderation': self.posting_interface._pending_moderation,
+            'backend': (self.backend or get_backend()).get_state(),
+        }
+        with instrumentation.span("checkpoint"):
+            write_json_atomic(path, state)
+        self._checkpoint_position = self._schedule_position
+
+    @classmethod
+    def resume(
+        cls,
+        checkpoint_path: str,
+        backend: Optional[LLMBackend] = None,
+        moderation_cascade: Optional[ModerationCascade] = None,
+        **overrides: Any
+    ) -> "GameSimulator":
+        """Recreate a simulation from a checkpoint written by save_checkpoint.
+
+        Posts and likes added to the posts file after the checkpoint are
+        rolled back, so continuing with run_simulation repeats no completed
+        action and skips none. Moderation verdicts applied after the
+        checkpoint are not rolled back; the affected posts are moderated again.
+
+        Args:
+            checkpoint_path: Checkpoint file, also used for further checkpoints
+            backend: LLM backend, as passed to the constructor
+            moderation_cascade: Moderation cascade, as passed to the constructor
+            **overrides: Constructor arguments replacing those stored in the checkpoint
+
+        Returns:
+            The restored simulator
+        """
+        with open(checkpoint_path, 'r') as file:
+            state = json.load(file)
+        if state.get('version') not in _READABLE_CHECKPOINT_VERSIONS:
+            raise ValueError(f"Unsupported checkpoint version {state.get('version')} in {checkpoint_path}")
+        config = {**state['config'], 'checkpoint_path': checkpoint_path, **overrides}
+        simulator = cls(**config, backend=backend, moderation_cascade=moderation_cascade)
+        simulator._restore(state)
+        return simulator
+
+    def _restore(self, state: Dict[str, Any]) -> None:
+        self.game_manager.round = state['round']
+        self.game_manager.players = state['players']
+        self.ai_agents = [
+            AIAgent(agent['username'], agent['group'], self.game_rules, self.game_manager.groups, backend=self.backend)
+            for agent in state['agents']
+        ]
+        self.round_runner.ai_agents = self.ai_agents
+        _set_rng_state(self.rng, state['rng'])
+        _set_rng_state(self.timing_rng, state['timing_rng'])
+        self.clock.load_state(state['clock'])
+
+        rolled_back = self.post_manager.rollback(state['posts'])
+        if rolled_back:
+            print(f"Rolled back {rolled_back} posts made after the checkpoint.")
+        self.score_tracker.load_state(state['scores'])
+        for post in self.post_manager.get_all_posts():
+            self.score_tracker.record_post(post)
+        self.posting_interface._pending_moderation = state['pending_moderation']
+
+        agents = {agent.username: agent for agent in self.ai_agents}
+        self._schedule = [agents[name] for name in state['schedule']] if state['schedule'] is not None else None
+        self._schedule_times = state['schedule_times']
+        self._schedule_position = self._checkpoint_position = state['schedule_position']
+        self._in_flight_answers = state.get('in_flight_answers', [])
+        (self.backend or get_backend()).load_state(state['backend'])
 
     def get_state(self) -> Dict[str, Any]:
         """Get current simulation state.
@@ -189,3 +481,14 @@ class GameSimulator:
             'scores': self.score_tracker.get_scores(),
             'players': self.game_manager.players
         }
+
+
+def _rng_state(rng: random.Random) -> List[Any]:
+    """Return the state of rng in a JSON-serializable form."""
+    version, internal_state, gauss_next = rng.getstate()
+    return [version, list(internal_state), gauss_next]
+
+
+def _set_rng_state(rng: random.Random, state: List[Any]) -> None:
+    version, internal_state, gauss_next = state
+    rng.setstate((version, tuple(internal_state), gauss_next))
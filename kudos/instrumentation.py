@@ -0,0 +1,203 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+# Path of a JSONL trace file; if set, instrumentation is enabled on import
+TRACE_ENV = "KUDOS_TRACE"
+
+_enabled = False
+_trace_file: Any = None
+_lock = threading.Lock()
+# Span name -> [count, total seconds, max seconds]
+_timings: Dict[str, List[float]] = {}
+_counters: Dict[str, float] = {}
+# Phase totals of the innermost open collect() block
+_collector: "contextvars.ContextVar[Optional[Dict[str, float]]]" = contextvars.ContextVar(
+    "kudos_instrumentation_collector", default=None)
+
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        add_timing(self.name, time.perf_counter() - self.start)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *exc_info: Any) -> None:
+        return None
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def enable(trace_path: Optional[str] = None) -> None:
+    """Start collecting timings and counters.
+
+    Args:
+        trace_path: JSONL file that per-action and per-round records are
+            appended to, no trace is written if None
+    """
+    global _enabled, _trace_file
+    disable()
+    if trace_path:
+        _trace_file = open(trace_path, 'a')
+    _enabled = True
+
+
+def disable() -> None:
+    """Stop collecting and close the trace file. Collected totals are kept until reset."""
+    global _enabled, _trace_file
+    _enabled = False
+    with _lock:
+        if _trace_file is not None:
+            _trace_file.close()
+            _trace_file = None
+
+
+def enabled() -> bool:
+    """Return whether instrumentation is collecting."""
+    return _enabled
+
+
+def reset() -> None:
+    """Clear collected timings and counters."""
+    with _lock:
+        _timings.clear()
+        _counters.clear()
+
+
+def span(name: str) -> Any:
+    """Return a context manager timing its block under name.
+
+    When instrumentation is disabled this is a shared no-op object, so
+    instrumented hot paths only pay for one function call.
+    """
+    return _Span(name) if _enabled else _NULL_SPAN
+
+
+def count(name: str, value: float = 1) -> None:
+    """Add value to the counter name."""
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+        phases = _collector.get()
+        if phases is not None:
+            phases[name] = phases.get(name, 0) + value
+
+
+def add_timing(name: str, elapsed: float) -> None:
+    """Record elapsed seconds under name, for phases not measured with span."""
+    if not _enabled:
+        return
+    key = f"{name}_s"
+    with _lock:
+        timing = _timings.get(name)
+        if timing is None:
+            _timings[name] = [1, elapsed, elapsed]
+        else:
+            timing[0] += 1
+            timing[1] += elapsed
+            timing[2] = max(timing[2], elapsed)
+        phases = _collector.get()
+        if phases is not None:
+            phases[key] = phases.get(key, 0.0) + elapsed
+
+
+def record(kind: str, **fields: Any) -> None:
+    """Append a structured record to the trace file, if one is open."""
+    if _trace_file is None:
+        return
+    line = json.dumps({'kind': kind, 'time': time.time(), **fields}, default=str)
+    with _lock:
+        if _trace_file is not None:
+            _trace_file.write(line + "\n")
+            _trace_file.flush()
+
+
+@contextmanager
+def collect(kind: str, **fields: Any) -> Iterator[Dict[str, Any]]:
+    """Trace one unit of work, such as an action or a round, with its phase times.
+
+    Spans and counters inside the block, including those in threads started
+    with asyncio.to_thread, are summed into the record, which is written
+    with its duration when the block ends. Totals of a nested block are also
+    added to the enclosing one.
+
+    Args:
+        kind: Record kind, e.g. "action" or "round"
+        **fields: Fields of the record
+
+    Yields:
+        The record fields, which the block may extend
+    """
+    if not _enabled:
+        yield fields
+        return
+    parent = _collector.get()
+    phases: Dict[str, float] = {}
+    token = _collector.set(phases)
+    start = time.perf_counter()
+    try:
+        yield fields
+    finally:
+        duration = time.perf_counter() - start
+        _collector.reset(token)
+        if parent is not None:
+            with _lock:
+                for name, value in phases.items():
+                    parent[name] = parent.get(name, 0) + value
+        record(kind, **fields, duration_s=round(duration, 6),
+               phases={name: round(value, 6) for name, value in sorted(phases.items())})
+
+
+def summary() -> Dict[str, Any]:
+    """Return collected span timings and counters.
+
+    Returns:
+        {"spans": {name: {"count", "total_s", "mean_ms", "max_ms"}}, "counters": {name: value}}
+    """
+    with _lock:
+        spans = {
+            name: {
+                'count': int(calls),
+                'total_s': total,
+                'mean_ms': 1000 * total / calls,
+                'max_ms': 1000 * longest,
+            }
+            for name, (calls, total, longest) in _timings.items()
+        }
+        return {'spans': spans, 'counters': dict(_counters)}
+
+
+def print_summary() -> None:
+    """Print a table of span timings, slowest total first, followed by the counters."""
+    data = summary()
+    if not data['spans'] and not data['counters']:
+        return
+    print(f"\n{'phase':<24}{'count':>8}{'total s':>12}{'mean ms':>12}{'max ms':>12}")
+    for name, timing in sorted(data['spans'].items(), key=lambda item: -item[1]['total_s']):
+        print(f"{name:<24}{timing['count']:>8}{timing['total_s']:>12.3f}"
+              f"{timing['mean_ms']:>12.2f}{timing['max_ms']:>12.2f}")
+    for name, value in sorted(data['counters'].items()):
+        print(f"{name:<24}{value:>8g}")
+
+
+if os.environ.get(TRACE_ENV):
+    enable(os.environ[TRACE_ENV])
@@ -0,0 +1,92 @@
+import heapq
+from typing import Dict, List, Any, Tuple
+from .misc import get_mentions
+
+class InteractionGraph:
+    """Directed user interaction graph maintained incrementally.
+
+    Mirrors the graph built by misc.create_graph_and_get_centrality: an edge
+    points from a poster to the author of the post they replied to and to
+    every user they mentioned. Degree counts are updated in place as edges
+    are added or removed, and a lazily invalidated heap answers top-k
+    queries without re-ranking every user. Ties are broken by the order in
+    which users first appeared, matching networkx node order.
+    """
+
+    def __init__(self) -> None:
+        self._order: Dict[str, int] = {}
+        self._degree: Dict[str, int] = {}
+        self._edge_counts: Dict[Tuple[str, str], int] = {}
+        self._heap: List[Tuple[int, int, str]] = []
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def add_node(self, user: str) -> None:
+        """Add a user without edges."""
+        if user not in self._order:
+            self._order[user] = len(self._order)
+            self._degree[user] = 0
+            heapq.heappush(self._heap, (0, self._order[user], user))
+
+    def add_edge(self, source: str, target: str) -> None:
+        """Record one interaction from source to target."""
+        self.add_node(source)
+        self.add_node(target)
+        edge = (source, target)
+        self._edge_counts[edge] = self._edge_counts.get(edge, 0) + 1
+        if self._edge_counts[edge] == 1:
+            self._change_degree(source, 1)
+            self._change_degree(target, 1)
+
+    def remove_edge(self, source: str, target: str) -> None:
+        """Withdraw one interaction previously added with add_edge."""
+        edge = (source, target)
+        count = self._edge_counts.get(edge, 0)
+        if count == 0:
+            return
+        if count == 1:
+            del self._edge_counts[edge]
+            self._change_degree(source, -1)
+            self._change_degree(target, -1)
+        else:
+            self._edge_counts[edge] = count - 1
+
+    def _change_degree(self, user: str, delta: int) -> None:
+        self._degree[user] += delta
+        heapq.heappush(self._heap, (-self._degree[user], self._order[user], user))
+        if len(self._heap) > 4 * len(self._order) + 16:
+            self._heap = [(-degree, self._order[u], u) for u, degree in self._degree.items()]
+            heapq.heapify(self._heap)
+
+    def top(self, k: int) -> List[str]:
+        """Return the k users with the highest degree, highest first."""
+        found = []
+        while self._heap and len(found) < k:
+            entry = heapq.heappop(self._heap)
+            neg_degree, _, user = entry
+            if self._degree[user] == -neg_degree and (not found or found[-1] != entry):
+                found.append(entry)
+        for entry in found:
+            heapq.heappush(self._heap, entry)
+        return [user for _, _, user in found]
+
+    def degree_centrality(self) -> Dict[str, float]:
+        """Return networkx-compatible degree centrality for every user."""
+        if len(self._order) <= 1:
+            return {user: 1.0 for user in self._order}
+        scale = 1.0 / (len(self._order) - 1)
+        return {user: self._degree[user] * scale for user in self._order}
+
+    @classmethod
+    def from_posts(cls, posts: List[Dict[str, Any]]) -> "InteractionGraph":
+        """Build a graph from a list of posts, resolving replies within that list only."""
+        graph = cls()
+        authors = {post['post_id']: post['username'] for post in posts}
+        for post in posts:
+            graph.add_node(post['username'])
+            if post['reply_to'] and post['reply_to'] in authors:
+                graph.add_edge(post['username'], authors[post['reply_to']])
+            for mention in get_mentions(post):
+                graph.add_edge(post['username'], mention)
+        return graph
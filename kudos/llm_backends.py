@@ -0,0 +1,669 @@
+import asyncio
+import hashlib
+import itertools
+import json
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing.connection import Client
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+Schemas = Union[Dict[str, Any], Sequence[Dict[str, Any]]]
+
+# Shared secret of the model server connection handshake. Without it, clients
+# read the key file the server writes next to its socket (model_server_key_path).
+MODEL_SERVER_KEY_ENV = "KUDOS_MODEL_SERVER_KEY"
+
+
+def model_server_key_path(address: str) -> str:
+    """Return the path of the key file belonging to a model server socket."""
+    return f"{address}.key"
+
+
+def read_model_server_key(address: str) -> bytes:
+    """Return the authentication key of the model server listening on address.
+
+    Args:
+        address: Path of the server's UNIX socket
+
+    Returns:
+        The key from the KUDOS_MODEL_SERVER_KEY environment variable if set,
+        otherwise the contents of the server's key file
+
+    Raises:
+        RuntimeError: If neither is available or the key file is accessible to other users
+    """
+    key = os.environ.get(MODEL_SERVER_KEY_ENV)
+    if key:
+        return key.encode("utf-8")
+    path = model_server_key_path(address)
+    try:
+        with open(path, "rb") as file:
+            if os.fstat(file.fileno()).st_mode & 0o077:
+                raise RuntimeError(f"Model server key file {path} must only be accessible by its owner (mode 0600)")
+            key = file.read().strip()
+    except FileNotFoundError:
+        key = None
+    if not key:
+        raise RuntimeError(f"No model server key: set {MODEL_SERVER_KEY_ENV} or create {path}")
+    return key
+
+
+def _schema_list(schemas: Schemas, count: int) -> List[Dict[str, Any]]:
+    if isinstance(schemas, dict):
+        return [schemas] * count
+    if len(schemas) != count:
+        raise ValueError("Expected one schema per question.")
+    return list(schemas)
+
+
+class LLMBackend:
+    """Interface through which the game asks a language model for JSON answers.
+
+    Subclasses implement ask. Batch and async variants default to looping over
+    ask and running it in a worker thread; backends that can do better
+    override them.
+    """
+
+    def ask(self, question: str, schema: Dict[str, Any], max_new_tokens: int = 500,
+            llm_name: Optional[str] = None, prefix: Optional[str] = None) -> Dict[str, Any]:
+        """Answer one question with a JSON object matching the schema.
+
+        Args:
+            question: Prompt text
+            schema: JSON schema the answer must follow
+            max_new_tokens: Maximum tokens generated for the answer
+            llm_name: Model to use, backend default if None
+            prefix: Leading part of the question shared with other prompts
+
+        Returns:
+            The answer as a dictionary
+        """
+        raise NotImplementedError
+
+    def ask_batch(self, questions: Sequence[str], schemas: Schemas, max_new_tokens: int = 500,
+                  llm_name: Optional[str] = None, prefix: Optional[str] = None) -> List[Optional[Dict[str, Any]]]:
+        """Answer several questions, isolating failures per question.
+
+        Args:
+            questions: Prompt texts
+            schemas: One schema for all questions or one per question
+            max_new_tokens: Maximum tokens generated per answer
+            llm_name: Model to use, backend default if None
+            prefix: Leading part of the questions shared with other prompts
+
+        Returns:
+            Answers in input order, None where a question failed
+        """
+        results = []
+        for question, schema in zip(questions, _schema_list(schemas, len(questions))):
+            try:
+                results.append(self.ask(question, schema, max_new_tokens, llm_name, prefix))
+            except Exception as e:
+                print(f"Question failed: {e}")
+                results.append(None)
+        return results
+
+    async def ask_async(self, question: str, schema: Dict[str, Any], max_new_tokens: int = 500,
+                        llm_name: Optional[str] = None, prefix: Optional[str] = None) -> Dict[str, Any]:
+        """Async variant of ask."""
+        return await asyncio.to_thread(self.ask, question, schema, max_new_tokens, llm_name, prefix)
+
+    async def ask_batch_async(self, questions: Sequence[str], schemas: Schemas, max_new_tokens: int = 500,
+                              llm_name: Optional[str] = None, prefix: Optional[str] = None) -> List[Optional[Dict[str, Any]]]:
+        """Async variant of ask_batch."""
+        return await asyncio.to_thread(self.ask_batch, questions, schemas, max_new_tokens, llm_name, prefix)
+
+    def model_identity(self, llm_name: Optional[str]) -> str:
+        """Return a string identifying which model answers for llm_name, used in cache keys."""
+        return str(llm_name)
+
+    def get_state(self) -> Optional[Dict[str, Any]]:
+        """Return JSON-serializable state needed to continue answering identically, if any."""
+        return None
+
+    def load_state(self, state: Optional[Dict[str, Any]]) -> None:
+        """Restore state returned by get_state."""
+
+
+class TransformersBackend(LLMBackend):
+    """Backend answering with local transformers models held in a ModelRegistry.
+
+    EasyLLM keeps per-call state (prefix KV caches, the constrained decoder)
+    on the model object, so calls are serialized with a lock; concurrent
+    callers from ask_async threads or the coalescer wait their turn.
+    """
+
+    def __init__(self, registry: Any, models: Sequence[str]) -> None:
+        """Initialize the backend.
+
+        Args:
+            registry: ModelRegistry providing loaded EasyLLM instances
+            models: Model names to choose from when no llm_name is given
+        """
+        self.registry = registry
+        self.models = list(models)
+        self._lock = threading.Lock()
+
+    def _choose_model(self, llm_name: Optional[str]) -> str:
+        if llm_name is None:
+            llm_name = random.choice(self.models)
+            print(f"Choosing model {llm_name}")
+        return llm_name
+
+    def ask(self, question: str, schema: Dict[str, Any], max_new_tokens: int = 500,
+            llm_name: Optional[str] = None, prefix: Optional[str] = None) -> Dict[str, Any]:
+        with self._lock:
+            llm = self.registry.get(self._choose_model(llm_name))
+            return llm.ask_question_with_schema(prompt=question, json_schema=schema,
+                                                max_new_tokens=max_new_tokens, prefix=prefix)
+
+    def ask_batch(self, questions: Sequence[str], schemas: Schemas, max_new_tokens: int = 500,
+                  llm_name: Optional[str] = None, prefix: Optional[str] = None) -> List[Optional[Dict[str, Any]]]:
+        with self._lock:
+            llm = self.registry.get(self._choose_model(llm_name))
+            return llm.ask_questions_with_schema(list(questions), _schema_list(schemas, len(questions)),
+                                                 max_new_tokens=max_new_tokens, prefix=prefix)
+
+
+class StubBackend(LLMBackend):
+    """Deterministic backend producing schema-valid answers without a model.
+
+    Answers depend only on the seed, the question text and how often that
+    question was asked before, so runs are reproducible regardless of the
+    order concurrent questions arrive in. String fields ending in "_id" pick
+    a post id from the question, and messages occasionally mention a
+    username from the question, so replies, likes and mentions are exercised.
+    """
+
+    _POST_ID_PATTERN = re.compile(r"['\"]post_id['\"]:\s*(\d+)")
+    _USERNAME_PATTERN = re.compile(r"['\"]username['\"]:\s*['\"](\w+)['\"]")
+    _WORDS = [
+        "honestly", "this", "is", "wild", "lol", "cannot", "believe", "people", "still",
+        "think", "that", "news", "today", "love", "hate", "the", "new", "update", "vibes",
+        "who", "else", "saw", "trend", "weekend", "big", "if", "true", "mood", "same",
+    ]
+
+    def __init__(
+        self,
+        seed: int = 0,
+        latency: Union[float, Tuple[float, float]] = 0.0,
+        true_probability: float = 0.9,
+        mention_probability: float = 0.2,
+        field_choices: Optional[Dict[str, Sequence[Any]]] = None
+    ) -> None:
+        """Initialize the stub backend.
+
+        Args:
+            seed: Seed making answers reproducible
+            latency: Synthetic latency per call in seconds, or a (min, max) range
+            true_probability: Probability that boolean fields are true
+            mention_probability: Probability that a generated message mentions a user
+            field_choices: Fixed candidate values per field name, e.g. group names
+                for "dominant_group"
+        """
+        self.seed = seed
+        self.latency = latency if isinstance(latency, tuple) else (latency, latency)
+        self.true_probability = true_probability
+        self.mention_probability = mention_probability
+        self.field_choices = dict(field_choices or {})
+        self._call_counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def model_identity(self, llm_name: Optional[str]) -> str:
+        return f"stub-{self.seed}:{llm_name}"
+
+    def get_state(self) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return {'call_counts': dict(self._call_counts)}
+
+    def load_state(self, state: Optional[Dict[str, Any]]) -> None:
+        if state is not None:
+            with self._lock:
+                self._call_counts = dict(state['call_counts'])
+
+    def _rng_for(self, question: str) -> random.Random:
+        digest = hashlib.sha256(question.encode("utf-8")).hexdigest()
+        with self._lock:
+            count = self._call_counts.get(digest, 0)
+            self._call_counts[digest] = count + 1
+        return random.Random(f"{self.seed}:{digest}:{count}")
+
+    def _delay(self, rng: random.Random) -> float:
+        return rng.uniform(*self.latency) if self.latency[1] > 0 else 0.0
+
+    def _message(self, rng: random.Random, question: str) -> str:
+        words = rng.choices(self._WORDS, k=rng.randint(4, 14))
+        usernames = self._USERNAME_PATTERN.findall(question)
+        if usernames and rng.random() < self.mention_probability:
+            words.insert(rng.randrange(len(words) + 1), f"@{rng.choice(usernames)}")
+        return " ".join(words)
+
+    def _value(self, schema: Dict[str, Any], rng: random.Random, question: str,
+               field: Optional[str] = None) -> Any:
+        if field in self.field_choices:
+            return rng.choice(list(self.field_choices[field]))
+        if "enum" in schema:
+            return rng.choice(schema["enum"])
+        value_type = schema.get("type", "string")
+        if isinstance(value_type, list):
+            value_type = rng.choice(value_type)
+        if value_type == "object":
+            return {
+                key: self._value(sub_schema, rng, question, key)
+                for key, sub_schema in schema.get("properties", {}).items()
+            }
+        if value_type == "array":
+            return [self._value(schema.get("items", {}), rng, question) for _ in range(rng.randint(0, 3))]
+        if value_type == "boolean":
+            return rng.random() < self.true_probability
+        if value_type == "null":
+            return None
+        post_ids = self._POST_ID_PATTERN.findall(question) if field and field.endswith("_id") else []
+        if value_type in ("integer", "number"):
+            return int(rng.choice(post_ids)) if post_ids else rng.randint(0, 100)
+        if post_ids:
+            return rng.choice(post_ids)
+        return self._message(rng, question)
+
+    def ask(self, question: str, schema: Dict[str, Any], max_new_tokens: int = 500,
+            llm_name: Optional[str] = None, prefix: Optional[str] = None) -> Dict[str, Any]:
+        rng = self._rng_for(question)
+        delay = self._delay(rng)
+        if delay:
+            time.sleep(delay)
+        return self._value(schema, rng, question)
+
+    def ask_batch(self, questions: Sequence[str], schemas: Schemas, max_new_tokens: int = 500,
+                  llm_name: Optional[str] = None, prefix: Optional[str] = None) -> List[Optional[Dict[str, Any]]]:
+        rngs = [self._rng_for(question) for question in questions]
+        # A batch costs as long as its slowest item, like a single batched forward pass
+        delay = max((self._delay(rng) for rng in rngs), default=0.0)
+        if delay:
+            time.sleep(delay)
+        return [
+            self._value(schema, rng, question)
+            for question, schema, rng in zip(questions, _schema_list(schemas, len(questions)), rngs)
+        ]
+
+    async def ask_async(self, question: str, schema: Dict[str, Any], max_new_tokens: int = 500,
+                        llm_name: Optional[str] = None, prefix: Optional[str] = None) -> Dict[str, Any]:
+        rng = self._rng_for(question)
+        delay = self._delay(rng)
+        if delay:
+            await asyncio.sleep(delay)
+        return self._value(schema, rng, question)
+
+    async def ask_batch_async(self, questions: Sequence[str], schemas: Schemas, max_new_tokens: int = 500,
+                              llm_name: Optional[str] = None, prefix: Optional[str] = None) -> List[Optional[Dict[str, Any]]]:
+        rngs = [self._rng_for(question) for question in questions]
+        delay = max((self._delay(rng) for rng in rngs), default=0.0)
+        if delay:
+            await asyncio.sleep(delay)
+        return [
+            self._value(schema, rng, question)
+            for question, schema, rng in zip(questions, _schema_list(schemas, len(questions)), rngs)
+        ]
+
+
+class ModelServerBackend(LLMBackend):
+    """Backend forwarding questions to a model server process (see kudos.model_server).
+
+    Several simulations in separate processes can share the one model held by
+    the server. Requests from concurrent callers are pipelined over a single
+    connection; the server batches them with requests from other clients.
+    At most max_in_flight requests are outstanding at a time, further callers
+    block until answers arrive. The connection is opened on first use.
+    """
+
+    def __init__(self, address: str, client_name: Optional[str] = None,
+                 authkey: Optional[bytes] = None, max_in_flight: int = 32) -> None:
+        """Initialize the backend.
+
+        Args:
+            address: Path of the server's UNIX socket
+            client_name: Name the server reports statistics under, derived from
+                the process id if None
+            authkey: Shared secret of the server, read with read_model_server_key
+                when connecting if None
+            max_in_flight: Maximum number of requests awaiting an answer
+        """
+        self.address = address
+        self.client_name = client_name or f"pid-{os.getpid()}"
+        self.authkey = authkey
+        self.max_in_flight = max_in_flight
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+        self._connection: Any = None
+        self._pending: Dict[int, Future] = {}
+        self._request_ids = itertools.count()
+        self._identities: Dict[Optional[str], str] = {}
+
+    def _connect(self) -> Any:
+        if self._connection is None:
+            authkey = self.authkey or read_model_server_key(self.address)
+            connection = Client(self.address, family='AF_UNIX', authkey=authkey)
+            connection.send(('hello', self.client_name))
+            self._connection = connection
+            threading.Thread(target=self._receive, args=(connection,), daemon=True).start()
+        return self._connection
+
+    def _receive(self, connection: Any) -> None:
+        try:
+            while True:
+                request_id, ok, value = connection.recv()
+                with self._lock:
+                    future = self._pending.pop(request_id)
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(RuntimeError(f"Model server error: {value}"))
+        except (EOFError, OSError):
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                if self._connection is connection:
+                    self._connection = None
+            for future in pending.values():
+                future.set_exception(ConnectionError("Connection to the model server was lost."))
+
+    def _submit(self, kind: str, *args: Any) -> Future:
+        self._slots.acquire()
+        future: Future = Future()
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            with self._lock:
+                request_id = next(self._request_ids)
+                self._pending[request_id] = future
+                self._connect().send((kind, request_id, *args))
+        except Exception as e:
+            with self._lock:
+                self._pending.pop(request_id, None)
+            future.set_exception(e)
+        return future
+
+    def _ask(self, questions: Sequence[str], schemas: List[Dict[str, Any]], max_new_tokens: int,
+             llm_name: Optional[str], prefix: Optional[str], single: bool) -> Future:
+        return self._submit('ask', {
+            'questions': [str(question) for question in questions],
+            'schemas': schemas,
+            'max_new_tokens': max_new_tokens,
+            'llm_name': llm_name,
+            'prefix': prefix,
+            'single': single,
+        })
+
+    def ask(self, question: str, schema: Dict[str, Any], max_new_tokens: int = 500,
+            llm_name: Optional[str] = None, prefix: Optional[str] = None) -> Dict[str, Any]:
+        return self._ask([question], [schema], max_new_tokens, llm_name, prefix, True).result()[0]
+
+    def ask_batch(self, questions: Sequence[str], schemas: Schemas, max_new_tokens: int = 500,
+                  llm_name: Optional[str] = None, prefix: Optional[str] = None) -> List[Optional[Dict[str, Any]]]:
+        if not questions:
+            return []
+        return self._ask(questions, _schema_list(schemas, len(questions)), max_new_tokens,
+                         llm_name, prefix, False).result()
+
+    async def ask_async(self, question: str, schema: Dict[str, Any], max_new_tokens: int = 500,
+                        llm_name: Optional[str] = None, prefix: Optional[str] = None) -> Dict[str, Any]:
+        # Submitting may block on max_in_flight, so it runs off the event loop
+        future = await asyncio.to_thread(self._ask, [question], [schema], max_new_tokens, llm_name, prefix, True)
+        return (await asyncio.wrap_future(future))[0]
+
+    async def ask_batch_async(self, questions: Sequence[str], schemas: Schemas, max_new_tokens: int = 500,
+                              llm_name: Optional[str] = None, prefix: Optional[str] = None) -> List[Optional[Dict[str, Any]]]:
+        if not questions:
+            return []
+        future = await asyncio.to_thread(self._ask, questions, _schema_list(schemas, len(questions)),
+                                         max_new_tokens, llm_name, prefix, False)
+        return await asyncio.wrap_future(future)
+
+    def model_identity(self, llm_name: Optional[str]) -> str:
+        if llm_name not in self._identities:
+            self._identities[llm_name] = self._submit('identity', llm_name).result()
+        return self._identities[llm_name]
+
+    def server_stats(self) -> Dict[str, Any]:
+        """Return the server's queue, batching and per-client statistics."""
+        return self._submit('stats').result()
+
+    def close(self) -> None:
+        """Close the connection to the server."""
+        with self._lock:
+            connection, self._connection = self._connection, None
+        if connection is not None:
+            connection.close()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Each process opens its own connection
+        return {'address': self.address, 'client_name': self.client_name, 'authkey': self.authkey,
+                'max_in_flight': self.max_in_flight}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__init__(**state)
+
+
+def request_key(question: str, schema: Dict[str, Any], max_new_tokens: int, llm_name: Optional[str]) -> str:
+    """Return the key identifying a request in recorded LLM logs."""
+    encoded = json.dumps({'prompt': str(question), 'schema': schema, 'max_new_tokens': max_new_tokens,
+                          'llm_name': llm_name}, sort_keys=True)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class RecordingBackend(LLMBackend):
+    """Backend passing requests to another backend and logging each response as a JSON line.
+
+    Every line holds the request key (see request_key), the prompt hash,
+    schema, model identity, token limit and the response, or the error of a
+    failed request. ReplayBackend answers from such a log without a model.
+    """
+
+    def __init__(self, backend: LLMBackend, log_path: str) -> None:
+        """Initialize the recorder.
+
+        Args:
+            backend: Backend answering the requests
+            log_path: JSONL file the requests are appended to
+        """
+        self.backend = backend
+        self.log_path = log_path
+        self._lock = threading.Lock()
+
+    def _record(self, question: str, schema: Dict[str, Any], max_new_tokens: int, llm_name: Optional[str],
+                response: Any = None, error: Optional[BaseException] = None) -> None:
+        entry = {
+            'key': request_key(question, schema, max_new_tokens, llm_name),
+            'prompt_sha256': hashlib.sha256(str(question).encode("utf-8")).hexdigest(),
+            'schema': schema,
+            'llm_name': llm_name,
+            'model': self.backend.model_identity(llm_name),
+            'max_new_tokens': max_new_tokens,
+            'response': response,
+        }
+        if error is not None:
+            entry['error'] = f"{type(error).__name__}: {error}"
+        line = json.dumps(entry) + "\n"
+        with self._lock, open(self.log_path, 'a') as file:
+            file.write(line)
+
+    def _record_batch(self, questions: Sequence[str], schemas: Schemas, max_new_tokens: int,
+                      llm_name: Optional[str], responses: List[Optional[Dict[str, Any]]]) -> None:
+        for question, schema, response in zip(questions, _schema_list(schemas, len(questions)), responses):
+            self._record(question, schema, max_new_tokens, llm_name, response)
+
+    def ask(self, question: str, schema: Dict[str, Any], max_new_tokens: int = 500,
+            llm_name: Optional[str] = None, prefix: Optional[str] = None) -> Dict[str, Any]:
+        try:
+            response = self.backend.ask(question, schema, max_new_tokens, llm_name, prefix)
+        except Exception as e:
+            self._record(question, schema, max_new_tokens, llm_name, error=e)
+            raise
+        self._record(question, schema, max_new_tokens, llm_name, response)
+        return response
+
+    def ask_batch(self, questions: Sequence[str], schemas: Schemas, max_new_tokens: int = 500,
+                  llm_name: Optional[str] = None, prefix: Optional[str] = None) -> List[Optional[Dict[str, Any]]]:
+        responses = self.backend.ask_batch(questions, schemas, max_new_tokens, llm_name, prefix)
+        self._record_batch(questions, schemas, max_new_tokens, llm_name, responses)
+        return responses
+
+    async def ask_async(self, question: str, schema: Dict[str, Any], max_new_tokens: int = 500,
+                        llm_name: Optional[str] = None, prefix: Optional[str] = None) -> Dict[str, Any]:
+        try:
+            response = await self.backend.ask_async(question, schema, max_new_tokens, llm_name, prefix)
+        except Exception as e:
+            self._record(question, schema, max_new_tokens, llm_name, error=e)
+            raise
+        self._record(question, schema, max_new_tokens, llm_name, response)
+        return response
+
+    async def ask_batch_async(self, questions: Sequence[str], schemas: Schemas, max_new_tokens: int = 500,
+                              llm_name: Optional[str] = None, prefix: Optional[str] = None) -> List[Optional[Dict[str, Any]]]:
+        responses = await self.backend.ask_batch_async(questions, schemas, max_new_tokens, llm_name, prefix)
+        self._record_batch(questions, schemas, max_new_tokens, llm_name, responses)
+        return responses
+
+    def model_identity(self, llm_name: Optional[str]) -> str:
+        return self.backend.model_identity(llm_name)
+
+    def get_state(self) -> Optional[Dict[str, Any]]:
+        return self.backend.get_state()
+
+    def load_state(self, state: Optional[Dict[str, Any]]) -> None:
+        self.backend.load_state(state)
+
+
+class ReplayBackend(LLMBackend):
+    """Backend answering from a log written by RecordingBackend, without a model.
+
+    In "key" mode a request gets the responses recorded for the same
+    request key, in the order they were recorded, so runs whose requests
+    arrive in a different order still replay exactly. In "order" mode
+    requests get the recorded responses strictly in sequence and a request
+    whose key differs from the recorded one is an error. A request the log
+    cannot answer raises KeyError, unless a fallback backend is given.
+    """
+
+    def __init__(self, log_path: str, mode: str = "key", fallback: Optional[LLMBackend] = None) -> None:
+        """Load the log.
+
+        Args:
+            log_path: JSONL file written by RecordingBackend
+            mode: "key" or "order"
+            fallback: Backend answering requests missing from the log
+        """
+        if mode not in ("key", "order"):
+            raise ValueError(f"Unknown replay mode '{mode}'. Choose 'key' or 'order'.")
+        self.log_path = log_path
+        self.mode = mode
+        self.fallback = fallback
+        self._entries: List[Dict[str, Any]] = []
+        self._by_key: Dict[str, List[Dict[str, Any]]] = {}
+        self._models: Dict[Optional[str], str] = {}
+        with open(log_path, 'r') as file:
+            for line in file:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._entries.append(entry)
+                    self._by_key.setdefault(entry['key'], []).append(entry)
+                    self._models.setdefault(entry['llm_name'], entry['model'])
+        self._position = 0
+        self._key_positions: Dict[str, int] = {}
+        self.replayed = 0
+        self.missed = 0
+        self._lock = threading.Lock()
+
+    def _next_entry(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if self.mode == "order":
+                if self._position >= len(self._entries):
+                    return None
+                entry = self._entries[self._position]
+                if entry['key'] != key:
+                    raise ValueError(f"Replay diverged at request {self._position}: "
+                                     "the request differs from the recorded one.")
+                self._position += 1
+                return entry
+            entries = self._by_key.get(key, [])
+            position = self._key_positions.get(key, 0)
+            if position >= len(entries):
+                return None
+            self._key_positions[key] = position + 1
+            return entries[position]
+
+    def _replay(self, question: str, schema: Dict[str, Any], max_new_tokens: int,
+                llm_name: Optional[str], prefix: Optional[str] = None) -> Any:
+        entry = self._next_entry(request_key(question, schema, max_new_tokens, llm_name))
+        if entry is None:
+            self.missed += 1
+            if self.fallback is None:
+                raise KeyError("Request not found in the replay log.")
+            return self.fallback.ask(question, schema, max_new_tokens, llm_name, prefix)
+        self.replayed += 1
+        if 'error' in entry:
+            raise RuntimeError(f"Recorded error: {entry['error']}")
+        return entry['response']
+
+    def ask(self, question: str, schema: Dict[str, Any], max_new_tokens: int = 500,
+            llm_name: Optional[str] = None, prefix: Optional[str] = None) -> Dict[str, Any]:
+        return self._replay(question, schema, max_new_tokens, llm_name, prefix)
+
+    def ask_batch(self, questions: Sequence[str], schemas: Schemas, max_new_tokens: int = 500,
+                  llm_name: Optional[str] = None, prefix: Optional[str] = None) -> List[Optional[Dict[str, Any]]]:
+        # Unlike other backends, a request missing from the log raises instead of yielding None
+        return [self._replay(question, schema, max_new_tokens, llm_name, prefix)
+                for question, schema in zip(questions, _schema_list(schemas, len(questions)))]
+
+    async def ask_async(self, question: str, schema: Dict[str, Any], max_new_tokens: int = 500,
+                        llm_name: Optional[str] = None, prefix: Optional[str] = None) -> Dict[str, Any]:
+        return self.ask(question, schema, max_new_tokens, llm_name, prefix)
+
+    async def ask_batch_async(self, questions: Sequence[str], schemas: Schemas, max_new_tokens: int = 500,
+                              llm_name: Optional[str] = None, prefix: Optional[str] = None) -> List[Optional[Dict[str, Any]]]:
+        return self.ask_batch(questions, schemas, max_new_tokens, llm_name, prefix)
+
+    def model_identity(self, llm_name: Optional[str]) -> str:
+        if llm_name in self._models:
+            return self._models[llm_name]
+        return self.fallback.model_identity(llm_name) if self.fallback is not None else f"replay:{llm_name}"
+
+    def get_state(self) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return {'position': self._position, 'key_positions': dict(self._key_positions)}
+
+    def load_state(self, state: Optional[Dict[str, Any]]) -> None:
+        if state is not None:
+            with self._lock:
+                self._position = state['position']
+                self._key_positions = dict(state['key_positions'])
+
+
+BACKENDS = {
+    'transformers': TransformersBackend,
+    'stub': StubBackend,
+    'server': ModelServerBackend,
+    'replay': ReplayBackend,
+}
+
+
+def create_backend(name: str = 'transformers', **options: Any) -> LLMBackend:
+    """Create a backend by name, e.g. inside a worker process from a picklable spec.
+
+    Args:
+        name: "transformers" (models from the process-wide registry), "stub",
+            "server" (a model server process) or "replay" (a recorded log)
+        **options: Backend constructor options, e.g. seed for "stub", address for
+            "server" or log_path for "replay"
+
+    Returns:
+        The backend
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend '{name}'. Choose one of {sorted(BACKENDS)}.")
+    if name == 'transformers':
+        # Share the process-wide registry so models stay resident across backends
+        from .llm_wrapper import get_registry, models
+        options = {'registry': get_registry(), 'models': models, **options}
+    return BACKENDS[name](**options)
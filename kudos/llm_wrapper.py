@@ -1,21 +1,308 @@
+import asyncio
 import json
-import gc
-import torch
-from kudos.easy_llm import EasyLLM
+import os
+import queue
 import random
+import threading
+import time
+from concurrent.futures import Future
+from typing import Iterable, List, Optional, Dict, Any, Tuple, Union
+from kudos.model_registry import ModelRegistry
+from kudos.llm_backends import LLMBackend, ModelServerBackend, RecordingBackend, ReplayBackend, TransformersBackend
 
 models = ["unsloth/Mistral-Nemo-Instruct-2407-bnb-4bit"]
 
-def ask_question(question, schema, max_new_tokens=500, llm_name=None):
-
-    if llm_name == None:
-        llm_name = random.choice(models)
-        print(f"Choosing model {llm_name}")
-    
-    llm = EasyLLM(llm_name)
-    #schema_model = llm.create_pydantic_model_from_schema(schema)
-    response = llm.ask_question_with_schema(prompt=question, json_schema=schema, max_new_tokens=max_new_tokens)
-    llm.unload_model()
-    gc.collect()
+# Socket of a running model server (python -m kudos.model_server); if set, questions
+# go to the server's shared model instead of a model loaded in this process.
+MODEL_SERVER_ENV = "KUDOS_MODEL_SERVER"
+
+_registry = ModelRegistry()
+_server_address = os.environ.get(MODEL_SERVER_ENV)
+_backend: LLMBackend = ModelServerBackend(_server_address) if _server_address else TransformersBackend(_registry, models)
+
+def get_backend() -> LLMBackend:
+    """Return the backend used when callers do not pass one explicitly."""
+    return _backend
+
+def set_backend(backend: LLMBackend) -> None:
+    """Replace the process-wide default backend (e.g. with a StubBackend)."""
+    global _backend
+    _backend = backend
+
+def enable_recording(log_path: str) -> RecordingBackend:
+    """Log every request to the default backend and its response to a JSONL file.
+
+    Args:
+        log_path: File the requests are appended to, replayable with enable_replay
+
+    Returns:
+        The recording backend, now the process-wide default
+    """
+    global _backend
+    if isinstance(_backend, RecordingBackend):
+        _backend = _backend.backend
+    _backend = RecordingBackend(_backend, log_path)
+    return _backend
+
+def enable_replay(log_path: str, mode: str = "key", fallback: Optional[LLMBackend] = None) -> ReplayBackend:
+    """Answer questions from a log written in recording mode, without loading a model.
+
+    Args:
+        log_path: Log written by enable_recording or a RecordingBackend
+        mode: "key" serves responses by request, "order" strictly in recorded order
+        fallback: Backend answering requests missing from the log, None raises KeyError
+
+    Returns:
+        The replay backend, now the process-wide default
+    """
+    global _backend
+    _backend = ReplayBackend(log_path, mode, fallback)
+    return _backend
+
+def get_registry() -> ModelRegistry:
+    """Return the process-wide model registry."""
+    return _registry
+
+def configure_registry(memory_budget: Union[int, str, None] = None) -> None:
+    """Set the memory budget for resident models (e.g. "24GiB")."""
+    _registry.configure(memory_budget=memory_budget)
+
+def warm_up(llm_names: Optional[Iterable[str]] = None) -> None:
+    """Load models ahead of the first question so it does not pay the load time."""
+    if isinstance(_backend, ModelServerBackend):
+        # The server holds the model
+        return
+    _registry.warm_up(llm_names or models)
+
+def shutdown() -> None:
+    """Unload all resident models."""
+    _registry.shutdown()
+
+def registry_stats() -> Dict[str, Any]:
+    """Return hit, load and eviction counters of the model registry."""
+    return _registry.stats()
+
+class RequestCoalescer:
+    """Collects concurrent single questions to one backend into batched calls.
+
+    Callers submit questions from any thread or coroutine and get a future.
+    A dispatcher thread takes the first waiting question, waits up to
+    max_wait seconds for up to max_batch_size in total, and answers
+    questions for the same model and token limit with one ask_batch call,
+    passing their prefix if they share one. A question that arrives alone is
+    answered with ask.
+    """
+
+    def __init__(self, backend: LLMBackend, max_batch_size: int = 8, max_wait: float = 0.01) -> None:
+        """Start the dispatcher thread.
+
+        Args:
+            backend: Backend answering the batches
+            max_batch_size: Maximum number of questions per batch
+            max_wait: Seconds to wait for a batch to fill after its first question
+        """
+        self.backend = backend
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue: "queue.Queue[Optional[Tuple[Any, ...]]]" = queue.Queue()
+        self._batches = 0
+        self._questions = 0
+        self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+        self._dispatcher.start()
+
+    def submit(self, question: str, schema: Dict[str, Any], max_new_tokens: int = 500,
+               llm_name: Optional[str] = None, prefix: Optional[str] = None) -> Future:
+        """Queue a question and return a future resolving to its answer."""
+        future: Future = Future()
+        self._queue.put((question, schema, max_new_tokens, llm_name, prefix, future))
+        return future
+
+    def close(self) -> None:
+        """Answer the questions already queued and stop the dispatcher."""
+        self._queue.put(None)
+        self._dispatcher.join()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the number of batches and questions and the mean batch size."""
+        return {
+            'batches': self._batches,
+            'questions': self._questions,
+            'mean_batch_size': self._questions / self._batches if self._batches else 0.0,
+        }
+
+    def _dispatch(self) -> None:
+        running = True
+        while running:
+            first = self._queue.get()
+            if first is None:
+                return
+            pending = [first]
+            deadline = time.perf_counter() + self.max_wait
+            while len(pending) < self.max_batch_size:
+                timeout = deadline - time.perf_counter()
+                try:
+                    item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    running = False
+                    break
+                pending.append(item)
+
+            groups: Dict[Tuple[Optional[str], int], List[Tuple[Any, ...]]] = {}
+            for item in pending:
+                groups.setdefault((item[3], item[2]), []).append(item)
+            for (llm_name, max_new_tokens), items in groups.items():
+                self._answer(items, llm_name, max_new_tokens)
+
+    def _answer(self, items: List[Tuple[Any, ...]], llm_name: Optional[str], max_new_tokens: int) -> None:
+        # Questions whose caller cancelled the future are dropped
+        items = [item for item in items if item[5].set_running_or_notify_cancel()]
+        if not items:
+            return
+        self._batches += 1
+        self._questions += len(items)
+        try:
+            if len(items) == 1:
+                question, schema, _, _, prefix, future = items[0]
+                future.set_result(self.backend.ask(question, schema, max_new_tokens, llm_name, prefix))
+                return
+            # The prefix KV cache can serve the batch when all its questions share the prefix
+            prefixes = {item[4] for item in items}
+            answers = self.backend.ask_batch([item[0] for item in items], [item[1] for item in items],
+                                             max_new_tokens, llm_name, prefixes.pop() if len(prefixes) == 1 else None)
+        except Exception as e:
+            for item in items:
+                if not item[5].done():
+                    item[5].set_exception(e)
+            return
+        for item, answer in zip(items, answers):
+            if answer is None:
+                item[5].set_exception(RuntimeError("Question failed in batched generation."))
+            else:
+                item[5].set_result(answer)
+
+
+_coalescing: Optional[Dict[str, Any]] = None
+# Keyed by backend id; each coalescer keeps its backend alive until coalescing is disabled
+_coalescers: Dict[int, RequestCoalescer] = {}
+_coalescers_lock = threading.Lock()
+
+def enable_coalescing(max_batch_size: int = 8, max_wait: float = 0.01) -> None:
+    """Batch concurrent ask_question and ask_question_async calls per backend.
+
+    Call sites stay unchanged; concurrent callers (threads or coroutines)
+    using the same backend are answered together by a RequestCoalescer.
+
+    Args:
+        max_batch_size: Maximum number of questions per batch
+        max_wait: Seconds a question waits for others to join its batch
+    """
+    global _coalescing
+    disable_coalescing()
+    _coalescing = {'max_batch_size': max_batch_size, 'max_wait': max_wait}
+
+def disable_coalescing() -> None:
+    """Answer questions one call at a time again, after finishing queued ones."""
+    global _coalescing
+    _coalescing = None
+    with _coalescers_lock:
+        coalescers = list(_coalescers.values())
+        _coalescers.clear()
+    for coalescer in coalescers:
+        coalescer.close()
+
+def coalescing_stats() -> Dict[str, Dict[str, Any]]:
+    """Return batch statistics of each backend's coalescer, by backend class and id."""
+    with _coalescers_lock:
+        return {f"{type(coalescer.backend).__name__}-{key}": coalescer.stats() for key, coalescer in _coalescers.items()}
+
+def coalescer_for(backend: LLMBackend) -> Optional[RequestCoalescer]:
+    """Return the coalescer batching questions to backend, None unless coalescing is enabled."""
+    settings = _coalescing
+    if settings is None:
+        return None
+    with _coalescers_lock:
+        coalescer = _coalescers.get(id(backend))
+        if coalescer is None:
+            coalescer = RequestCoalescer(backend, **settings)
+            _coalescers[id(backend)] = coalescer
+        return coalescer
+
+def ask_question(question, schema, max_new_tokens=500, llm_name=None, prefix=None, backend=None):
+    backend = backend or _backend
+    coalescer = coalescer_for(backend)
+    if coalescer is not None:
+        response = coalescer.submit(question, schema, max_new_tokens, llm_name, prefix).result()
+    else:
+        response = backend.ask(question, schema, max_new_tokens=max_new_tokens, llm_name=llm_name, prefix=prefix)
     print("Response:", response)
     return response
+
+async def ask_question_async(question, schema, max_new_tokens=500, llm_name=None, prefix=None, backend=None):
+    backend = backend or _backend
+    coalescer = coalescer_for(backend)
+    if coalescer is not None:
+        response = await asyncio.wrap_future(coalescer.submit(question, schema, max_new_tokens, llm_name, prefix))
+    else:
+        response = await backend.ask_async(question, schema, max_new_tokens=max_new_tokens, llm_name=llm_name, prefix=prefix)
+    print("Response:", response)
+    return response
+
+def ask_questions(questions, schemas, max_new_tokens=500, llm_name=None, prefix=None, backend=None):
+    """Answer several questions in batched generation calls.
+
+    Args:
+        questions: Prompts to answer
+        schemas: One JSON schema for all questions or a list with one per question
+        max_new_tokens: Maximum tokens generated per answer
+        llm_name: Model to use, chosen at random if None
+        prefix: Leading part shared by all questions, whose KV cache is reused
+        backend: Backend to use instead of the process-wide default
+
+    Returns:
+        Answers in input order, None for questions that failed.
+    """
+    responses = (backend or _backend).ask_batch(questions, schemas, max_new_tokens=max_new_tokens, llm_name=llm_name,
+                                                prefix=prefix)
+    print("Responses:", responses)
+    return responses
+
+async def ask_questions_async(questions, schemas, max_new_tokens=500, llm_name=None, prefix=None, backend=None):
+    """Answer several questions concurrently, each the way ask_question_async would.
+
+    Every question takes the single-question path, with its prefix, through
+    the coalescer when coalescing is enabled, so answers match those of
+    sequential ask_question calls.
+
+    Args:
+        questions: Prompts to answer
+        schemas: One JSON schema for all questions or a list with one per question
+        max_new_tokens: Maximum tokens generated per answer
+        llm_name: Model to use, chosen at random if None
+        prefix: Leading part of the questions shared with other prompts
+        backend: Backend to use instead of the process-wide default
+
+    Returns:
+        Answers in input order, None for questions that failed.
+    """
+    backend = backend or _backend
+    schemas = [schemas] * len(questions) if isinstance(schemas, dict) else list(schemas)
+    if len(schemas) != len(questions):
+        raise ValueError("Expected one schema per question.")
+    coalescer = coalescer_for(backend)
+    if coalescer is not None:
+        pending = [asyncio.wrap_future(coalescer.submit(question, schema, max_new_tokens, llm_name, prefix))
+                   for question, schema in zip(questions, schemas)]
+    else:
+        pending = [backend.ask_async(question, schema, max_new_tokens=max_new_tokens, llm_name=llm_name, prefix=prefix)
+                   for question, schema in zip(questions, schemas)]
+    responses = []
+    for response in await asyncio.gather(*pending, return_exceptions=True):
+        if isinstance(response, Exception):
+            print(f"Question failed: {response}")
+            response = None
+        responses.append(response)
+    print("Responses:", responses)
+    return responses
+
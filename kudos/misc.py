@@ -1,5 +1,4 @@
 from typing import Dict, List, Any
-import networkx as nx
 import re
 
 def get_mentions(post: Dict[str, Any]) -> List[str]:
@@ -22,13 +21,16 @@ def create_graph_and_get_centrality(posts: List[Dict[str, Any]]) -> Dict[str, fl
     Returns:
         Dictionary mapping usernames to centrality scores
     """
+    # Imported here so importing the package does not load networkx
+    import networkx as nx
     G = nx.DiGraph()
+    authors = {p['post_id']: p['username'] for p in posts}
     for post in posts:
         G.add_node(post['username'])
         if post['reply_to']:
-            replied_post = next((p for p in posts if p['post_id'] == post['reply_to']), None)
-            if replied_post:
-                G.add_edge(post['username'], replied_post['username'])
+            replied_author = authors.get(post['reply_to'])
+            if replied_author:
+                G.add_edge(post['username'], replied_author)
         mentions = get_mentions(post)
         for mention in mentions:
             G.add_edge(post['username'], mention)
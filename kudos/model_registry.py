@@ -0,0 +1,230 @@
+import gc
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
+
+_SIZE_UNITS = {
+    "": 1,
+    "b": 1,
+    "kb": 10 ** 3,
+    "mb": 10 ** 6,
+    "gb": 10 ** 9,
+    "kib": 2 ** 10,
+    "mib": 2 ** 20,
+    "gib": 2 ** 30,
+}
+
+
+def parse_memory_size(size: Union[int, str, None]) -> Optional[int]:
+    """Convert a memory size such as ``"12GiB"`` or ``2_000_000`` to bytes.
+
+    Args:
+        size: Integer byte count, size string, or None for unlimited
+
+    Returns:
+        Number of bytes, or None if no limit was given
+    """
+    if size is None or isinstance(size, int):
+        return size
+    match = re.fullmatch(r"\s*([\d.]+)\s*([a-zA-Z]*)\s*", size)
+    if not match or match.group(2).lower() not in _SIZE_UNITS:
+        raise ValueError(f"Invalid memory size: {size!r}")
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2).lower()])
+
+
+_WEIGHT_EXTENSIONS = (".safetensors", ".bin", ".pt", ".pth", ".gguf")
+
+
+def estimate_footprint(model_name: str) -> Optional[int]:
+    """Estimate the memory a model needs from the size of its weight files.
+
+    Args:
+        model_name: Path or identifier of the model
+
+    Returns:
+        Combined size of the weight files if model_name is a local directory,
+        None otherwise
+    """
+    if not os.path.isdir(model_name):
+        return None
+    total = 0
+    for directory, _, files in os.walk(model_name):
+        total += sum(os.path.getsize(os.path.join(directory, name)) for name in files
+                     if name.endswith(_WEIGHT_EXTENSIONS))
+    return total or None
+
+
+def _default_loader(model_name: str) -> Any:
+    from .easy_llm import EasyLLM
+    return EasyLLM(model_name)
+
+
+class ModelRegistry:
+    """Keeps loaded models resident between calls, keyed by model name.
+
+    Models are evicted in least-recently-used order so the combined memory
+    footprint of resident models stays within the configured budget. Room is
+    made before a model is loaded, using the footprint it had when it was
+    last loaded, a footprint given to the constructor or an estimate from its
+    weight files, so the new model never shares memory with the models it
+    replaces. The budget is checked again with the measured footprint after
+    loading. The most recently requested model is never evicted, so a single
+    model larger than the budget still stays loaded.
+    """
+
+    def __init__(
+        self,
+        memory_budget: Union[int, str, None] = None,
+        loader: Optional[Callable[[str], Any]] = None,
+        footprints: Optional[Dict[str, Union[int, str]]] = None
+    ) -> None:
+        """Initialize an empty registry.
+
+        Args:
+            memory_budget: Maximum combined footprint of resident models
+                (bytes or size string such as "24GiB"). None means unlimited.
+            loader: Callable creating a model from its name. Defaults to EasyLLM.
+            footprints: Known footprints of models by name, used to make room
+                before their first load
+        """
+        self.memory_budget = parse_memory_size(memory_budget)
+        self._loader = loader or _default_loader
+        self._models: "OrderedDict[str, Any]" = OrderedDict()
+        self._footprints: Dict[str, int] = {}
+        # Footprint of every model ever loaded or declared, kept after it is evicted
+        self._known_footprints: Dict[str, int] = {
+            name: parse_memory_size(size) for name, size in (footprints or {}).items()
+        }
+        self._lock = threading.RLock()
+        self._stats = {"hits": 0, "loads": 0, "evictions": 0}
+
+    def configure(self, memory_budget: Union[int, str, None] = None,
+                  loader: Optional[Callable[[str], Any]] = None) -> None:
+        """Change the memory budget and/or loader, evicting models if needed.
+
+        Args:
+            memory_budget: New memory budget, None leaves it unlimited
+            loader: New model loader, None keeps the current one
+        """
+        with self._lock:
+            self.memory_budget = parse_memory_size(memory_budget)
+            if loader is not None:
+                self._loader = loader
+            self._enforce_budget(keep=None)
+
+    def get(self, model_name: str) -> Any:
+        """Return a resident model, loading it on first use.
+
+        Args:
+            model_name: Path or identifier of the model
+
+        Returns:
+            The loaded model instance
+        """
+        with self._lock:
+            if model_name in self._models:
+                self._models.move_to_end(model_name)
+                self._stats["hits"] += 1
+                return self._models[model_name]
+
+            expected = self._expected_footprint(model_name)
+            if expected is not None:
+                self._make_room(expected)
+            model = self._loader(model_name)
+            self._models[model_name] = model
+            self._footprints[model_name] = self._measure(model)
+            if self._footprints[model_name]:
+                self._known_footprints[model_name] = self._footprints[model_name]
+            self._stats["loads"] += 1
+            self._enforce_budget(keep=model_name)
+            return model
+
+    def warm_up(self, model_names: Iterable[str]) -> None:
+        """Load the given models ahead of the first request.
+
+        Args:
+            model_names: Names of the models to make resident
+        """
+        for model_name in model_names:
+            self.get(model_name)
+
+    def evict(self, model_name: str) -> bool:
+        """Unload a single model.
+
+        Args:
+            model_name: Name of the model to unload
+
+        Returns:
+            True if the model was resident, False otherwise
+        """
+        with self._lock:
+            if model_name not in self._models:
+                return False
+            self._unload(model_name)
+            self._stats["evictions"] += 1
+            return True
+
+    def shutdown(self) -> None:
+        """Unload every resident model, counting each as an eviction."""
+        with self._lock:
+            for model_name in list(self._models):
+                self._unload(model_name)
+                self._stats["evictions"] += 1
+
+    def resident_models(self) -> List[str]:
+        """Return resident model names, least recently used first."""
+        with self._lock:
+            return list(self._models)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit, load and eviction counters plus residency details."""
+        with self._lock:
+            return {
+                **self._stats,
+                "resident": list(self._models),
+                "resident_bytes": sum(self._footprints.values()),
+                "memory_budget": self.memory_budget,
+            }
+
+    def _measure(self, model: Any) -> int:
+        footprint = getattr(model, "memory_footprint", None)
+        if footprint is None:
+            return 0
+        try:
+            return int(footprint())
+        except Exception:
+            return 0
+
+    def _expected_footprint(self, model_name: str) -> Optional[int]:
+        if model_name in self._known_footprints:
+            return self._known_footprints[model_name]
+        return estimate_footprint(model_name)
+
+    def _make_room(self, footprint: int) -> None:
+        """Evict least recently used models until footprint more bytes fit the budget."""
+        if self.memory_budget is None:
+            return
+        while self._models and sum(self._footprints.values()) + footprint > self.memory_budget:
+            self._unload(next(iter(self._models)))
+            self._stats["evictions"] += 1
+
+    def _enforce_budget(self, keep: Optional[str]) -> None:
+        if self.memory_budget is None:
+            return
+        while sum(self._footprints.values()) > self.memory_budget:
+            candidates = [name for name in self._models if name != keep]
+            if not candidates:
+                break
+            self._unload(candidates[0])
+            self._stats["evictions"] += 1
+
+    def _unload(self, model_name: str) -> None:
+        model = self._models.pop(model_name)
+        self._footprints.pop(model_name, None)
+        unload = getattr(model, "unload_model", None)
+        if unload is not None:
+            unload()
+        del model
+        gc.collect()
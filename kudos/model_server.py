@@ -0,0 +1,320 @@
+import argparse
+import os
+import queue
+import threading
+import time
+from multiprocessing.connection import Listener
+from typing import Any, Dict, List, Optional, Tuple
+
+from .llm_backends import MODEL_SERVER_KEY_ENV, LLMBackend, create_backend, model_server_key_path
+
+
+class _Request:
+    """Questions of one client request waiting in the server queue."""
+
+    def __init__(self, client: "_ClientConnection", request_id: int, payload: Dict[str, Any]) -> None:
+        self.client = client
+        self.request_id = request_id
+        self.questions: List[str] = payload['questions']
+        self.schemas: List[Dict[str, Any]] = payload['schemas']
+        self.max_new_tokens: int = payload['max_new_tokens']
+        self.llm_name: Optional[str] = payload['llm_name']
+        self.prefix: Optional[str] = payload['prefix']
+        self.single: bool = payload['single']
+        self.enqueued_at = time.perf_counter()
+
+
+class _ClientConnection:
+    """Connection of one client with its statistics."""
+
+    def __init__(self, connection: Any, name: str) -> None:
+        self.connection = connection
+        self.name = name
+        self.send_lock = threading.Lock()
+        self.stats = {
+            'connections': 1,
+            'requests': 0,
+            'questions': 0,
+            'failed_questions': 0,
+            'queue_wait_s': 0.0,
+            'service_s': 0.0,
+        }
+
+    def send(self, request_id: int, ok: bool, value: Any) -> None:
+        with self.send_lock:
+            try:
+                self.connection.send((request_id, ok, value))
+            except (OSError, EOFError):
+                # The client went away; its answers are dropped
+                pass
+
+
+class ModelServer:
+    """Serves one resident model to simulations running in other processes.
+
+    Clients (ModelServerBackend) connect over a UNIX socket. Their requests
+    enter a bounded queue; a worker thread takes up to max_batch_size
+    questions from it, waiting at most max_wait seconds for more to arrive,
+    and answers requests for the same model together in one ask_batch call.
+    While the queue is full the server stops reading from clients, so they
+    block instead of piling up work (backpressure).
+    """
+
+    def __init__(self, address: str, backend: Optional[LLMBackend] = None, max_batch_size: int = 8,
+                 max_wait: float = 0.02, max_queue: int = 64, authkey: Optional[bytes] = None) -> None:
+        """Initialize the server.
+
+        Args:
+            address: Path of the UNIX socket to listen on
+            backend: Backend answering the questions, the transformers backend if None
+            max_batch_size: Maximum number of questions answered in one batch
+            max_wait: Seconds to wait for more questions before answering a batch
+            max_queue: Maximum number of queued requests
+            authkey: Shared secret clients must present. If None it is taken from
+                KUDOS_MODEL_SERVER_KEY, or generated at start and written to a
+                key file readable only by the owner (see model_server_key_path).
+        """
+        self.address = address
+        self.backend = backend or create_backend('transformers')
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.authkey = authkey
+        self._key_path: Optional[str] = None
+        self._queue: "queue.Queue[Optional[_Request]]" = queue.Queue(maxsize=max_queue)
+        self._clients: Dict[str, _ClientConnection] = {}
+        self._client_stats: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._listener: Any = None
+        self._worker: Optional[threading.Thread] = None
+        self._closed = threading.Event()
+        self._batches = 0
+        self._batched_questions = 0
+        self._max_queue_depth = 0
+
+    def start(self) -> None:
+        """Listen on the socket and serve clients in background threads."""
+        if self.authkey is None:
+            self.authkey = self._create_key()
+        self._listener = Listener(self.address, family='AF_UNIX', authkey=self.authkey)
+        self._worker = threading.Thread(target=self._work, daemon=True)
+        self._worker.start()
+        threading.Thread(target=self._accept, daemon=True).start()
+        print(f"Model server listening on {self.address}")
+
+    def serve_forever(self) -> None:
+        """Start the server and block until it is closed."""
+        self.start()
+        try:
+            self._closed.wait()
+        except KeyboardInterrupt:
+            self.close()
+
+    def close(self) -> None:
+        """Stop accepting clients, finish queued requests and remove the socket."""
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        if self._listener is not None:
+            self._listener.close()
+        self._queue.put(None)
+        if self._worker is not None:
+            self._worker.join()
+        if self._key_path is not None and os.path.exists(self._key_path):
+            os.remove(self._key_path)
+
+    def _create_key(self) -> bytes:
+        """Return the key from the environment, or generate one and write it to the key file."""
+        key = os.environ.get(MODEL_SERVER_KEY_ENV)
+        if key:
+            return key.encode("utf-8")
+        key = os.urandom(32).hex().encode("ascii")
+        path = model_server_key_path(self.address)
+        if os.path.exists(path):
+            os.remove(path)
+        # Created with mode 0600 so only the owner's processes can connect
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "wb") as file:
+            file.write(key)
+        self._key_path = path
+        return key
+
+    def stats(self) -> Dict[str, Any]:
+        """Return queue, batching and per-client statistics.
+
+        Returns:
+            Dictionary with batch counts, mean batch size, current and maximum
+            queue depth, and per client the number of requests and questions,
+            failures and mean queue wait and service time per request
+        """
+        with self._lock:
+            clients = {}
+            for name, stats in self._client_stats.items():
+                requests = stats['requests'] or 1
+                clients[name] = {
+                    **stats,
+                    'connected': name in self._clients,
+                    'mean_queue_wait_s': stats['queue_wait_s'] / requests,
+                    'mean_service_s': stats['service_s'] / requests,
+                }
+            return {
+                'batches': self._batches,
+                'mean_batch_size': self._batched_questions / self._batches if self._batches else 0.0,
+                'queue_depth': self._queue.qsize(),
+                'max_queue_depth': self._max_queue_depth,
+                'clients': clients,
+            }
+
+    def _accept(self) -> None:
+        while not self._closed.is_set():
+            try:
+                connection = self._listener.accept()
+            except Exception:
+                if self._closed.is_set():
+                    return
+                # Failed handshake of a single client
+                continue
+            threading.Thread(target=self._serve_client, args=(connection,), daemon=True).start()
+
+    def _register(self, connection: Any, name: str) -> _ClientConnection:
+        with self._lock:
+            # Reconnecting clients continue their statistics
+            if name in self._client_stats:
+                stats = self._client_stats[name]
+                stats['connections'] += 1
+                client = _ClientConnection(connection, name)
+                client.stats = stats
+            else:
+                client = _ClientConnection(connection, name)
+                self._client_stats[name] = client.stats
+            self._clients[name] = client
+        return client
+
+    def _serve_client(self, connection: Any) -> None:
+        client = None
+        try:
+            _, name = connection.recv()
+            client = self._register(connection, name)
+            while True:
+                kind, request_id, *args = connection.recv()
+                if kind == 'ask':
+                    # Blocks while the queue is full, which stops reading from this client
+                    self._queue.put(_Request(client, request_id, args[0]))
+                    with self._lock:
+                        self._max_queue_depth = max(self._max_queue_depth, self._queue.qsize())
+                elif kind == 'identity':
+                    client.send(request_id, True, self.backend.model_identity(args[0]))
+                elif kind == 'stats':
+                    client.send(request_id, True, self.stats())
+                else:
+                    client.send(request_id, False, f"Unknown request '{kind}'")
+        except (EOFError, OSError):
+            pass
+        finally:
+            if client is not None:
+                with self._lock:
+                    if self._clients.get(client.name) is client:
+                        del self._clients[client.name]
+            connection.close()
+
+    def _next_batch(self) -> Tuple[List[_Request], bool]:
+        """Collect requests for one batch; the flag is False once the server closes."""
+        first = self._queue.get()
+        if first is None:
+            return [], False
+        batch = [first]
+        size = len(first.questions)
+        deadline = time.perf_counter() + self.max_wait
+        while size < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if request is None:
+                return batch, False
+            batch.append(request)
+            size += len(request.questions)
+        return batch, True
+
+    def _work(self) -> None:
+        running = True
+        while running:
+            batch, running = self._next_batch()
+            groups: Dict[Tuple[Optional[str], int], List[_Request]] = {}
+            for request in batch:
+                groups.setdefault((request.llm_name, request.max_new_tokens), []).append(request)
+            for (llm_name, max_new_tokens), requests in groups.items():
+                self._answer(requests, llm_name, max_new_tokens)
+
+    def _answer(self, requests: List[_Request], llm_name: Optional[str], max_new_tokens: int) -> None:
+        started = time.perf_counter()
+        questions = [question for request in requests for question in request.questions]
+        schemas = [schema for request in requests for schema in request.schemas]
+        error = None
+        try:
+            if len(requests) == 1 and requests[0].single:
+                answers = [self.backend.ask(questions[0], schemas[0], max_new_tokens, llm_name, requests[0].prefix)]
+            else:
+                # A prefix shared by the whole batch lets the model reuse the cached prefill
+                prefixes = {request.prefix for request in requests}
+                answers = self.backend.ask_batch(questions, schemas, max_new_tokens, llm_name,
+                                                 prefixes.pop() if len(prefixes) == 1 else None)
+        except Exception as e:
+            answers = [None] * len(questions)
+            error = f"{type(e).__name__}: {e}"
+        finished = time.perf_counter()
+
+        with self._lock:
+            self._batches += 1
+            self._batched_questions += len(questions)
+            for request in requests:
+                stats = request.client.stats
+                stats['requests'] += 1
+                stats['questions'] += len(request.questions)
+                stats['queue_wait_s'] += started - request.enqueued_at
+                stats['service_s'] += finished - started
+
+        position = 0
+        for request in requests:
+            request_answers = answers[position:position + len(request.questions)]
+            position += len(request.questions)
+            failed = sum(answer is None for answer in request_answers)
+            if failed:
+                with self._lock:
+                    request.client.stats['failed_questions'] += failed
+            if request.single and request_answers[0] is None:
+                request.client.send(request.request_id, False, error or "Question failed")
+            else:
+                request.client.send(request.request_id, True, request_answers)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve a resident model to Kudos simulations over a UNIX socket.")
+    parser.add_argument("address", help="Path of the UNIX socket, clients set KUDOS_MODEL_SERVER to it. "
+                                        "Unless KUDOS_MODEL_SERVER_KEY is set, the authentication key is "
+                                        "written to ADDRESS.key with mode 0600.")
+    parser.add_argument("--models", nargs="+", default=None, help="Models to load (default: llm_wrapper.models)")
+    parser.add_argument("--stub-seed", type=int, default=None, help="Serve a StubBackend with this seed instead of a model")
+    parser.add_argument("--max-batch-size", type=int, default=8)
+    parser.add_argument("--max-wait", type=float, default=0.02, help="Seconds to wait for a batch to fill")
+    parser.add_argument("--max-queue", type=int, default=64, help="Queued requests before clients are blocked")
+    args = parser.parse_args()
+
+    if args.stub_seed is not None:
+        backend = create_backend('stub', seed=args.stub_seed)
+    else:
+        from . import llm_wrapper
+        models = args.models or llm_wrapper.models
+        backend = create_backend('transformers', models=models)
+        llm_wrapper.get_registry().warm_up(models)
+
+    server = ModelServer(args.address, backend, max_batch_size=args.max_batch_size,
+                         max_wait=args.max_wait, max_queue=args.max_queue)
+    server.serve_forever()
+    print("Model server stats:", server.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+import hashlib
+import json
+import os
+import pickle
+import random
+import re
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from filelock import FileLock
+from .fileutil import atomic_write
+
+
+class KeywordRules:
+    """Accepts or rejects posts outright when they match regular expressions."""
+
+    def __init__(self, reject_patterns: Iterable[str] = (), accept_patterns: Iterable[str] = ()) -> None:
+        """Compile the rules.
+
+        Args:
+            reject_patterns: Patterns marking a post as misaligned
+            accept_patterns: Patterns marking a post as aligned. Rejections win.
+        """
+        self.reject = [re.compile(p, re.IGNORECASE) for p in reject_patterns]
+        self.accept = [re.compile(p, re.IGNORECASE) for p in accept_patterns]
+
+    def classify(self, message: str) -> Optional[bool]:
+        """Return False/True if a reject/accept rule matches, None otherwise."""
+        if any(p.search(message) for p in self.reject):
+            return False
+        if any(p.search(message) for p in self.accept):
+            return True
+        return None
+
+
+class EmbeddingClassifier:
+    """Logistic regression over sentence embeddings, trained on logged LLM verdicts.
+
+    The regression is fitted with stochastic gradient descent, so it can be
+    updated with new verdicts (partial_fit) without refitting on all of them.
+    sentence_transformers and scikit-learn are imported on first use.
+    """
+
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", epochs: int = 5) -> None:
+        """Initialize an untrained classifier.
+
+        Args:
+            model_name: sentence_transformers model producing the embeddings
+            epochs: Passes over the new examples in each partial_fit
+        """
+        self.model_name = model_name
+        self.epochs = epochs
+        self._encoder = None
+        self._classifier = None
+
+    @property
+    def is_trained(self) -> bool:
+        return self._classifier is not None
+
+    def _encode(self, messages: Sequence[str]) -> Any:
+        if self._encoder is None:
+            from sentence_transformers import SentenceTransformer
+            self._encoder = SentenceTransformer(self.model_name)
+        return self._encoder.encode(list(messages), show_progress_bar=False)
+
+    @staticmethod
+    def _new_classifier() -> Any:
+        from sklearn.linear_model import SGDClassifier
+        return SGDClassifier(loss="log_loss", random_state=0)
+
+    @staticmethod
+    def _labels(verdicts: Sequence[bool]) -> Tuple[List[int], Any]:
+        from sklearn.utils.class_weight import compute_sample_weight
+        labels = [int(v) for v in verdicts]
+        return labels, compute_sample_weight("balanced", labels)
+
+    def fit(self, messages: Sequence[str], verdicts: Sequence[bool]) -> None:
+        """Train from scratch on messages labelled with LLM verdicts (True = aligned)."""
+        labels, weights = self._labels(verdicts)
+        classifier = self._new_classifier()
+        classifier.fit(self._encode(messages), labels, sample_weight=weights)
+        self._classifier = classifier
+
+    def partial_fit(self, messages: Sequence[str], verdicts: Sequence[bool]) -> None:
+        """Update the classifier with newly labelled messages, starting one if untrained.
+
+        Only the given messages are embedded, so the cost does not grow with
+        the number of verdicts seen before.
+        """
+        labels, weights = self._labels(verdicts)
+        embeddings = self._encode(messages)
+        classifier = self._classifier if self._classifier is not None else self._new_classifier()
+        for _ in range(self.epochs):
+            classifier.partial_fit(embeddings, labels, classes=[0, 1], sample_weight=weights)
+        self._classifier = classifier
+
+    def save(self, path: str, **metadata: Any) -> None:
+        """Atomically write the trained classifier and JSON-serializable metadata to path."""
+        with atomic_write(path, "wb") as file:
+            pickle.dump({"model_name": self.model_name, "classifier": self._classifier,
+                         "metadata": metadata}, file)
+
+    def load(self, path: str) -> Dict[str, Any]:
+        """Restore a classifier written by save and return its metadata.
+
+        Raises:
+            ValueError: If it was trained on embeddings of another model
+        """
+        with open(path, "rb") as file:
+            state = pickle.load(file)
+        if state["model_name"] != self.model_name:
+            raise ValueError(f"{path} was trained on {state['model_name']} embeddings, not {self.model_name}")
+        self._classifier = state["classifier"]
+        return state["metadata"]
+
+    def probability_aligned(self, message: str) -> float:
+        """Return the predicted probability that a message is aligned."""
+        return float(self._classifier.predict_proba(self._encode([message]))[0][1])
+
+
+class ModerationCascade:
+    """Cheap moderation stages in front of the LLM alignment check.
+
+    Keyword rules decide first, then the embedding classifier if it is
+    trained and confident. Anything else is escalated to the LLM. Every LLM
+    verdict is appended to a JSONL log, which is the training data for the
+    classifier. A fraction of confident local decisions can be audited
+    against the LLM to measure how often the cheap stages agree with it.
+
+    The classifier is updated incrementally with each batch of retrain_every
+    new verdicts and saved next to the log (classifier_path), from where
+    later cascades using the same log load it. It only decides posts judged
+    against the network description it was trained for.
+    """
+
+    def __init__(
+        self,
+        rules: Optional[KeywordRules] = None,
+        classifier: Optional[EmbeddingClassifier] = None,
+        accept_threshold: float = 0.9,
+        reject_threshold: float = 0.1,
+        audit_rate: float = 0.0,
+        verdict_log: Optional[str] = None,
+        retrain_every: Optional[int] = 200,
+        min_training_examples: int = 50,
+        training_window: int = 2000,
+        seed: int = 0
+    ) -> None:
+        """Initialize the cascade.
+
+        Args:
+            rules: Keyword rules applied first
+            classifier: Embedding classifier applied second
+            accept_threshold: Minimum aligned probability to accept without the LLM
+            reject_threshold: Maximum aligned probability to reject without the LLM
+            audit_rate: Fraction of local decisions also sent to the LLM for comparison
+            verdict_log: JSONL file collecting LLM verdicts for training
+            retrain_every: Update the classifier with every batch of this many new
+                LLM verdicts, None to only train explicitly
+            min_training_examples: Minimum verdicts (of both classes) before the first training
+            training_window: Maximum number of most recent verdicts trained on at once
+            seed: Seed for selecting audited decisions
+        """
+        self.rules = rules
+        self.classifier = classifier
+        self.accept_threshold = accept_threshold
+        self.reject_threshold = reject_threshold
+        self.audit_rate = audit_rate
+        self.verdict_log = verdict_log
+        self.retrain_every = retrain_every
+        self.min_training_examples = min_training_examples
+        self.training_window = training_window
+        self._rng = random.Random(seed)
+        # Verdicts not yet trained on, and the description the classifier was trained for
+        self._untrained: "deque[Tuple[str, bool]]" = deque(maxlen=training_window)
+        self._classifier_description: Optional[str] = None
+        self._stats = {
+            "rule_decisions": 0,
+            "classifier_decisions": 0,
+            "escalations": 0,
+            "audits": 0,
+            "audit_agreements": 0,
+            "llm_failures": 0,
+            "audit_failures": 0,
+        }
+        path = self.classifier_path
+        if classifier is not None and not classifier.is_trained and path is not None and os.path.exists(path):
+            self._classifier_description = classifier.load(path).get("description_id")
+
+    @property
+    def classifier_path(self) -> Optional[str]:
+        """File the trained classifier is saved to, next to the verdict log."""
+        return f"{self.verdict_log}.classifier.pkl" if self.verdict_log is not None else None
+
+    @staticmethod
+    def _description_id(description: str) -> str:
+        return hashlib.sha256(description.encode("utf-8")).hexdigest()[:16]
+
+    def classify(self, message: str, description: str) -> Tuple[Optional[bool], bool]:
+        """Try to decide a post without the LLM.
+
+        The classifier stage is skipped unless the classifier was trained on
+        verdicts for the same network description.
+
+        Args:
+            message: The post message
+            description: Network description the post is judged against
+
+        Returns:
+            (verdict, escalate): verdict is the local decision or None.
+            escalate is True when the LLM must be asked, either because no
+            stage was confident or because the decision was picked for audit.
+        """
+        verdict = self.rules.classify(message) if self.rules is not None else None
+        if verdict is not None:
+            self._stats["rule_decisions"] += 1
+        elif (self.classifier is not None and self.classifier.is_trained
+                and self._classifier_description == self._description_id(description)):
+            probability = self.classifier.probability_aligned(message)
+            if probability >= self.accept_threshold:
+                verdict = True
+            elif probability <= self.reject_threshold:
+                verdict = False
+            if verdict is not None:
+                self._stats["classifier_decisions"] += 1
+
+        if verdict is None:
+            self._stats["escalations"] += 1
+            return None, True
+        if self.audit_rate and self._rng.random() < self.audit_rate:
+            self._stats["audits"] += 1
+            return verdict, True
+        return verdict, False
+
+    def record_llm_verdict(self, message: str, description: str, verdict: bool,
+                           local_verdict: Optional[bool] = None) -> None:
+        """Log an LLM verdict and compare it with the local decision if there was one.
+
+        Args:
+            message: The post message
+            description: Network description the post was judged against
+            verdict: The LLM verdict
+            local_verdict: Decision of the cheap stages for an audited post
+        """
+        if local_verdict is not None and local_verdict == verdict:
+            self._stats["audit_agreements"] += 1
+        if self.verdict_log is None:
+            return
+        with FileLock(f"{self.verdict_log}.lock"):
+            with open(self.verdict_log, "a") as file:
+                file.write(json.dumps({
+                    "message": message,
+                    "description_id": self._description_id(description),
+                    "verdict": verdict,
+                }) + "\n")
+        description_id = self._description_id(description)
+        if (self.retrain_every and self.classifier is not None
+                and self._classifier_description in (None, description_id)):
+            self._untrained.append((message, verdict))
+            if len(self._untrained) >= self.retrain_every:
+                self._update(description_id)
+
+    def record_llm_failure(self, local_verdict: Optional[bool] = None) -> None:
+        """Count an LLM moderation response that could not be parsed into a verdict.
+
+        Args:
+            local_verdict: Decision of the cheap stages for an audited post
+        """
+        self._stats["llm_failures"] += 1
+        if local_verdict is not None:
+            self._stats["audit_failures"] += 1
+
+    def _update(self, description_id: str) -> None:
+        """Train on the verdicts not trained on yet, once there are enough for a first fit."""
+        messages = [message for message, _ in self._untrained]
+        verdicts = [verdict for _, verdict in self._untrained]
+        if not self.classifier.is_trained and (len(messages) < self.min_training_examples or len(set(verdicts)) < 2):
+            return
+        self.classifier.partial_fit(messages, verdicts)
+        self._untrained.clear()
+        self._classifier_description = description_id
+        self.classifier.save(self.classifier_path, description_id=description_id)
+
+    def train(self, description: str) -> bool:
+        """Fit the classifier from scratch on the most recent logged verdicts for a description.
+
+        At most training_window verdicts are used. The trained classifier is
+        saved to classifier_path.
+
+        Args:
+            description: Only verdicts judged against this description are used
+
+        Returns:
+            True if the classifier was trained, False if there was too little data
+        """
+        if self.classifier is None or self.verdict_log is None or not os.path.exists(self.verdict_log):
+            return False
+        description_id = self._description_id(description)
+        window: "deque[Tuple[str, bool]]" = deque(maxlen=self.training_window)
+        with open(self.verdict_log, "r") as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if entry["description_id"] == description_id:
+                    window.append((entry["message"], bool(entry["verdict"])))
+        messages = [message for message, _ in window]
+        verdicts = [verdict for _, verdict in window]
+        if len(messages) < self.min_training_examples or len(set(verdicts)) < 2:
+            return False
+        self.classifier.fit(messages, verdicts)
+        self._untrained.clear()
+        self._classifier_description = description_id
+        self.classifier.save(self.classifier_path, description_id=description_id)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        """Return per-stage decision counts and the audited agreement rate with the LLM."""
+        local = self._stats["rule_decisions"] + self._stats["classifier_decisions"]
+        total = local + self._stats["escalations"]
+        # Audits whose LLM response could not be parsed have nothing to agree with
+        audited = self._stats["audits"] - self._stats["audit_failures"]
+        return {
+            **self._stats,
+            "local_rate": local / total if total else 0.0,
+            "agreement_rate": self._stats["audit_agreements"] / audited if audited > 0 else None,
+        }
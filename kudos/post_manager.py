@@ -1,40 +1,25 @@
 from typing import List, Dict, Optional, Any
-import json
-import os
 from datetime import datetime
-from filelock import FileLock
+from .post_storage import create_post_store, REMOVED_MESSAGE
 
 class PostManager:
     """Manages social network posts with thread-safe file operations."""
 
-    def __init__(self, file_path: str) -> None:
+    def __init__(self, file_path: str, storage: Optional[str] = None, **storage_options: Any) -> None:
         """Initialize PostManager with a file path.
 
         Args:
-            file_path: Path to JSON file storing posts
+            file_path: Path to the file storing posts
+            storage: Storage engine, "json" (one JSON array), "jsonl" (append-only
+                event log) or "sqlite" (indexed database). Inferred from the file
+                extension if None.
+            **storage_options: Options passed to the storage engine
         """
         self.file_path = file_path
+        self.store = create_post_store(file_path, storage, **storage_options)
         self.game_manager: Optional[Any] = None
-
-    def _read_posts_from_json(self) -> List[Dict[str, Any]]:
-        """Read posts from JSON file with thread-safety.
-
-        Returns:
-            List of post dictionaries
-        """
-        if not os.path.exists(self.file_path):
-            return []
-        with open(self.file_path, 'r') as file:
-            return json.load(file)
-
-    def _write_posts_to_json(self, posts: List[Dict[str, Any]]) -> None:
-        """Write posts to JSON file with thread-safety.
-
-        Args:
-            posts: List of post dictionaries to write
-        """
-        with open(self.file_path, 'w') as file:
-            json.dump(posts, file, indent=4)
+        # VirtualClock timestamping new posts; wall-clock time if None
+        self.clock: Optional[Any] = None
 
     def like_post(self, post_id: int, username: str) -> bool:
         """
@@ -47,20 +32,11 @@ class PostManager:
         Returns:
             bool: True if the post was liked, False otherwise.
         """
-        lock = FileLock(f"{self.file_path}.lock")
-        with lock:
-            posts = self._read_posts_from_json()
-            for post in posts:
-                if post['post_id'] == post_id:
-                    if username not in post['likes']:
-                        post['likes'].append(username)
-                        self._write_posts_to_json(posts)
-                        return True
-            return False
+        return self.store.like_post(post_id, username)
 
-    def add_post(self, message: str, username: str, round: Any, poster_group: str, likes: Optional[List[str]] = None, reply_to: Optional[int] = None, is_removed: bool = False) -> None:
+    def add_post(self, message: str, username: str, round: Any, poster_group: str, likes: Optional[List[str]] = None, reply_to: Optional[int] = None, is_removed: bool = False, moderation_status: Optional[str] = None) -> Dict[str, Any]:
         """
-        Add a new post to the JSON file.
+        Add a new post to storage.
 
         Args:
             message (str): The message of the post.
@@ -69,29 +45,84 @@ class PostManager:
             likes (list, optional): A list of usernames who like the post. Defaults to an empty list.
             reply_to (int, optional): The ID of the post being replied to. Defaults to None.
             round: The round of the post. Defaults to None.
+            is_removed (bool, optional): Store the post as removed. Defaults to False.
+            moderation_status (str, optional): Moderation state such as "pending". Only
+                stored when given.
+
+        Returns:
+            dict: The stored post, including its assigned post_id.
+        """
+        if is_removed:
+            message = REMOVED_MESSAGE
+
+        if likes is None:
+            likes = []
+        post = {
+            'message': message,
+            'username': username,
+            'poster_group': poster_group,
+            'likes': likes,
+            'reply_to': reply_to,
+            'post_id': None,  # assigned by the store
+            'is_removed': is_removed,
+            'round': round,
+            'timestamp': (self.clock.now() if self.clock is not None else datetime.now()).isoformat()
+        }
+        if moderation_status is not None:
+            post['moderation_status'] = moderation_status
+        return self.store.add_post(post)
+
+    def remove_post(self, post_id: int) -> bool:
+        """
+        Mark a post as removed, replacing its message.
+
+        Args:
+            post_id (int): The ID of the post to remove.
+
+        Returns:
+            bool: True if the post exists, False otherwise.
+        """
+        return self.store.remove_post(post_id)
+
+    def resolve_moderation(self, post_id: int, aligned: bool) -> bool:
+        """
+        Record the verdict for a post that was stored pending moderation.
+
+        Args:
+            post_id (int): The ID of the moderated post.
+            aligned (bool): Whether the post aligns with the network. Misaligned
+                posts are removed.
+
+        Returns:
+            bool: True if the post exists, False otherwise.
+        """
+        if not self.store.set_moderation_status(post_id, "approved" if aligned else "rejected"):
+            return False
+        if not aligned:
+            self.store.remove_post(post_id)
+        return True
+
+    def watermark(self) -> Dict[str, Any]:
+        """
+        Get the current position of the post store, to be saved in a checkpoint.
+
+        Returns:
+            dict: JSON serializable watermark accepted by rollback.
+        """
+        return self.store.watermark()
+
+    def rollback(self, watermark: Dict[str, Any]) -> int:
+        """
+        Undo changes made after a checkpoint.
+
+        Args:
+            watermark (dict): Watermark returned by the watermark method when
+                the checkpoint was taken. Later posts and likes are deleted.
+
+        Returns:
+            int: Number of posts deleted.
         """
-        lock = FileLock(f"{self.file_path}.lock")
-        with lock:
-            if is_removed:
-                message = "This post has been removed."
-
-            if likes is None:
-                likes = []
-            posts = self._read_posts_from_json()
-            post_id = max([post['post_id'] for post in posts], default=0) + 1
-            new_post = {
-                'message': message,
-                'username': username,
-                'poster_group': poster_group,
-                'likes': likes,
-                'reply_to': reply_to,
-                'post_id': post_id,
-                'is_removed': is_removed,
-                'round': round,
-                'timestamp': datetime.now().isoformat()
-            }
-            posts.append(new_post)
-            self._write_posts_to_json(posts)
+        return self.store.rollback_to(watermark)
 
     def get_posts_by_round(self, round: Any) -> List[Dict[str, Any]]:
         """
@@ -103,10 +134,7 @@ class PostManager:
         Returns:
             list: A list of posts for the given round.
         """
-        lock = FileLock(f"{self.file_path}.lock")
-        with lock:
-            posts = self._read_posts_from_json()
-            return [post for post in posts if post['round'] == round]
+        return self.store.get_posts_by_round(round)
 
     def get_post_by_id(self, post_id: int) -> Optional[Dict[str, Any]]:
         """
@@ -118,13 +146,7 @@ class PostManager:
         Returns:
             dict: The post with the given ID, or None if not found.
         """
-        lock = FileLock(f"{self.file_path}.lock")
-        with lock:
-            posts = self._read_posts_from_json()
-            for post in posts:
-                if post['post_id'] == post_id:
-                    return post
-            return None
+        return self.store.get_post(post_id)
 
     def get_all_posts(self) -> List[Dict[str, Any]]:
         """
@@ -133,6 +155,4 @@ class PostManager:
         Returns:
             list: A list of all posts.
         """
-        lock = FileLock(f"{self.file_path}.lock")
-        with lock:
-            return self._read_posts_from_json()
+        return self.store.get_all_posts()
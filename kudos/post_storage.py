@@ -0,0 +1,785 @@
+from typing import List, Dict, Optional, Any, Iterable, Tuple
+import json
+import os
+import sqlite3
+import threading
+from filelock import FileLock
+from . import instrumentation
+from .fileutil import write_json_atomic
+
+REMOVED_MESSAGE = "This post has been removed."
+
+
+def _copy_post(post: Dict[str, Any]) -> Dict[str, Any]:
+    return {**post, 'likes': list(post['likes'])}
+
+
+class _TimedFileLock(FileLock):
+    """FileLock whose acquisition time is recorded as "filelock_wait" when instrumented."""
+
+    def acquire(self, *args: Any, **kwargs: Any) -> Any:
+        with instrumentation.span("filelock_wait"):
+            return super().acquire(*args, **kwargs)
+
+
+class JsonPostStore:
+    """Stores all posts as one JSON array, rewritten on every change.
+
+    The parsed file is cached together with post_id and round indexes and
+    the next free post_id. The cache is reused as long as the file's mtime,
+    size and inode are unchanged, so in the common single-process case reads
+    are dictionary lookups instead of full reparses. Files are replaced
+    atomically, so readers never see a partially written file.
+    """
+
+    def __init__(self, file_path: str) -> None:
+        """Initialize the store.
+
+        Args:
+            file_path: Path to JSON file storing posts
+        """
+        self.file_path = file_path
+        self._lock = _TimedFileLock(f"{file_path}.lock")
+        self._posts: List[Dict[str, Any]] = []
+        self._by_id: Dict[int, Dict[str, Any]] = {}
+        self._by_round: Dict[Any, List[Dict[str, Any]]] = {}
+        self._next_id = 1
+        self._file_identity: Optional[tuple] = None
+        self.generation = 0
+
+    def read_posts(self) -> List[Dict[str, Any]]:
+        """Read posts from the JSON file, bypassing the cache.
+
+        Returns:
+            List of post dictionaries
+        """
+        if not os.path.exists(self.file_path):
+            return []
+        with open(self.file_path, 'r') as file, instrumentation.span("json_read"):
+            return json.load(file)
+
+    def write_posts(self, posts: List[Dict[str, Any]]) -> None:
+        """Atomically replace the JSON file and cache its content.
+
+        Args:
+            posts: List of post dictionaries to write
+        """
+        with instrumentation.span("json_write"):
+            write_json_atomic(self.file_path, posts, indent=4)
+        self._index(posts)
+        self._file_identity = self._current_identity()
+
+    def _current_identity(self) -> Optional[tuple]:
+        try:
+            stat = os.stat(self.file_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def _index(self, posts: List[Dict[str, Any]]) -> None:
+        self._posts = posts
+        self._by_id = {post['post_id']: post for post in posts}
+        self._by_round = {}
+        for post in posts:
+            self._by_round.setdefault(post['round'], []).append(post)
+        self._next_id = max(self._by_id, default=0) + 1
+        self.generation += 1
+
+    def _refresh(self) -> None:
+        """Reload the cache if the file changed since it was last read or written."""
+        identity = self._current_identity()
+        if identity != self._file_identity or (identity is None and self._posts):
+            self._index(self.read_posts())
+            self._file_identity = identity
+
+    def _write_cached(self) -> None:
+        with instrumentation.span("json_write"):
+            write_json_atomic(self.file_path, self._posts, indent=4)
+        self._file_identity = self._current_identity()
+        self.generation += 1
+
+    def add_post(self, post: Dict[str, Any]) -> Dict[str, Any]:
+        """Store a new post, assigning the next post_id.
+
+        Args:
+            post: Post fields without post_id
+
+        Returns:
+            The stored post including its post_id
+        """
+        with self._lock:
+            self._refresh()
+            new_post = {**post, 'post_id': self._next_id}
+            self._posts.append(new_post)
+            self._by_id[new_post['post_id']] = new_post
+            self._by_round.setdefault(new_post['round'], []).append(new_post)
+            self._next_id += 1
+            self._write_cached()
+            return _copy_post(new_post)
+
+    def like_post(self, post_id: int, username: str) -> bool:
+        """Add username to the likes of a post.
+
+        Returns:
+            True if the like was added, False if the post is missing or already liked
+        """
+        with self._lock:
+            self._refresh()
+            post = self._by_id.get(post_id)
+            if post is None or username in post['likes']:
+                return False
+            post['likes'].append(username)
+            self._write_cached()
+            return True
+
+    def remove_post(self, post_id: int) -> bool:
+        """Mark a post as removed and replace its message.
+
+        Returns:
+            True if the post exists, False otherwise
+        """
+        with self._lock:
+            self._refresh()
+            post = self._by_id.get(post_id)
+            if post is None:
+                return False
+            post['is_removed'] = True
+            post['message'] = REMOVED_MESSAGE
+            self._write_cached()
+            return True
+
+    def set_moderation_status(self, post_id: int, status: str) -> bool:
+        """Set the moderation_status field of a post.
+
+        Returns:
+            True if the post exists, False otherwise
+        """
+        with self._lock:
+            self._refresh()
+            post = self._by_id.get(post_id)
+            if post is None:
+                return False
+            post['moderation_status'] = status
+            self._write_cached()
+            return True
+
+    def truncate(self, last_post_id: int, like_counts: Dict[int, int]) -> int:
+        """Roll the store back to an earlier state.
+
+        Args:
+            last_post_id: Posts with a higher post_id are deleted
+            like_counts: Number of likes each remaining post keeps, 0 if missing.
+                Later likes are dropped.
+
+        Returns:
+            Number of posts deleted
+        """
+        with self._lock:
+            self._refresh()
+            kept = [post for post in self._posts if post['post_id'] <= last_post_id]
+            deleted = len(self._posts) - len(kept)
+            for post in kept:
+                del post['likes'][like_counts.get(post['post_id'], 0):]
+            self._index(kept)
+            self._write_cached()
+            return deleted
+
+    def watermark(self) -> Dict[str, Any]:
+        """Return the current position of the store, for rollback_to.
+
+        The file keeps no order of likes across posts, so the watermark holds
+        the like count of every liked post. It is read from the cache without
+        copying posts; like every write of this store it is linear in the
+        number of posts.
+        """
+        with self._lock:
+            self._refresh()
+            return {
+                'last_post_id': self._next_id - 1,
+                'like_counts': {post['post_id']: len(post['likes']) for post in self._posts if post['likes']},
+            }
+
+    def rollback_to(self, watermark: Dict[str, Any]) -> int:
+        """Undo the posts and likes added after watermark was taken.
+
+        Returns:
+            Number of posts deleted
+        """
+        like_counts = {int(post_id): count for post_id, count in watermark['like_counts'].items()}
+        return self.truncate(watermark['last_post_id'], like_counts)
+
+    def get_post(self, post_id: int) -> Optional[Dict[str, Any]]:
+        self._refresh()
+        post = self._by_id.get(post_id)
+        return _copy_post(post) if post is not None else None
+
+    def get_posts_by_round(self, round: Any) -> List[Dict[str, Any]]:
+        self._refresh()
+        return [_copy_post(post) for post in self._by_round.get(round, [])]
+
+    def get_all_posts(self) -> List[Dict[str, Any]]:
+        self._refresh()
+        return [_copy_post(post) for post in self._posts]
+
+
+class JsonlEventPostStore:
+    """Stores posts as an append-only log of JSON events, one per line.
+
+    Events are "post_created", "like_added", "post_removed",
+    "moderation_resolved" and "truncated". Every write
+    appends a single line, so its cost does not grow with the number of
+    posts. Reads are served from an in-memory view that is rebuilt from the
+    snapshot and log on open and then kept current by replaying only lines
+    appended since the last read, including lines written by other
+    processes. Every compact_every events the view is written to a snapshot
+    file and the log is truncated. Events carry increasing sequence numbers
+    and the snapshot records the last one it includes, so if a crash
+    leaves the log untruncated after a snapshot, its events are not applied
+    twice.
+
+    The view also keeps every like in the order it was added, so a watermark
+    is just the last post_id and the number of likes, taken in constant time.
+    """
+
+    def __init__(self, file_path: str, compact_every: int = 1000) -> None:
+        """Initialize the store and load the current view.
+
+        Args:
+            file_path: Path to the JSONL event log
+            compact_every: Number of logged events after which a snapshot is written
+        """
+        self.file_path = file_path
+        self.snapshot_path = f"{file_path}.snapshot.json"
+        self.compact_every = compact_every
+        self._lock = _TimedFileLock(f"{file_path}.lock")
+        self._posts: Dict[int, Dict[str, Any]] = {}
+        self._by_round: Dict[Any, List[int]] = {}
+        self._like_order: List[Tuple[int, str]] = []
+        self._next_id = 1
+        self._seq = 0
+        self._snapshot_seq = 0
+        self._offset = 0
+        self._log_events = 0
+        self._snapshot_id: Optional[tuple] = None
+        with self._lock:
+            self._reload()
+
+    def _snapshot_identity(self) -> Optional[tuple]:
+        try:
+            stat = os.stat(self.snapshot_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def _reload(self) -> None:
+        self._posts = {}
+        self._by_round = {}
+        self._like_order = []
+        self._next_id = 1
+        self._seq = self._snapshot_seq = 0
+        self._offset = 0
+        self._log_events = 0
+        self._snapshot_id = self._snapshot_identity()
+        if self._snapshot_id is not None:
+            with open(self.snapshot_path, 'r') as file, instrumentation.span("json_read"):
+                snapshot = json.load(file)
+            self._seq = self._snapshot_seq = snapshot.get('seq', 0)
+            for post in snapshot['posts']:
+                self._insert(post)
+            if 'like_order' in snapshot:
+                self._like_order = [(post_id, username) for post_id, username in snapshot['like_order']]
+            else:
+                # Snapshots written before the like order was kept: post order is the best guess
+                self._like_order = [(post['post_id'], username) for post in snapshot['posts'] for username in post['likes']]
+        self._read_new_events()
+
+    def _refresh(self) -> None:
+        """Bring the view up to date with the files. Must hold the lock."""
+        if self._snapshot_identity() != self._snapshot_id:
+            self._reload()
+            return
+        try:
+            size = os.path.getsize(self.file_path)
+        except FileNotFoundError:
+            size = 0
+        if size < self._offset:
+            self._reload()
+        elif size > self._offset:
+            self._read_new_events()
+
+    def _read_new_events(self) -> None:
+        if not os.path.exists(self.file_path):
+            return
+        with open(self.file_path, 'rb') as file, instrumentation.span("json_read"):
+            file.seek(self._offset)
+            for line in file:
+                if not line.endswith(b"\n"):
+                    break  # incomplete trailing line from an interrupted write
+                self._offset += len(line)
+                if line.strip():
+                    event = json.loads(line)
+                    self._log_events += 1
+                    # Events older than the snapshot are left by a compaction interrupted before truncating the log
+                    if event.get('seq', self._snapshot_seq + 1) > self._snapshot_seq:
+                        self._apply(event)
+                        self._seq = max(self._seq, event.get('seq', self._seq))
+
+    def _insert(self, post: Dict[str, Any]) -> None:
+        self._posts[post['post_id']] = post
+        self._by_round.setdefault(post['round'], []).append(post['post_id'])
+        self._next_id = max(self._next_id, post['post_id'] + 1)
+
+    def _apply(self, event: Dict[str, Any]) -> None:
+        kind = event['event']
+        if kind == 'post_created':
+            self._insert(event['post'])
+        elif kind == 'like_added':
+            post = self._posts.get(event['post_id'])
+            if post is not None and event['username'] not in post['likes']:
+                post['likes'].append(event['username'])
+                self._like_order.append((event['post_id'], event['username']))
+        elif kind == 'post_removed':
+            post = self._posts.get(event['post_id'])
+            if post is not None:
+                post['is_removed'] = True
+                post['message'] = REMOVED_MESSAGE
+        elif kind == 'moderation_resolved':
+            post = self._posts.get(event['post_id'])
+            if post is not None:
+                post['moderation_status'] = event['status']
+        elif kind == 'truncated':
+            self._truncate_view(event)
+
+    def _truncate_view(self, event: Dict[str, Any]) -> None:
+        """Apply a "truncated" event, given a like_seq or, in older logs, like_counts."""
+        if 'like_seq' in event:
+            for post_id, username in self._like_order[event['like_seq']:]:
+                post = self._posts.get(post_id)
+                if post is not None and username in post['likes']:
+                    post['likes'].remove(username)
+            del self._like_order[event['like_seq']:]
+        self._posts = {post_id: post for post_id, post in self._posts.items() if post_id <= event['last_post_id']}
+        self._by_round = {}
+        for post_id, post in self._posts.items():
+            self._by_round.setdefault(post['round'], []).append(post_id)
+        if 'like_counts' in event:
+            like_counts = {int(post_id): count for post_id, count in event['like_counts'].items()}
+            for post_id, post in self._posts.items():
+                del post['likes'][like_counts.get(post_id, 0):]
+            self._like_order = [
+                (post_id, username) for post_id, username in self._like_order
+                if post_id in self._posts and username in self._posts[post_id]['likes']
+            ]
+        self._next_id = event['last_post_id'] + 1
+
+    def _append(self, event: Dict[str, Any]) -> None:
+        """Log and apply one event. Must hold the lock with the view refreshed."""
+        self._seq += 1
+        event = {**event, 'seq': self._seq}
+        line = (json.dumps(event) + "\n").encode("utf-8")
+        with open(self.file_path, 'ab') as file, instrumentation.span("json_write"):
+            file.write(line)
+        self._offset += len(line)
+        self._log_events += 1
+        self._apply(event)
+        if self._log_events >= self.compact_every:
+            self.compact()
+
+    def compact(self) -> None:
+        """Write the current view to the snapshot and truncate the log."""
+        with self._lock:
+            self._refresh()
+            with instrumentation.span("json_write"):
+                write_json_atomic(self.snapshot_path, {'posts': list(self._posts.values()), 'like_order': self._like_order,
+                                                       'seq': self._seq})
+            with open(self.file_path, 'w'):
+                pass
+            self._offset = 0
+            self._log_events = 0
+            self._snapshot_seq = self._seq
+            self._snapshot_id = self._snapshot_identity()
+
+    def add_post(self, post: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            self._refresh()
+            new_post = {**post, 'post_id': self._next_id}
+            self._append({'event': 'post_created', 'post': new_post})
+            return _copy_post(new_post)
+
+    def like_post(self, post_id: int, username: str) -> bool:
+        with self._lock:
+            self._refresh()
+            post = self._posts.get(post_id)
+            if post is None or username in post['likes']:
+                return False
+            self._append({'event': 'like_added', 'post_id': post_id, 'username': username})
+            return True
+
+    def remove_post(self, post_id: int) -> bool:
+        with self._lock:
+            self._refresh()
+            if post_id not in self._posts:
+                return False
+            self._append({'event': 'post_removed', 'post_id': post_id})
+            return True
+
+    def set_moderation_status(self, post_id: int, status: str) -> bool:
+        with self._lock:
+            self._refresh()
+            if post_id not in self._posts:
+                return False
+            self._append({'event': 'moderation_resolved', 'post_id': post_id, 'status': status})
+            return True
+
+    def truncate(self, last_post_id: int, like_counts: Dict[int, int]) -> int:
+        """Roll the store back to an earlier state, see JsonPostStore.truncate."""
+        with self._lock:
+            self._refresh()
+            deleted = sum(1 for post_id in self._posts if post_id > last_post_id)
+            self._append({'event': 'truncated', 'last_post_id': last_post_id, 'like_counts': like_counts})
+            return deleted
+
+    def watermark(self) -> Dict[str, Any]:
+        """Return the current position of the store, for rollback_to.
+
+        Returns:
+            The last post_id and the number of likes added so far
+        """
+        with self._lock:
+            self._refresh()
+            return {'last_post_id': self._next_id - 1, 'like_seq': len(self._like_order)}
+
+    def rollback_to(self, watermark: Dict[str, Any]) -> int:
+        """Undo the posts and likes added after watermark was taken.
+
+        Also accepts the like_counts watermarks of JsonPostStore.
+
+        Returns:
+            Number of posts deleted
+        """
+        if 'like_counts' in watermark:
+            like_counts = {int(post_id): count for post_id, count in watermark['like_counts'].items()}
+            return self.truncate(watermark['last_post_id'], like_counts)
+        with self._lock:
+            self._refresh()
+            deleted = sum(1 for post_id in self._posts if post_id > watermark['last_post_id'])
+            self._append({'event': 'truncated', 'last_post_id': watermark['last_post_id'], 'like_seq': watermark['like_seq']})
+            return deleted
+
+    def get_post(self, post_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._refresh()
+            post = self._posts.get(post_id)
+            return _copy_post(post) if post is not None else None
+
+    def get_posts_by_round(self, round: Any) -> List[Dict[str, Any]]:
+        with self._lock:
+            self._refresh()
+            return [_copy_post(self._posts[post_id]) for post_id in self._by_round.get(round, [])]
+
+    def get_all_posts(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            self._refresh()
+            return [_copy_post(post) for post in self._posts.values()]
+
+
+class SqlitePostStore:
+    """Stores posts in a SQLite database shared safely between processes.
+
+    The database runs in WAL mode so readers never block the writer. Posts
+    are indexed by post_id, round, username and reply_to, and likes live in a
+    separate table with one row per (post_id, username). Like rowids follow
+    the order likes were added, so a watermark is the highest post_id and
+    like rowid, both read from the end of their primary key.
+    """
+
+    _POST_COLUMNS = ('message', 'username', 'poster_group', 'reply_to', 'post_id', 'is_removed', 'round', 'timestamp')
+
+    def __init__(self, file_path: str, timeout: float = 30.0) -> None:
+        """Open or create the database.
+
+        Args:
+            file_path: Path to the SQLite database file
+            timeout: Seconds to wait for another process's write lock
+        """
+        self.file_path = file_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(file_path, timeout=timeout, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS posts (
+                post_id INTEGER PRIMARY KEY,
+                message TEXT,
+                username TEXT NOT NULL,
+                poster_group TEXT,
+                reply_to INTEGER,
+                is_removed INTEGER NOT NULL DEFAULT 0,
+                round,
+                timestamp TEXT,
+                extra TEXT
+            );
+            CREATE TABLE IF NOT EXISTS likes (
+                post_id INTEGER NOT NULL REFERENCES posts(post_id),
+                username TEXT NOT NULL,
+                UNIQUE (post_id, username)
+            );
+            CREATE INDEX IF NOT EXISTS idx_posts_round ON posts(round);
+            CREATE INDEX IF NOT EXISTS idx_posts_username ON posts(username);
+            CREATE INDEX IF NOT EXISTS idx_posts_reply_to ON posts(reply_to);
+            CREATE INDEX IF NOT EXISTS idx_likes_post_id ON likes(post_id);
+        """)
+
+    def close(self) -> None:
+        """Close the database connection."""
+        self._conn.close()
+
+    def _insert(self, post: Dict[str, Any]) -> int:
+        extra = {k: v for k, v in post.items() if k not in self._POST_COLUMNS and k != 'likes'}
+        cursor = self._conn.execute(
+            "INSERT INTO posts (post_id, message, username, poster_group, reply_to, is_removed, round, timestamp, extra) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (post.get('post_id'), post['message'], post['username'], post.get('poster_group'),
+             post.get('reply_to'), int(bool(post.get('is_removed', False))), post.get('round'),
+             post.get('timestamp'), json.dumps(extra) if extra else None)
+        )
+        post_id = cursor.lastrowid
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO likes (post_id, username) VALUES (?, ?)",
+            [(post_id, username) for username in post.get('likes', [])]
+        )
+        return post_id
+
+    def _rows_to_posts(self, rows: List[tuple]) -> List[Dict[str, Any]]:
+        if not rows:
+            return []
+        likes: Dict[int, List[str]] = {row[0]: [] for row in rows}
+        ids = list(likes)
+        # Chunked to stay below SQLite's bound parameter limit
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            for post_id, username in self._conn.execute(
+                f"SELECT post_id, username FROM likes WHERE post_id IN ({','.join('?' * len(chunk))}) ORDER BY rowid",
+                chunk
+            ):
+                likes[post_id].append(username)
+        posts = []
+        for post_id, message, username, poster_group, reply_to, is_removed, round, timestamp, extra in rows:
+            post = {
+                'message': message,
+                'username': username,
+                'poster_group': poster_group,
+                'likes': likes[post_id],
+                'reply_to': reply_to,
+                'post_id': post_id,
+                'is_removed': bool(is_removed),
+                'round': round,
+                'timestamp': timestamp,
+            }
+            if extra:
+                post.update(json.loads(extra))
+            posts.append(post)
+        return posts
+
+    def _select(self, where: str = "", params: Iterable[Any] = ()) -> List[Dict[str, Any]]:
+        rows = self._conn.execute(
+            "SELECT post_id, message, username, poster_group, reply_to, is_removed, round, timestamp, extra "
+            f"FROM posts {where} ORDER BY post_id",
+            tuple(params)
+        ).fetchall()
+        return self._rows_to_posts(rows)
+
+    def add_post(self, post: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                post_id = self._insert({**post, 'post_id': None})
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            return {**post, 'post_id': post_id, 'likes': list(post.get('likes', []))}
+
+    def add_posts(self, posts: Iterable[Dict[str, Any]]) -> int:
+        """Insert posts keeping their post_id, in a single transaction.
+
+        Args:
+            posts: Complete post dictionaries, e.g. read from a JSON posts file
+
+        Returns:
+            Number of posts inserted
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                count = 0
+                for post in posts:
+                    self._insert(post)
+                    count += 1
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            return count
+
+    def like_post(self, post_id: int, username: str) -> bool:
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO likes (post_id, username) "
+                "SELECT post_id, ? FROM posts WHERE post_id = ?",
+                (username, post_id)
+            )
+            return cursor.rowcount > 0
+
+    def remove_post(self, post_id: int) -> bool:
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE posts SET is_removed = 1, message = ? WHERE post_id = ?",
+                (REMOVED_MESSAGE, post_id)
+            )
+            return cursor.rowcount > 0
+
+    def set_moderation_status(self, post_id: int, status: str) -> bool:
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE posts SET extra = json_set(COALESCE(extra, '{}'), '$.moderation_status', ?) WHERE post_id = ?",
+                (status, post_id)
+            )
+            return cursor.rowcount > 0
+
+    def truncate(self, last_post_id: int, like_counts: Dict[int, int]) -> int:
+        """Roll the store back to an earlier state, see JsonPostStore.truncate."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM likes WHERE post_id > ?", (last_post_id,))
+                deleted = self._conn.execute("DELETE FROM posts WHERE post_id > ?", (last_post_id,)).rowcount
+                # Likes are kept in insertion (rowid) order, so later likes have higher ranks
+                self._conn.execute("CREATE TEMP TABLE IF NOT EXISTS like_counts (post_id INTEGER PRIMARY KEY, count INTEGER)")
+                self._conn.execute("DELETE FROM like_counts")
+                self._conn.executemany("INSERT INTO like_counts VALUES (?, ?)", list(like_counts.items()))
+                self._conn.execute("""
+                    DELETE FROM likes WHERE rowid IN (
+                        SELECT rowid FROM (
+                            SELECT l.rowid AS rowid,
+                                   ROW_NUMBER() OVER (PARTITION BY l.post_id ORDER BY l.rowid) AS rank,
+                                   COALESCE(c.count, 0) AS keep
+                            FROM likes l LEFT JOIN like_counts c ON c.post_id = l.post_id
+                        ) WHERE rank > keep
+                    )
+                """)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            return deleted
+
+    def watermark(self) -> Dict[str, Any]:
+        """Return the current position of the store, for rollback_to.
+
+        Returns:
+            The last post_id and the rowid of the last like
+        """
+        with self._lock:
+            last_post_id, = self._conn.execute("SELECT COALESCE(MAX(post_id), 0) FROM posts").fetchone()
+            like_seq, = self._conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM likes").fetchone()
+            return {'last_post_id': last_post_id, 'like_seq': like_seq}
+
+    def rollback_to(self, watermark: Dict[str, Any]) -> int:
+        """Undo the posts and likes added after watermark was taken.
+
+        Also accepts the like_counts watermarks of JsonPostStore.
+
+        Returns:
+            Number of posts deleted
+        """
+        if 'like_counts' in watermark:
+            like_counts = {int(post_id): count for post_id, count in watermark['like_counts'].items()}
+            return self.truncate(watermark['last_post_id'], like_counts)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "DELETE FROM likes WHERE rowid > ? OR post_id > ?",
+                    (watermark['like_seq'], watermark['last_post_id'])
+                )
+                deleted = self._conn.execute("DELETE FROM posts WHERE post_id > ?", (watermark['last_post_id'],)).rowcount
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            return deleted
+
+    def get_post(self, post_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            posts = self._select("WHERE post_id = ?", (post_id,))
+            return posts[0] if posts else None
+
+    def get_posts_by_round(self, round: Any) -> List[Dict[str, Any]]:
+        with self._lock:
+            return self._select("WHERE round = ?", (round,))
+
+    def get_posts_by_user(self, username: str) -> List[Dict[str, Any]]:
+        """Return all posts written by a user."""
+        with self._lock:
+            return self._select("WHERE username = ?", (username,))
+
+    def get_replies(self, post_id: int) -> List[Dict[str, Any]]:
+        """Return all posts replying to a post."""
+        with self._lock:
+            return self._select("WHERE reply_to = ?", (post_id,))
+
+    def get_all_posts(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return self._select()
+
+
+def import_json_posts(json_path: str, sqlite_path: str) -> int:
+    """Copy the posts of a JSON posts file into a SQLite store, keeping post ids.
+
+    Args:
+        json_path: Existing JSON posts file (e.g. posts.json)
+        sqlite_path: SQLite database to create or extend
+
+    Returns:
+        Number of posts imported
+    """
+    posts = JsonPostStore(json_path).get_all_posts()
+    store = SqlitePostStore(sqlite_path)
+    try:
+        return store.add_posts(posts)
+    finally:
+        store.close()
+
+
+STORAGE_ENGINES = {
+    'json': JsonPostStore,
+    'jsonl': JsonlEventPostStore,
+    'sqlite': SqlitePostStore,
+}
+
+_EXTENSION_ENGINES = {
+    '.jsonl': 'jsonl',
+    '.db': 'sqlite',
+    '.sqlite': 'sqlite',
+    '.sqlite3': 'sqlite',
+}
+
+
+def create_post_store(file_path: str, storage: Optional[str] = None, **options: Any) -> Any:
+    """Create the storage engine for a posts file.
+
+    Args:
+        file_path: Path of the posts file
+        storage: Engine name ("json", "jsonl" or "sqlite"). Inferred from the
+            file extension if None, defaulting to "json".
+        **options: Engine specific options, e.g. compact_every for "jsonl"
+
+    Returns:
+        A post store instance
+    """
+    if storage is None:
+        storage = _EXTENSION_ENGINES.get(os.path.splitext(file_path)[1].lower(), 'json')
+    if storage not in STORAGE_ENGINES:
+        raise ValueError(f"Unknown storage engine '{storage}'. Choose one of {sorted(STORAGE_ENGINES)}.")
+    return STORAGE_ENGINES[storage](file_path, **options)
@@ -1,8 +1,54 @@
-from .llm_wrapper import ask_question
-from typing import List, Dict, Any, Optional
+from .llm_wrapper import ask_question, ask_questions, get_backend, models
+from .llm_backends import LLMBackend
+from .verdict_cache import VerdictCache
+from .moderation import ModerationCascade
+from .prompt_templates import Prompt, PromptTemplate
+from . import instrumentation
+from typing import List, Dict, Any, Optional, Tuple
+
+# Bump whenever the moderation question or schema changes so cached verdicts are not reused.
+MODERATION_PROMPT_VERSION = 1
+
+MODERATION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "assessment": {
+            "type": "object",
+            "properties": {
+                "is_post_aligned_true_false": {
+                    "type": "boolean"
+                },
+                "reason": {
+                    "type": "string"
+                }
+            },
+            "required": ["is_post_aligned_true_false"]
+        }
+    }
+}
+
+MODERATION_PROMPT_TEMPLATE = PromptTemplate(
+    "You are given a brief description of a social network and a specific post. "
+    "Your task is to determine whether this post is likely to be found on that "
+    "network, taking into account the network’s typical audience, content focus, "
+    "and provided description, and the kinds of content commonly shared there. You should also "
+    "consider that generic or broadly acceptable content is usually permissible "
+    "on most platforms. "
+    "Please be reasonably lenient in your assessment. "
+    "Only return a single Json object, no additional information, text, or commentary."
+    "\n\n"
+    "Post: '{message}'\n"
+    "Description: '{description}'"
+)
 
 class PostingInterface:
-    def __init__(self, post_manager, description: str, game_manager, score_tracker) -> None:
+    def __init__(self, post_manager, description: str, game_manager, score_tracker,
+                 verdict_cache: Optional[VerdictCache] = None,
+                 moderation_model: Optional[str] = None,
+                 backend: Optional[LLMBackend] = None,
+                 deferred_moderation: bool = False,
+                 moderation_batch_size: int = 16,
+                 moderation_cascade: Optional[ModerationCascade] = None) -> None:
         """Initialize the posting interface.
 
         Args:
@@ -10,11 +56,25 @@ class PostingInterface:
             description: Description of the social network
             game_manager: Instance of GameManager
             score_tracker: Instance of UserScoreTracker
+            verdict_cache: Optional persistent cache of moderation verdicts
+            moderation_model: Model used for moderation, defaults to the first available model
+            backend: LLM backend to use, the process-wide default if None
+            deferred_moderation: Store posts immediately as pending and classify them
+                later in batches instead of blocking each post on the LLM
+            moderation_batch_size: Pending posts that trigger a batched moderation pass
+            moderation_cascade: Cheap local stages consulted before the LLM
         """
         self.post_manager = post_manager
         self.description = description
         self.game_manager = game_manager
         self.score_tracker = score_tracker
+        self.verdict_cache = verdict_cache
+        self.moderation_model = moderation_model or models[0]
+        self.backend = backend
+        self.deferred_moderation = deferred_moderation
+        self.moderation_batch_size = moderation_batch_size
+        self.moderation_cascade = moderation_cascade
+        self._pending_moderation: List[Dict[str, Any]] = []
 
     def check_posts_align_with_description(
         self,
@@ -29,52 +89,99 @@ class PostingInterface:
                 return False
         return True
 
+    def _verdict_cache_key(self, message: str, description: str) -> Optional[str]:
+        if self.verdict_cache is None:
+            return None
+        model_identity = (self.backend or get_backend()).model_identity(self.moderation_model)
+        return VerdictCache.make_key(message, description, model_identity, MODERATION_PROMPT_VERSION)
+
+    def _moderation_question(self, message: str, description: str) -> Prompt:
+        return MODERATION_PROMPT_TEMPLATE.render(message=message, description=description)
+
+    def _record_verdict(self, response: Any, cache_key: Optional[str], message: str, description: str,
+                        local_verdict: Optional[bool] = None) -> bool:
+        """Turn an LLM response into a verdict, caching and logging it if it could be parsed."""
+        try:
+            aligns = bool(response["assessment"]["is_post_aligned_true_false"])
+        except (KeyError, TypeError, IndexError):
+            # Unparseable responses let the post through, without caching or logging a verdict
+            if self.moderation_cascade is not None:
+                self.moderation_cascade.record_llm_failure(local_verdict)
+            return True
+
+        if cache_key is not None:
+            self.verdict_cache.put(cache_key, aligns, model=(self.backend or get_backend()).model_identity(self.moderation_model))
+        if self.moderation_cascade is not None:
+            self.moderation_cascade.record_llm_verdict(message, description, aligns, local_verdict)
+        return aligns
+
+    def _local_verdict(self, message: str, description: str) -> Tuple[Optional[bool], bool]:
+        """Ask the moderation cascade, returning (verdict, escalate to the LLM)."""
+        if self.moderation_cascade is None:
+            return None, True
+        return self.moderation_cascade.classify(message, description)
+
     def check_post_aligns_with_description(self, message: str, description: str) -> bool:
         """
         Check if a post aligns with the description using the LLM interface.
+
+        Verdicts are looked up in and stored to the verdict cache when one is configured.
+        The moderation cascade, if any, is consulted next and the LLM is only asked
+        when it is not confident or the decision was picked for audit.
         """
-        question = (
-            "You are given a brief description of a social network and a specific post. "
-            "Your task is to determine whether this post is likely to be found on that "
-            "network, taking into account the network’s typical audience, content focus, "
-            "and provided description, and the kinds of content commonly shared there. You should also "
-            "consider that generic or broadly acceptable content is usually permissible "
-            "on most platforms. "
-            "Please be reasonably lenient in your assessment. "
-            "Only return a single Json object, no additional information, text, or commentary."
-            "\n\n"
-            f"Post: '{message}'\n"
-            f"Description: '{description}'"
-        )
-
-        schema_dict = {
-            "type": "object",
-            "properties": {
-                "assessment": {
-                    "type": "object",
-                    "properties": {
-                        "is_post_aligned_true_false": {
-                            "type": "boolean"
-                        },
-                        "reason": {
-                            "type": "string"
-                        }
-                    },
-                    "required": ["is_post_aligned_true_false"]
-                }
-            }
-        }
+        with instrumentation.span("moderation"):
+            cache_key = self._verdict_cache_key(message, description)
+            if cache_key is not None:
+                cached = self.verdict_cache.get(cache_key)
+                if cached is not None:
+                    instrumentation.count("moderation_cache_hits")
+                    return cached
 
-        response = ask_question(question=question, schema=schema_dict)
+            local_verdict, escalate = self._local_verdict(message, description)
+            if not escalate:
+                instrumentation.count("moderation_local_verdicts")
+                return local_verdict
 
-        try:
-            aligns = bool(response["assessment"]["is_post_aligned_true_false"])
-        except:
-            aligns = True
+            instrumentation.count("moderation_llm_calls")
+            response = ask_question(question=self._moderation_question(message, description), schema=MODERATION_SCHEMA,
+                                    llm_name=self.moderation_model, backend=self.backend)
+            return self._record_verdict(response, cache_key, message, description, local_verdict)
 
-        return aligns
+    def flush_moderation(self) -> int:
+        """Classify all pending posts in batched LLM calls and apply the verdicts.
+
+        Verdicts are applied in the order the posts were made. Misaligned posts
+        are removed and their author receives the misalignment penalty in the
+        round the post was made.
+
+        Returns:
+            Number of posts removed
+        """
+        pending, self._pending_moderation = self._pending_moderation, []
+        if not pending:
+            return 0
+
+        questions = [self._moderation_question(item['message'], self.description) for item in pending]
+        removed = 0
+        for start in range(0, len(pending), self.moderation_batch_size):
+            batch = pending[start:start + self.moderation_batch_size]
+            instrumentation.count("moderation_llm_calls", len(batch))
+            with instrumentation.span("moderation"):
+                responses = ask_questions(questions[start:start + self.moderation_batch_size], MODERATION_SCHEMA,
+                                          llm_name=self.moderation_model, backend=self.backend)
+            for item, response in zip(batch, responses):
+                aligns = self._record_verdict(response, item['cache_key'], item['message'], self.description,
+                                              item['local_verdict'])
+                self._apply_moderation(item, aligns)
+                removed += not aligns
+        return removed
+
+    def _apply_moderation(self, item: Dict[str, Any], aligns: bool) -> None:
+        self.post_manager.resolve_moderation(item['post_id'], aligns)
+        if not aligns:
+            self.score_tracker.misalignment_penalty(item['username'], item['round'])
+            self.score_tracker.record_post_removed(item['post_id'])
 
-    
     def like_post(self, post_id: int, username: str, liker_group: str) -> bool:
         """
         Like a post by its ID if the user's group matches the author's group and the post is not blocked.
@@ -130,6 +237,8 @@ class PostingInterface:
         ret_val = True
         if not any(player['username'] == username for player in self.game_manager.players):
             raise ValueError(f"User {username} does not exist in the game.")
+        if self.deferred_moderation:
+            return self._add_post_deferred(message, username, round, poster_group, likes, reply_to)
         if not self.check_post_aligns_with_description(message, self.description):
             blocked = True
             self.score_tracker.misalignment_penalty(username, round)
@@ -143,14 +252,66 @@ class PostingInterface:
             else:
                 blocked = False
                 ret_val = False
-        self.post_manager.add_post(message, username, round, poster_group, likes, reply_to, is_removed=blocked)
-        # Give point to the user who was replied to
+        post = self.post_manager.add_post(message, username, round, poster_group, likes, reply_to, is_removed=blocked)
+        self.score_tracker.record_post(post)
+        self._reply_points(reply_to, username, round, poster_group)
+        return ret_val
+
+    def _add_post_deferred(
+        self,
+        message: str,
+        username: str,
+        round: int,
+        poster_group: str,
+        likes: Optional[List[str]],
+        reply_to: Optional[int]
+    ) -> bool:
+        """Store a post right away and queue its LLM alignment check.
 
+        The group name check is cheap and still applied immediately. The
+        verdict comes from the verdict cache or the moderation cascade if
+        possible, otherwise the post is stored as pending and judged by the
+        next flush_moderation call.
+        """
+        blocked = any(player['group'] in message for player in self.game_manager.players)
+        cache_key = None
+        cached = None
+        local_verdict = None
+        if not blocked:
+            cache_key = self._verdict_cache_key(message, self.description)
+            cached = self.verdict_cache.get(cache_key) if cache_key is not None else None
+            if cached is None:
+                local_verdict, escalate = self._local_verdict(message, self.description)
+                if not escalate:
+                    cached = local_verdict
+            blocked = cached is False
+        if blocked:
+            self.score_tracker.misalignment_penalty(username, round)
+
+        status = None if blocked or cached is not None else "pending"
+        post = self.post_manager.add_post(message, username, round, poster_group, likes, reply_to,
+                                          is_removed=blocked, moderation_status=status)
+        self.score_tracker.record_post(post)
+        self._reply_points(reply_to, username, round, poster_group)
+
+        if status == "pending":
+            self._pending_moderation.append({
+                'post_id': post['post_id'],
+                'username': username,
+                'round': round,
+                'message': message,
+                'cache_key': cache_key,
+                'local_verdict': local_verdict,
+            })
+            if len(self._pending_moderation) >= self.moderation_batch_size:
+                self.flush_moderation()
+        return blocked
+
+    def _reply_points(self, reply_to: Optional[int], username: str, round: int, poster_group: str) -> None:
+        # Give point to the user who was replied to
         if reply_to is not None:
             replied_post = self.post_manager.get_post_by_id(reply_to)
             self.score_tracker.reply_on_post(replied_post['username'], round)
             if replied_post and replied_post['poster_group'] == poster_group:
                 # Give a point to the user as they responded to a user in their same group
                 self.score_tracker.reply_on_post(username, round)
-                
-        return ret_val
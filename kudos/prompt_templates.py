@@ -0,0 +1,225 @@
+import string
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# Characters per token assumed when enforcing max_tokens without a tokenizer.
+# Deliberately low so the estimate rarely undercounts the tokens of a real tokenizer.
+CHARS_PER_TOKEN = 3
+
+# Tokenizer measuring max_tokens budgets, set while a model is loaded in this process
+_budget_tokenizer: Optional[Any] = None
+
+
+def set_budget_tokenizer(tokenizer: Optional[Any]) -> None:
+    """Measure prompt token budgets with tokenizer, or estimate them from the text length if None.
+
+    EasyLLM sets the tokenizer of the model it loads. Prompts rendered in a
+    process without a model, e.g. with the stub, replay or model server
+    backends, are fitted with the CHARS_PER_TOKEN estimate instead, so a
+    replay only reproduces prompts truncated by a budget if the recording
+    process's tokenizer is set here too.
+    """
+    global _budget_tokenizer
+    _budget_tokenizer = tokenizer
+
+
+def get_budget_tokenizer() -> Optional[Any]:
+    """Return the tokenizer set with set_budget_tokenizer."""
+    return _budget_tokenizer
+
+
+class PromptTemplate:
+    """Prompt text with named slots whose constant parts are tokenized only once.
+
+    The template uses str.format placeholders, e.g. "Post: '{message}'". A
+    constant prefix can be given separately so it does not need brace
+    escaping. Slot values are rendered with str(), except for list slots,
+    which are rendered like the repr of a list and are truncated from the
+    front (oldest items first) when the prompt exceeds max_tokens.
+
+    The budget is enforced when rendering, so the prompt text and its token
+    ids hold the same items. With a budget tokenizer (see
+    set_budget_tokenizer) tokens are counted from cached token ids of the
+    constant segments, slot values and list items, kept in an LRU cache so
+    posts shown to many agents in a round are only tokenized once. The
+    rendered text is then tokenized once to confirm the count, and those ids
+    are the prompt's token ids. Without a tokenizer tokens are estimated
+    from the text length (CHARS_PER_TOKEN).
+    """
+
+    def __init__(self, template: str, prefix: str = "", list_slots: Sequence[str] = (),
+                 max_tokens: Optional[int] = None, value_cache_size: int = 4096) -> None:
+        """Parse the template.
+
+        Args:
+            template: Template text with {slot} placeholders
+            prefix: Constant text placed before the template, not parsed for placeholders
+            list_slots: Slots holding lists
+            max_tokens: Token budget enforced by dropping items from the first list slot
+            value_cache_size: Slot values whose token ids are cached per tokenizer
+        """
+        self.prefix = prefix
+        self.list_slots = set(list_slots)
+        self.max_tokens = max_tokens
+        self.value_cache_size = value_cache_size
+        self._segments: List[Tuple[str, Optional[str]]] = [(prefix, None)] if prefix else []
+        for literal, field_name, _, _ in string.Formatter().parse(template):
+            self._segments.append((literal, field_name))
+        self.slots = [field for _, field in self._segments if field is not None]
+        self._token_caches: "weakref.WeakKeyDictionary[Any, Dict[str, Any]]" = weakref.WeakKeyDictionary()
+
+    def render(self, **values: Any) -> "Prompt":
+        """Fill the slots and return the prompt."""
+        missing = [slot for slot in self.slots if slot not in values]
+        if missing:
+            raise KeyError(f"Missing prompt slots: {missing}")
+        return self._fit(values)
+
+    def _fit(self, values: Dict[str, Any], suffix: str = "") -> "Prompt":
+        """Return the prompt after dropping the oldest items of the first list slot until it fits max_tokens."""
+        list_slot = next((slot for slot in self.slots if slot in self.list_slots), None)
+        if self.max_tokens is None or list_slot is None:
+            return Prompt(self, values, suffix)
+        tokenizer = _budget_tokenizer
+        if tokenizer is None:
+            lengths = self._character_lengths(values, list_slot, suffix)
+            return Prompt(self, self._drop_items(values, list_slot, lengths, self.max_tokens * CHARS_PER_TOKEN), suffix)
+
+        lengths = self._token_lengths(tokenizer, values, list_slot, suffix)
+        values = self._drop_items(values, list_slot, lengths, self.max_tokens)
+        # Merges across segment boundaries can change the count slightly, so the text decides
+        while True:
+            prompt = Prompt(self, values, suffix)
+            token_ids = tokenizer(str(prompt))["input_ids"]
+            if len(token_ids) <= self.max_tokens or not values[list_slot]:
+                prompt._token_ids = (tokenizer, token_ids)
+                return prompt
+            values = {**values, list_slot: list(values[list_slot])[1:]}
+
+    @staticmethod
+    def _drop_items(values: Dict[str, Any], list_slot: str, lengths: Tuple[int, List[int], int],
+                    budget: int) -> Dict[str, Any]:
+        """Drop the oldest list items until the length fits the budget.
+
+        Only lengths are added up; the text is built once, from the kept items.
+
+        Args:
+            values: Slot values
+            list_slot: Slot whose items are dropped
+            lengths: (length of everything else, length of each item, length of a separator)
+            budget: Maximum total length
+        """
+        length, items, separator = lengths
+        length += sum(items) + separator * max(len(items) - 1, 0)
+        dropped = 0
+        while dropped < len(items) and length > budget:
+            length -= items[dropped] + (separator if dropped < len(items) - 1 else 0)
+            dropped += 1
+        if not dropped:
+            return values
+        return {**values, list_slot: list(values[list_slot])[dropped:]}
+
+    def _character_lengths(self, values: Dict[str, Any], list_slot: str, suffix: str) -> Tuple[int, List[int], int]:
+        """Count characters, for the estimate used without a tokenizer."""
+        length = len(suffix) + sum(len(literal) for literal, _ in self._segments)
+        for _, slot in self._segments:
+            if slot is not None and slot != list_slot:
+                length += len(self._render_value(slot, values[slot]))
+        # "[" and "]"
+        length += 2
+        return length, [len(repr(item)) for item in values[list_slot]], len(", ")
+
+    def _token_lengths(self, tokenizer: Any, values: Dict[str, Any], list_slot: str,
+                       suffix: str) -> Tuple[int, List[int], int]:
+        """Count tokens from the cached token ids of the segments, values and list items."""
+        cache = self._cache_for(tokenizer)
+        separators = cache["separators"]
+        length = len(cache["start"]) + sum(len(ids) for ids in cache["segments"])
+        for _, slot in self._segments:
+            if slot is not None and slot != list_slot:
+                length += len(self._value_ids(tokenizer, cache, str(values[slot])))
+        length += len(separators["["]) + len(separators["]"])
+        if suffix:
+            length += len(self._value_ids(tokenizer, cache, suffix))
+        items = [len(self._value_ids(tokenizer, cache, repr(item))) for item in values[list_slot]]
+        return length, items, len(separators[", "])
+
+    def _render_value(self, slot: str, value: Any) -> str:
+        if slot in self.list_slots:
+            return "[" + ", ".join(repr(item) for item in value) + "]"
+        return str(value)
+
+    def _text(self, values: Dict[str, Any]) -> str:
+        parts = []
+        for literal, slot in self._segments:
+            parts.append(literal)
+            if slot is not None:
+                parts.append(self._render_value(slot, values[slot]))
+        return "".join(parts)
+
+    def _cache_for(self, tokenizer: Any) -> Dict[str, Any]:
+        cache = self._token_caches.get(tokenizer)
+        if cache is None:
+            cache = {
+                "start": tokenizer("")["input_ids"],
+                "segments": [self._encode(tokenizer, literal) for literal, _ in self._segments],
+                "separators": {text: self._encode(tokenizer, text) for text in ("[", ", ", "]")},
+                "values": OrderedDict(),
+            }
+            self._token_caches[tokenizer] = cache
+        return cache
+
+    @staticmethod
+    def _encode(tokenizer: Any, text: str) -> List[int]:
+        return tokenizer.encode(text, add_special_tokens=False) if text else []
+
+    def _value_ids(self, tokenizer: Any, cache: Dict[str, Any], text: str) -> List[int]:
+        values = cache["values"]
+        ids = values.get(text)
+        if ids is None:
+            ids = self._encode(tokenizer, text)
+            values[text] = ids
+            if len(values) > self.value_cache_size:
+                values.popitem(last=False)
+        else:
+            values.move_to_end(text)
+        return ids
+
+
+class Prompt(str):
+    """Filled PromptTemplate.
+
+    Behaves as the prompt text, so backends without a tokenizer use it
+    unchanged. values holds the slot values after truncation. The token ids
+    are those of tokenizing the text, computed once per tokenizer and reused
+    from the budget check when it used the same tokenizer.
+    """
+
+    def __new__(cls, template: PromptTemplate, values: Dict[str, Any], suffix: str = "") -> "Prompt":
+        prompt = super().__new__(cls, template._text(values) + suffix)
+        prompt.template = template
+        prompt.values = values
+        prompt.suffix = suffix
+        prompt._token_ids = None
+        return prompt
+
+    def __add__(self, other: str) -> "Prompt":
+        return self.template._fit(self.values, self.suffix + other)
+
+    def __reduce__(self) -> Tuple[Any, Tuple[str]]:
+        # Templates hold per-tokenizer caches, so prompts cross processes as plain text
+        return (str, (str(self),))
+
+    def token_ids(self, tokenizer: Any) -> List[int]:
+        """Return the token ids of this prompt for tokenizer."""
+        if self._token_ids is None or self._token_ids[0] is not tokenizer:
+            self._token_ids = (tokenizer, tokenizer(str(self))["input_ids"])
+        return list(self._token_ids[1])
+
+
+def encode_prompt(tokenizer: Any, prompt: str) -> List[int]:
+    """Return the token ids of a prompt, reusing those computed for a Prompt's budget check."""
+    if isinstance(prompt, Prompt):
+        return prompt.token_ids(tokenizer)
+    return tokenizer(prompt)["input_ids"]
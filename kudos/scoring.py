@@ -1,25 +1,68 @@
-import networkx as nx
-from .misc import create_graph_and_get_centrality
-from typing import List, Dict, Any
+import numpy as np
+from types import MappingProxyType
+from .misc import get_mentions
+from .interaction_graph import InteractionGraph
+from . import instrumentation
+from typing import List, Dict, Any, Mapping, Optional, Tuple
 
 class UserScoreTracker:
-    def __init__(self) -> None:
-        self.scores = {}
+    """Tracks per-round user scores in a growable users x rounds matrix.
+
+    Row i holds the scores of the i-th added user and column r the points of
+    round r. A parallel boolean matrix records which (user, round) cells have
+    been touched so get_scores can reproduce the sparse dict-of-dicts view.
+    """
+
+    def __init__(self, initial_users: int = 64, initial_rounds: int = 16) -> None:
+        self._users: List[str] = []
+        self._index: Dict[str, int] = {}
+        self._matrix = np.zeros((initial_users, initial_rounds), dtype=np.int64)
+        self._touched = np.zeros((initial_users, initial_rounds), dtype=bool)
+        self._initialized_rounds: Dict[int, int] = {}
+        self._graphs: Dict[Any, InteractionGraph] = {}
+        self._post_authors: Dict[int, Tuple[str, Any]] = {}
+        self._post_mentions: Dict[int, List[str]] = {}
+
+    @property
+    def scores(self) -> Mapping[str, Mapping[int, int]]:
+        """Read-only dict-of-dicts snapshot of the scores, kept for compatibility.
+
+        Assigning into it raises TypeError; change scores with add_points.
+        """
+        return MappingProxyType({user: MappingProxyType(rounds) for user, rounds in self.get_scores().items()})
+
+    @property
+    def users(self) -> List[str]:
+        """Usernames in row order."""
+        return list(self._users)
+
+    def _ensure_capacity(self, users: int, rounds: int) -> None:
+        rows, cols = self._matrix.shape
+        if users <= rows and rounds <= cols:
+            return
+        new_shape = (max(rows, users, rows * 2) if users > rows else rows,
+                     max(cols, rounds, cols * 2) if rounds > cols else cols)
+        matrix = np.zeros(new_shape, dtype=self._matrix.dtype)
+        touched = np.zeros(new_shape, dtype=bool)
+        matrix[:rows, :cols] = self._matrix
+        touched[:rows, :cols] = self._touched
+        self._matrix, self._touched = matrix, touched
 
     def add_user(self, user_id: str) -> None:
         """Initialize user scores with 0 for current round."""
-        if user_id not in self.scores:
-            self.scores[user_id] = {}
+        if user_id not in self._index:
+            self._ensure_capacity(len(self._users) + 1, 0)
+            self._index[user_id] = len(self._users)
+            self._users.append(user_id)
 
     def add_points(self, user_id: str, points: int, round: int) -> None:
-        if round not in self.scores[user_id]:
-            self.scores[user_id][round] = 0
-        self.scores[user_id][round] += points
+        row = self._index[user_id]
+        self._ensure_capacity(0, round + 1)
+        self._matrix[row, round] += points
+        self._touched[row, round] = True
 
     def subtract_points(self, user_id: str, points: int, round: int) -> None:
-        if round not in self.scores[user_id]:
-            self.scores[user_id][round] = 0
-        self.scores[user_id][round] -= points
+        self.add_points(user_id, -points, round)
 
     def like_on_post(self, username: str, round: int) -> None:
         self.add_points(username, 1, round)
@@ -33,10 +76,52 @@ class UserScoreTracker:
     def dominant_network_slant(self, username: str, round: int) -> None:
         self.add_points(username, 3, round)
 
+    def interaction_graph(self, round: Any) -> InteractionGraph:
+        """Return the interaction graph of a round, creating it if needed."""
+        if round not in self._graphs:
+            self._graphs[round] = InteractionGraph()
+        return self._graphs[round]
+
+    def record_post(self, post: Dict[str, Any]) -> None:
+        """Add a stored post's reply and mention interactions to its round's graph.
+
+        Replies only count when the replied post is from the same round, as in
+        misc.create_graph_and_get_centrality.
+        """
+        if post['post_id'] in self._post_authors:
+            return
+        graph = self.interaction_graph(post['round'])
+        self._post_authors[post['post_id']] = (post['username'], post['round'])
+        graph.add_node(post['username'])
+        replied = self._post_authors.get(post['reply_to']) if post['reply_to'] else None
+        if replied is not None and replied[1] == post['round']:
+            graph.add_edge(post['username'], replied[0])
+        mentions = get_mentions(post)
+        for mention in mentions:
+            graph.add_edge(post['username'], mention)
+        if mentions:
+            self._post_mentions[post['post_id']] = mentions
+
+    def record_post_removed(self, post_id: int) -> None:
+        """Withdraw the mentions of a post whose message was removed."""
+        if post_id not in self._post_authors:
+            return
+        username, round = self._post_authors[post_id]
+        graph = self.interaction_graph(round)
+        for mention in self._post_mentions.pop(post_id, []):
+            graph.remove_edge(username, mention)
+
     def centrality_points(self, posts: List[Dict[str, Any]], round: int) -> None:
-        """Add points for top 5% of users by centrality."""
-        centrality = create_graph_and_get_centrality(posts)
-        top_5_percent = sorted(centrality, key=centrality.get, reverse=True)[:max(1, len(centrality) // 20)]
+        """Add points for top 5% of users by centrality.
+
+        Uses the round's incrementally maintained interaction graph; posts not
+        seen through record_post yet are added first.
+        """
+        with instrumentation.span("centrality"):
+            for post in posts:
+                self.record_post(post)
+            graph = self.interaction_graph(round)
+            top_5_percent = graph.top(max(1, len(graph) // 20)) if len(graph) else []
         for user in top_5_percent:
             self.add_user(user)
             self.add_points(user, 2, round)
@@ -46,9 +131,118 @@ class UserScoreTracker:
 
     def get_scores(self) -> Dict[str, Dict[int, int]]:
         """Get the current scores of all users."""
-        return self.scores
+        count = len(self._users)
+        touched = self._touched[:count]
+        return {
+            user: {int(r): int(self._matrix[row, r]) for r in np.flatnonzero(touched[row])}
+            for row, user in enumerate(self._users)
+        }
+
+    def get_state(self) -> Dict[str, Any]:
+        """Return a JSON-serializable snapshot of the scores.
+
+        Interaction graphs are not included; rebuild them with record_post.
+        """
+        count = len(self._users)
+        return {
+            'users': list(self._users),
+            'matrix': self._matrix[:count].tolist(),
+            'touched': self._touched[:count].astype(np.uint8).tolist(),
+            'initialized_rounds': [[round, users] for round, users in self._initialized_rounds.items()],
+        }
+
+    def load_state(self, state: Dict[str, Any]) -> None:
+        """Replace all scores with a snapshot from get_state and clear the interaction graphs."""
+        users = state['users']
+        rounds = len(state['matrix'][0]) if users else self._matrix.shape[1]
+        self._users = list(users)
+        self._index = {user: row for row, user in enumerate(users)}
+        self._matrix = np.zeros((max(len(users), 1), max(rounds, 1)), dtype=np.int64)
+        self._touched = np.zeros(self._matrix.shape, dtype=bool)
+        if users:
+            self._matrix[:len(users), :rounds] = state['matrix']
+            self._touched[:len(users), :rounds] = np.array(state['touched'], dtype=bool)
+        self._initialized_rounds = {round: count for round, count in state['initialized_rounds']}
+        self._graphs = {}
+        self._post_authors = {}
+        self._post_mentions = {}
 
     def initialize_round_scores(self, round: int) -> None:
-        for user_id in self.scores:
-            if round not in self.scores[user_id]:
-                self.scores[user_id][round] = 0
\ No newline at end of file
+        """Mark a round as started for all current users.
+
+        Cheap to call repeatedly: only users added since the last call for
+        this round are touched.
+        """
+        count = len(self._users)
+        done = self._initialized_rounds.get(round, 0)
+        if done == count:
+            return
+        self._ensure_capacity(0, round + 1)
+        self._touched[done:count, round] = True
+        self._initialized_rounds[round] = count
+
+    def get_score(self, user_id: str, round: int) -> int:
+        """Return one user's score for a round, 0 if unknown."""
+        row = self._index.get(user_id)
+        if row is None or round >= self._matrix.shape[1]:
+            return 0
+        return int(self._matrix[row, round])
+
+    def round_vector(self, round: int) -> np.ndarray:
+        """Return the scores of all users for a round, in row order."""
+        if round >= self._matrix.shape[1]:
+            return np.zeros(len(self._users), dtype=self._matrix.dtype)
+        return self._matrix[:len(self._users), round].copy()
+
+    def round_scores(self, round: int) -> Dict[str, int]:
+        """Return {username: score} for a round."""
+        return dict(zip(self._users, self.round_vector(round).tolist()))
+
+    def cumulative_vector(self, up_to_round: Optional[int] = None) -> np.ndarray:
+        """Return each user's total score over all rounds up to and including up_to_round."""
+        columns = self._matrix.shape[1] if up_to_round is None else up_to_round + 1
+        return self._matrix[:len(self._users), :columns].sum(axis=1)
+
+    def cumulative_scores(self, up_to_round: Optional[int] = None) -> Dict[str, int]:
+        """Return {username: total score} over all rounds up to and including up_to_round."""
+        return dict(zip(self._users, self.cumulative_vector(up_to_round).tolist()))
+
+    def group_scores(self, user_groups: Dict[str, str], round: Optional[int] = None) -> Dict[str, int]:
+        """Sum scores per group.
+
+        Args:
+            user_groups: Mapping of username to group name
+            round: Round to sum, or None for totals over all rounds
+
+        Returns:
+            Mapping of group name to summed score
+        """
+        values = self.cumulative_vector() if round is None else self.round_vector(round)
+        group_names = sorted(set(user_groups.values()))
+        group_ids = {group: i for i, group in enumerate(group_names)}
+        rows = np.array([self._index[user] for user in user_groups if user in self._index], dtype=np.int64)
+        ids = np.array([group_ids[user_groups[user]] for user in user_groups if user in self._index], dtype=np.int64)
+        totals = np.zeros(len(group_names), dtype=values.dtype)
+        if len(rows):
+            np.add.at(totals, ids, values[rows])
+        return dict(zip(group_names, totals.tolist()))
+
+    def leaderboard(self, k: Optional[int] = None, round: Optional[int] = None) -> List[Tuple[str, int]]:
+        """Return the top-k users by score, highest first.
+
+        Args:
+            k: Number of users to return, all if None
+            round: Round to rank by, or None to rank by total score
+
+        Returns:
+            List of (username, score) pairs; ties keep the order users were added in
+        """
+        values = self.cumulative_vector() if round is None else self.round_vector(round)
+        if k is None or k >= len(values):
+            candidates = np.arange(len(values))
+        else:
+            candidates = np.argpartition(-values, k - 1)[:k] if k > 0 else np.arange(0)
+            # Include every user tied with the k-th score before the stable sort
+            candidates = np.flatnonzero(values >= values[candidates].min()) if k > 0 else candidates
+        order = candidates[np.lexsort((candidates, -values[candidates]))][:k]
+        return [(self._users[i], int(values[i])) for i in order]
\ No newline at end of file
@@ -0,0 +1,94 @@
+import heapq
+import itertools
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class VirtualClock:
+    """Simulated time of a simulation.
+
+    The clock only moves when it is advanced, so simulated delays between
+    actions cost no wall-clock time.
+    """
+
+    def __init__(self, start: Optional[datetime] = None) -> None:
+        """Initialize the clock.
+
+        Args:
+            start: Simulated time at elapsed 0, the current time if None
+        """
+        self.start = start or datetime.now()
+        self.elapsed = 0.0
+
+    def now(self) -> datetime:
+        """Return the current simulated time."""
+        return self.start + timedelta(seconds=self.elapsed)
+
+    def advance_to(self, elapsed: float) -> None:
+        """Move the clock to elapsed seconds after its start.
+
+        Raises:
+            ValueError: If elapsed lies before the current time
+        """
+        if elapsed < self.elapsed:
+            raise ValueError(f"Cannot move the clock back from {self.elapsed} to {elapsed}")
+        self.elapsed = elapsed
+
+    def advance(self, seconds: float) -> None:
+        """Move the clock forward by seconds."""
+        self.advance_to(self.elapsed + seconds)
+
+    def get_state(self) -> Dict[str, Any]:
+        """Return the clock state for a checkpoint."""
+        return {'start': self.start.isoformat(), 'elapsed': self.elapsed}
+
+    def load_state(self, state: Dict[str, Any]) -> None:
+        """Restore a state returned by get_state."""
+        self.start = datetime.fromisoformat(state['start'])
+        self.elapsed = state['elapsed']
+
+
+class EventScheduler:
+    """Discrete-event queue processing events in the order of their simulated time.
+
+    Events scheduled for the same time are processed in the order they were
+    scheduled. Popping an event advances the clock to its time; with
+    real_time the scheduler also sleeps for the simulated gap, which paces a
+    simulation like live users.
+    """
+
+    def __init__(self, clock: VirtualClock, real_time: bool = False) -> None:
+        """Initialize the scheduler.
+
+        Args:
+            clock: Clock advanced as events are processed
+            real_time: Wait the simulated time between events in wall-clock time
+        """
+        self.clock = clock
+        self.real_time = real_time
+        self._events: List[Tuple[float, int, Any]] = []
+        self._sequence = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def schedule_at(self, elapsed: float, event: Any) -> None:
+        """Schedule event at elapsed seconds after the clock's start."""
+        heapq.heappush(self._events, (elapsed, next(self._sequence), event))
+
+    def schedule(self, delay: float, event: Any) -> None:
+        """Schedule event delay seconds after the current simulated time."""
+        self.schedule_at(self.clock.elapsed + delay, event)
+
+    def pop(self) -> Any:
+        """Advance the clock to the earliest event and return it.
+
+        Raises:
+            IndexError: If no event is scheduled
+        """
+        elapsed, _, event = heapq.heappop(self._events)
+        if self.real_time and elapsed > self.clock.elapsed:
+            time.sleep(elapsed - self.clock.elapsed)
+        self.clock.advance_to(max(elapsed, self.clock.elapsed))
+        return event
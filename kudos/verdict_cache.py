@@ -0,0 +1,131 @@
+import hashlib
+import json
+import os
+import time
+from typing import Any, Dict, Optional
+from filelock import FileLock
+from .fileutil import atomic_write
+
+
+class VerdictCache:
+    """Persistent, content-addressed cache of LLM moderation verdicts.
+
+    Each verdict is stored in its own small JSON file named after the SHA-256
+    of everything that determines the verdict (message, network description,
+    model and prompt version). Files are written to a temporary name and
+    renamed into place, so several simulator processes can share one cache
+    directory without locking on the read or write path. A file's mtime is
+    refreshed on every hit and the least recently used entries are removed
+    once the cache grows past max_entries.
+    """
+
+    def __init__(self, cache_dir: str = ".kudos_cache/verdicts", max_entries: int = 100000,
+                 eviction_check_interval: int = 256) -> None:
+        """Initialize the cache directory.
+
+        Args:
+            cache_dir: Directory holding the cached verdicts
+            max_entries: Maximum number of verdicts kept on disk
+            eviction_check_interval: Number of writes between size checks
+        """
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.eviction_check_interval = eviction_check_interval
+        self._writes_since_check = 0
+        self._stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(message: str, description: str, model: str, prompt_version: Any) -> str:
+        """Build the content hash identifying a verdict.
+
+        Args:
+            message: The post message that was judged
+            description: The network description it was judged against
+            model: Name of the model producing the verdict
+            prompt_version: Version of the moderation prompt
+
+        Returns:
+            Hex digest used as cache key
+        """
+        payload = json.dumps([str(prompt_version), model, description, message], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[bool]:
+        """Look up a cached verdict.
+
+        Args:
+            key: Key built with make_key
+
+        Returns:
+            The cached verdict, or None on a miss
+        """
+        path = self._path(key)
+        try:
+            with open(path, "r") as file:
+                verdict = json.load(file)["verdict"]
+            os.utime(path)
+        except (OSError, ValueError, KeyError):
+            self._stats["misses"] += 1
+            return None
+        self._stats["hits"] += 1
+        return verdict
+
+    def put(self, key: str, verdict: bool, **metadata: Any) -> None:
+        """Store a verdict atomically.
+
+        Args:
+            key: Key built with make_key
+            verdict: Whether the post aligns with the description
+            **metadata: Extra JSON-serializable fields kept alongside the verdict
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with atomic_write(path) as file:
+            json.dump({"verdict": verdict, "created": time.time(), **metadata}, file)
+        self._stats["writes"] += 1
+
+        self._writes_since_check += 1
+        if self._writes_since_check >= self.eviction_check_interval:
+            self._writes_since_check = 0
+            self.evict()
+
+    def evict(self) -> int:
+        """Remove least recently used verdicts beyond max_entries.
+
+        Returns:
+            Number of verdicts removed
+        """
+        with FileLock(os.path.join(self.cache_dir, ".evict.lock")):
+            entries = []
+            for shard in os.scandir(self.cache_dir):
+                if not shard.is_dir():
+                    continue
+                for entry in os.scandir(shard.path):
+                    if not entry.name.endswith(".json"):
+                        continue
+                    try:
+                        entries.append((entry.stat().st_mtime, entry.path))
+                    except FileNotFoundError:
+                        continue
+            excess = len(entries) - self.max_entries
+            if excess <= 0:
+                return 0
+            entries.sort()
+            removed = 0
+            for _, path in entries[:excess]:
+                try:
+                    os.remove(path)
+                    removed += 1
+                except FileNotFoundError:
+                    continue
+        self._stats["evictions"] += removed
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit, miss, write and eviction counters for this process."""
+        lookups = self._stats["hits"] + self._stats["misses"]
+        return {**self._stats, "hit_rate": self._stats["hits"] / lookups if lookups else 0.0}
@@ -1,5 +1,7 @@
+import os
 from kudos.game_simulator import GameSimulator
 from kudos.game_rules import game_rules
+from kudos import llm_wrapper
 
 # Use the same network setup as test_game.py
 social_network_groups = {
@@ -62,13 +64,22 @@ social_network_groups = {
 
 social_network_biography = "The year is 2025. Social Network Z, a Twitter clone, has grown to host a diverse range of users. While the platform primarily consists of casual members sharing everyday content, it also attracts a smaller yet vocal minority of far-right extremists and conspiracy theorists. Originally envisioned as a digital 'Town Square' for free expression, the platform's reduced moderation staff has led to increased visibility of extreme content. This shift has transformed Social Network Z into a battleground for ideological expression, where the boundaries between free speech and harmful rhetoric are frequently tested."
 
-# Create and run simulation
-simulator = GameSimulator(
-    network_groups=social_network_groups,
-    network_biography=social_network_biography,
-    game_rules=game_rules,
-    num_ai_players=12
-)
+# Load the model once up front; it stays resident for every action in the run
+llm_wrapper.warm_up()
+
+# Continue an interrupted run from its checkpoint, otherwise start a new one
+checkpoint_path = "simulation_checkpoint.json"
+if os.path.exists(checkpoint_path):
+    print(f"Resuming from {checkpoint_path}")
+    simulator = GameSimulator.resume(checkpoint_path)
+else:
+    simulator = GameSimulator(
+        network_groups=social_network_groups,
+        network_biography=social_network_biography,
+        game_rules=game_rules,
+        num_ai_players=12,
+        checkpoint_path=checkpoint_path
+    )
 
 results = simulator.run_simulation(
     num_rounds=7,
@@ -77,5 +88,10 @@ results = simulator.run_simulation(
     pause_between_rounds=False
 )
 
+os.remove(checkpoint_path)
+
 print("\nSimulation Complete!")
 print("Final Results:", results)
+print("Model registry:", llm_wrapper.registry_stats())
+
+llm_wrapper.shutdown()
@@ -1,8 +1,10 @@
-import time
-import random
-from game import EasyLLM
-
-from game import PostManager, UserScoreTracker, PostingInterface, GameManager
+import sys
+from kudos import llm_wrapper
+from kudos.llm_backends import StubBackend
+from kudos.post_manager import PostManager
+from kudos.scoring import UserScoreTracker
+from kudos.posting_interface import PostingInterface
+from kudos.game_manager import GameManager
 
 post_manager = PostManager('posts.json')
 score_tracker = UserScoreTracker()
@@ -10,6 +12,10 @@ score_tracker = UserScoreTracker()
 social_network_groups = {"Casual users": "Regular social media users sharing daily content, messaging, posts and general and generic information.", "Far-right extremists": "Users with extreme political views.", "Conspiracy theorists": "Users who believe in conspiracy theories.","Political activists": "Users who are politically active."}
 social_network_biography = f"Social Network Z, a Twitter clone that hosts a large proportion of casual members as well as a smaller proportion of far-right extremists. The network started as a catch-all ‘Town Square,’ but after cuts were made to its moderation staff, it has become a haven for excessive amounts of extreme content masquerading as members’ demonstration of their right to free speech. There are several groups of legitimate users of this network that each post a broad range of content. These user groups include: {str(social_network_groups)}."
 
+# Pass --stub to run without a model
+if "--stub" in sys.argv:
+    llm_wrapper.set_backend(StubBackend(field_choices={'dominant_group': list(social_network_groups)}))
+
 game_manager = GameManager(post_manager, score_tracker, None, social_network_groups)
 posting_interface = PostingInterface(post_manager, social_network_biography, game_manager, score_tracker)
 game_manager.posting_interface = posting_interface
@@ -0,0 +1,21 @@
+from typing import Callable, Dict
+
+import pytest
+
+from kudos.llm_backends import StubBackend
+
+GROUPS = {'A': 'group a', 'B': 'group b', 'C': 'group c'}
+
+
+@pytest.fixture
+def network_groups() -> Dict[str, str]:
+    """Return the groups of the small test network."""
+    return dict(GROUPS)
+
+
+@pytest.fixture
+def make_backend() -> Callable[..., StubBackend]:
+    """Return a factory for deterministic stub backends answering with the test network's groups."""
+    def make(seed: int = 1) -> StubBackend:
+        return StubBackend(seed=seed, field_choices={'dominant_group': list(GROUPS)})
+    return make
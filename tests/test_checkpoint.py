@@ -0,0 +1,88 @@
+import json
+from datetime import datetime
+
+import pytest
+
+from kudos.game_rules import game_rules
+from kudos.game_simulator import CHECKPOINT_VERSION, GameSimulator
+
+NUM_ROUNDS = 3
+
+
+def new_simulator(posts_file, network_groups, backend, **options):
+    return GameSimulator(network_groups, 'A small test network.', game_rules, num_ai_players=5,
+                         posts_file=str(posts_file), backend=backend, seed=3, start_time=datetime(2025, 3, 1),
+                         **options)
+
+
+def posts(simulator):
+    return sorted(simulator.post_manager.get_all_posts(), key=lambda post: post['post_id'])
+
+
+def run(simulator, max_concurrency=1):
+    return simulator.run_simulation(num_rounds=NUM_ROUNDS, pause_between_rounds=False,
+                                    max_concurrency=max_concurrency)
+
+
+def interrupt_after(simulator, actions):
+    """Make the simulator raise KeyboardInterrupt instead of applying its action number actions + 1."""
+    apply_action = simulator.round_runner._apply_action
+    applied = [0]
+
+    def interrupted(*args):
+        if applied[0] == actions:
+            raise KeyboardInterrupt
+        applied[0] += 1
+        return apply_action(*args)
+
+    simulator.round_runner._apply_action = interrupted
+
+
+@pytest.mark.parametrize('engine', ['posts.json', 'posts.jsonl', 'posts.db'])
+@pytest.mark.parametrize('checkpoint_every', [0, 4])
+@pytest.mark.parametrize('deferred_moderation', [False, True])
+@pytest.mark.parametrize('max_concurrency', [1, 3])
+def test_resume_matches_uninterrupted_run(tmp_path, network_groups, make_backend, engine, checkpoint_every,
+                                          deferred_moderation, max_concurrency):
+    options = {'deferred_moderation': deferred_moderation, 'moderation_batch_size': 4}
+    (tmp_path / 'reference').mkdir()
+    reference = new_simulator(tmp_path / 'reference' / engine, network_groups, make_backend(), **options)
+    expected = run(reference, max_concurrency)
+
+    # Interrupt in the first round, mid-round and right after a round boundary
+    for actions in (2, 20, 15):
+        run_dir = tmp_path / f'interrupted_{actions}'
+        run_dir.mkdir()
+        checkpoint = run_dir / 'checkpoint.json'
+        simulator = new_simulator(run_dir / engine, network_groups, make_backend(), checkpoint_path=str(checkpoint),
+                                  checkpoint_every=checkpoint_every, **options)
+        interrupt_after(simulator, actions)
+        with pytest.raises(KeyboardInterrupt):
+            run(simulator, max_concurrency)
+
+        resumed = GameSimulator.resume(str(checkpoint), backend=make_backend())
+        assert run(resumed, max_concurrency) == expected
+        assert posts(resumed) == posts(reference)
+
+
+def test_unsupported_checkpoint_version_is_rejected(tmp_path, network_groups, make_backend):
+    checkpoint = tmp_path / 'checkpoint.json'
+    simulator = new_simulator(tmp_path / 'posts.json', network_groups, make_backend(), checkpoint_path=str(checkpoint))
+    run(simulator)
+    state = json.loads(checkpoint.read_text())
+    assert state['version'] == CHECKPOINT_VERSION
+    state['version'] = CHECKPOINT_VERSION + 1
+    checkpoint.write_text(json.dumps(state))
+    with pytest.raises(ValueError):
+        GameSimulator.resume(str(checkpoint), backend=make_backend())
+
+
+def test_resumed_finished_run_repeats_nothing(tmp_path, network_groups, make_backend):
+    checkpoint = tmp_path / 'checkpoint.json'
+    simulator = new_simulator(tmp_path / 'posts.jsonl', network_groups, make_backend(), checkpoint_path=str(checkpoint))
+    expected = run(simulator)
+    expected_posts = posts(simulator)
+
+    resumed = GameSimulator.resume(str(checkpoint), backend=make_backend())
+    assert run(resumed) == expected
+    assert posts(resumed) == expected_posts
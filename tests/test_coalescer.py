@@ -0,0 +1,119 @@
+import threading
+import time
+
+import pytest
+
+from kudos import llm_wrapper
+from kudos.llm_backends import StubBackend
+from kudos.llm_wrapper import RequestCoalescer
+
+SCHEMA = {"type": "object", "properties": {"message": {"type": "string"}, "ok": {"type": "boolean"}}}
+
+
+class CallLoggingBackend(StubBackend):
+    """Stub backend recording each call as (method, number of questions, llm_name, prefix)."""
+
+    def __init__(self, fail_questions=()):
+        super().__init__(seed=1)
+        self.calls = []
+        self.fail_questions = set(fail_questions)
+
+    def ask(self, question, schema, max_new_tokens=500, llm_name=None, prefix=None):
+        self.calls.append(('ask', 1, llm_name, prefix))
+        return super().ask(question, schema, max_new_tokens, llm_name, prefix)
+
+    def ask_batch(self, questions, schemas, max_new_tokens=500, llm_name=None, prefix=None):
+        self.calls.append(('ask_batch', len(questions), llm_name, prefix))
+        answers = super().ask_batch(questions, schemas, max_new_tokens, llm_name, prefix)
+        return [None if question in self.fail_questions else answer for question, answer in zip(questions, answers)]
+
+
+@pytest.fixture
+def coalesce():
+    coalescers = []
+
+    def make(backend, **options):
+        coalescer = RequestCoalescer(backend, **options)
+        coalescers.append(coalescer)
+        return coalescer
+    yield make
+    for coalescer in coalescers:
+        coalescer.close()
+
+
+def test_questions_arriving_together_share_a_batch(coalesce):
+    backend = CallLoggingBackend()
+    coalescer = coalesce(backend, max_batch_size=4, max_wait=0.2)
+    futures = [coalescer.submit(f"question {index}", SCHEMA, prefix="shared") for index in range(10)]
+
+    reference = StubBackend(seed=1)
+    assert [future.result() for future in futures] == [reference.ask(f"question {index}", SCHEMA)
+                                                       for index in range(10)]
+    assert backend.calls == [('ask_batch', 4, None, "shared"), ('ask_batch', 4, None, "shared"),
+                             ('ask_batch', 2, None, "shared")]
+    assert coalescer.stats() == {'batches': 3, 'questions': 10, 'mean_batch_size': 10 / 3}
+
+
+def test_lone_question_is_flushed_after_max_wait(coalesce):
+    backend = CallLoggingBackend()
+    coalescer = coalesce(backend, max_batch_size=8, max_wait=0.1)
+    started = time.perf_counter()
+    assert coalescer.submit("question", SCHEMA).result(timeout=5) is not None
+    assert 0.1 <= time.perf_counter() - started < 2
+    assert backend.calls == [('ask', 1, None, None)]
+
+
+def test_batches_are_split_by_model_and_prefix(coalesce):
+    backend = CallLoggingBackend()
+    coalescer = coalesce(backend, max_batch_size=8, max_wait=0.2)
+    futures = [coalescer.submit("a", SCHEMA, llm_name="one", prefix="x"),
+               coalescer.submit("b", SCHEMA, llm_name="two", prefix="x"),
+               coalescer.submit("c", SCHEMA, llm_name="one", prefix="y"),
+               coalescer.submit("d", SCHEMA, llm_name="two", prefix="x")]
+    for future in futures:
+        future.result()
+    # Mixed prefixes are batched without one
+    assert sorted(backend.calls) == [('ask_batch', 2, "one", None), ('ask_batch', 2, "two", "x")]
+
+
+def test_failures_reach_only_their_callers(coalesce):
+    backend = CallLoggingBackend(fail_questions={"bad"})
+    coalescer = coalesce(backend, max_batch_size=8, max_wait=0.2)
+    good, bad = coalescer.submit("good", SCHEMA), coalescer.submit("bad", SCHEMA)
+    assert good.result() is not None
+    with pytest.raises(RuntimeError):
+        bad.result()
+
+
+def test_cancelled_questions_are_not_asked(coalesce):
+    backend = CallLoggingBackend()
+    coalescer = coalesce(backend, max_batch_size=8, max_wait=0.2)
+    futures = [coalescer.submit(f"question {index}", SCHEMA) for index in range(3)]
+    futures[1].cancel()
+    assert futures[0].result() is not None and futures[2].result() is not None
+    assert backend.calls == [('ask_batch', 2, None, None)]
+
+
+def test_enabled_coalescing_batches_concurrent_ask_question_calls():
+    backend = CallLoggingBackend()
+    llm_wrapper.enable_coalescing(max_batch_size=8, max_wait=0.2)
+    try:
+        answers = {}
+
+        def ask(index):
+            answers[index] = llm_wrapper.ask_question(f"question {index}", SCHEMA, backend=backend)
+
+        threads = [threading.Thread(target=ask, args=(index,)) for index in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats = llm_wrapper.coalescing_stats()
+    finally:
+        llm_wrapper.disable_coalescing()
+
+    reference = StubBackend(seed=1)
+    assert answers == {index: reference.ask(f"question {index}", SCHEMA) for index in range(6)}
+    assert backend.calls == [('ask_batch', 6, None, None)]
+    assert list(stats.values()) == [{'batches': 1, 'questions': 6, 'mean_batch_size': 6.0}]
+    assert llm_wrapper.coalescer_for(backend) is None
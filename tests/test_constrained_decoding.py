@@ -0,0 +1,209 @@
+import json
+
+import pytest
+
+torch = pytest.importorskip('torch')
+transformers = pytest.importorskip('transformers')
+tokenizers = pytest.importorskip('tokenizers')
+
+from kudos.ai_agent import AGENT_ACTION_SCHEMA
+from kudos.constrained_decoding import JsonSchemaDecoder
+
+SCHEMAS = [
+    AGENT_ACTION_SCHEMA,
+    {
+        "type": "object",
+        "properties": {
+            "aligned": {"type": "boolean"},
+            "confidence": {"type": "number"},
+            "severity": {"type": ["integer", "null"]},
+            "flagged": {"type": ["boolean", "null"]},
+            "category": {"enum": ["spam", "harassment", "misinformation", None, 3]},
+            "details": {
+                "type": "object",
+                "properties": {"reason": {"type": "string"}, "score": {"type": ["number", "null"]}},
+            },
+            "nothing": {"type": "null"},
+        },
+    },
+]
+
+CORPUS = [
+    '{"action_type": "post", "post_id": 12, "message": "hello there"}',
+    '{"aligned": true, "confidence": 0.75, "severity": null, "category": "spam"}',
+    "Decide what to do next. Answer with JSON only, 0123456789 . , } { \" true false null",
+]
+
+
+@pytest.fixture(scope='module')
+def decoder():
+    """A decoder over a tiny random model, whose samples are arbitrary but must stay valid."""
+    tokenizer = tokenizers.Tokenizer(tokenizers.models.BPE())
+    tokenizer.pre_tokenizer = tokenizers.pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tokenizer.decoder = tokenizers.decoders.ByteLevel()
+    tokenizer.train_from_iterator(CORPUS * 20, tokenizers.trainers.BpeTrainer(
+        vocab_size=400, special_tokens=["<|endoftext|>"],
+        initial_alphabet=tokenizers.pre_tokenizers.ByteLevel.alphabet()))
+    tokenizer = transformers.PreTrainedTokenizerFast(tokenizer_object=tokenizer, eos_token="<|endoftext|>")
+    torch.manual_seed(0)
+    config = transformers.GPT2Config(vocab_size=len(tokenizer), n_positions=512, n_embd=32, n_layer=2, n_head=2)
+    model = transformers.GPT2LMHeadModel(config).eval()
+    return JsonSchemaDecoder(model, tokenizer, "cpu")
+
+
+def validate(value, schema, path="$"):
+    """Assert value matches the schema subset JsonSchemaDecoder supports."""
+    if "enum" in schema:
+        assert value in schema["enum"], path
+        return
+    types = schema.get("type", "string")
+    types = types if isinstance(types, list) else [types]
+    checks = {
+        "object": lambda v: isinstance(v, dict),
+        "string": lambda v: isinstance(v, str),
+        "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+        "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+        "boolean": lambda v: isinstance(v, bool),
+        "null": lambda v: v is None,
+    }
+    assert any(checks[value_type](value) for value_type in types), f"{path}: {value!r} is not {types}"
+    if isinstance(value, dict):
+        assert set(schema.get("required", [])) <= set(value), path
+        assert set(value) <= set(schema.get("properties", {})), path
+        for key, sub_schema in schema.get("properties", {}).items():
+            if key in value:
+                validate(value[key], sub_schema, f"{path}.{key}")
+
+
+@pytest.mark.parametrize('schema', SCHEMAS, ids=['agent_action', 'mixed'])
+@pytest.mark.parametrize('temperature', [0.7, 1.5])
+def test_decoder_output_matches_schema(decoder, schema, temperature):
+    input_ids = decoder.tokenizer("Decide what to do next. Answer with JSON only.", return_tensors="pt").input_ids
+    for seed in range(10):
+        torch.manual_seed(seed)
+        value = decoder.generate(input_ids, schema, temperature=temperature, max_string_tokens=6, max_number_tokens=4)
+        validate(value, schema)
+        assert json.loads(json.dumps(value)) == value
+
+
+def test_decoder_output_matches_schema_with_kv_cache(decoder):
+    prompt = decoder.tokenizer("Decide what to do next.", return_tensors="pt").input_ids
+    with torch.no_grad():
+        past = decoder.model(prompt, use_cache=True).past_key_values
+    input_ids = decoder.tokenizer("Decide what to do next. Answer with JSON only.", return_tensors="pt").input_ids
+    torch.manual_seed(0)
+    validate(decoder.generate(input_ids, AGENT_ACTION_SCHEMA, past_key_values=past), AGENT_ACTION_SCHEMA)
+
+
+class CallLoggingModel:
+    """Wraps a model, recording the input width and cached length of each forward pass."""
+
+    def __init__(self, model):
+        self.model = model
+        self.calls = []
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+    def __call__(self, input_ids, past_key_values=None, **kwargs):
+        cached = past_key_values.get_seq_length() if past_key_values is not None else 0
+        self.calls.append((input_ids.shape[1], cached))
+        return self.model(input_ids=input_ids, past_key_values=past_key_values, **kwargs)
+
+
+@pytest.mark.parametrize('schema', SCHEMAS, ids=['agent_action', 'mixed'])
+def test_decoding_feeds_every_token_once(decoder, schema, monkeypatch):
+    model = CallLoggingModel(decoder.model)
+    monkeypatch.setattr(decoder, 'model', model)
+    prompt = decoder.tokenizer("Decide what to do next. Answer with JSON only.")["input_ids"]
+    torch.manual_seed(0)
+    value = decoder.generate(torch.tensor([prompt]), schema, max_string_tokens=6, max_number_tokens=4)
+
+    # The first pass processes the prompt with the JSON opening it forces, later passes
+    # only add the tokens after the cached ones
+    assert model.calls[0][0] > len(prompt) and model.calls[0][1] == 0
+    fed = 0
+    for width, cached in model.calls:
+        assert cached == fed
+        fed += width
+    assert len(model.calls) == decoder.forward_passes
+    validate(value, schema)
+
+
+PROMPTS = [
+    "Decide what to do next.",
+    "Decide what to do next. Answer with JSON only, 0123456789.",
+    "hello",
+]
+# Low enough that sampling picks the most likely token, so batched and single answers can be compared
+GREEDY = 1e-6
+
+
+def encode(decoder, prompt):
+    return decoder.tokenizer(prompt)["input_ids"]
+
+
+def test_batch_matches_single_prompts(decoder):
+    schemas = [SCHEMAS[1], AGENT_ACTION_SCHEMA, SCHEMAS[1]]
+    singles = [decoder.generate(torch.tensor([encode(decoder, prompt)]), schema, temperature=GREEDY,
+                                max_string_tokens=6, max_number_tokens=4)
+               for prompt, schema in zip(PROMPTS, schemas)]
+    batch = decoder.generate_batch([encode(decoder, prompt) for prompt in PROMPTS], schemas, temperature=GREEDY,
+                                   max_string_tokens=6, max_number_tokens=4)
+
+    assert batch == singles
+    for value, schema in zip(batch, schemas):
+        validate(value, schema)
+
+
+def test_batch_isolates_failures_and_keeps_order(decoder):
+    schemas = [AGENT_ACTION_SCHEMA, {"type": "array"}, SCHEMAS[1]]
+    values = decoder.generate_batch([encode(decoder, prompt) for prompt in PROMPTS], schemas, temperature=GREEDY,
+                                    max_string_tokens=6, max_number_tokens=4)
+
+    assert isinstance(values[1], ValueError)
+    validate(values[0], AGENT_ACTION_SCHEMA)
+    validate(values[2], SCHEMAS[1])
+    assert values[2] == decoder.generate(torch.tensor([encode(decoder, PROMPTS[2])]), SCHEMAS[1], temperature=GREEDY,
+                                         max_string_tokens=6, max_number_tokens=4)
+
+
+def test_batch_extends_a_shared_prefix_cache(decoder):
+    prefix = torch.tensor([encode(decoder, "Decide what to do")])
+    prompts = [encode(decoder, prompt) for prompt in PROMPTS[:2]]
+
+    def prefix_past():
+        with torch.no_grad():
+            return decoder.model(prefix, use_cache=True).past_key_values
+
+    singles = [decoder.generate(torch.tensor([ids]), AGENT_ACTION_SCHEMA, past_key_values=prefix_past(),
+                                temperature=GREEDY, max_string_tokens=6) for ids in prompts]
+    batch = decoder.generate_batch(prompts, [AGENT_ACTION_SCHEMA] * 2, past_key_values=prefix_past(),
+                                   temperature=GREEDY, max_string_tokens=6)
+    assert batch == singles
+
+
+def test_easy_llm_batch_returns_none_for_failed_prompts(decoder, monkeypatch):
+    from kudos.easy_llm import EasyLLM
+    from kudos.llm_backends import TransformersBackend
+
+    def load(llm):
+        llm._model, llm._tokenizer = decoder.model, decoder.tokenizer
+    monkeypatch.setattr(EasyLLM, '_load_model', load)
+    llm = EasyLLM('tiny')
+    prefix = "Decide what to do"
+    answers = llm.ask_questions_with_schema(PROMPTS, [AGENT_ACTION_SCHEMA, {"type": "array"}, SCHEMAS[1]],
+                                            max_new_tokens=6, prefix=prefix, batch_size=2)
+
+    assert answers[1] is None
+    validate(answers[0], AGENT_ACTION_SCHEMA)
+    validate(answers[2], SCHEMAS[1])
+
+    class Registry:
+        def get(self, name):
+            return llm
+    llm.clear_prefix_cache()
+    backend = TransformersBackend(Registry(), ['tiny'])
+    answers = backend.ask_batch(PROMPTS[:2], AGENT_ACTION_SCHEMA, max_new_tokens=6, prefix=prefix)
+    assert all(answer is not None for answer in answers)
+    assert list(llm._prefix_cache) == [prefix]
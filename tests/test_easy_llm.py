@@ -0,0 +1,104 @@
+from types import SimpleNamespace
+
+import pytest
+
+torch = pytest.importorskip('torch')
+transformers = pytest.importorskip('transformers')
+tokenizers = pytest.importorskip('tokenizers')
+
+from kudos.easy_llm import EasyLLM
+
+CORPUS = [
+    'Sure: {"action_type": "post", "message": "a } inside"} and then some more text STOP',
+    "Héllo wörld, naïve café. Stop here. END of the answer.",
+]
+
+
+@pytest.fixture(scope='module')
+def tokenizer():
+    tokenizer = tokenizers.Tokenizer(tokenizers.models.BPE())
+    tokenizer.pre_tokenizer = tokenizers.pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tokenizer.decoder = tokenizers.decoders.ByteLevel()
+    tokenizer.train_from_iterator(CORPUS * 20, tokenizers.trainers.BpeTrainer(
+        vocab_size=300, special_tokens=["<|endoftext|>"],
+        initial_alphabet=tokenizers.pre_tokenizers.ByteLevel.alphabet()))
+    tokenizer = transformers.PreTrainedTokenizerFast(tokenizer_object=tokenizer, eos_token="<|endoftext|>")
+    tokenizer.pad_token_id = tokenizer.eos_token_id
+    return tokenizer
+
+
+class ScriptedModel:
+    """Causal LM double that generates a fixed sequence of tokens, then end-of-sequence."""
+
+    def __init__(self, tokenizer, answer, **generation_options):
+        self.script = tokenizer.encode(answer, add_special_tokens=False) + [tokenizer.eos_token_id]
+        self.vocab_size = len(tokenizer)
+        self.generation_config = transformers.GenerationConfig(**generation_options)
+        self.seen = []
+
+    def __call__(self, input_ids, past_key_values=None, use_cache=True):
+        step = past_key_values or 0
+        self.seen.append(input_ids)
+        logits = torch.full((1, input_ids.shape[-1], self.vocab_size), -1e4)
+        logits[0, -1, self.script[min(step, len(self.script) - 1)]] = 0.0
+        return SimpleNamespace(logits=logits, past_key_values=step + 1)
+
+
+@pytest.fixture
+def make_llm(tokenizer, monkeypatch):
+    def make(answer, **generation_options):
+        def load(llm):
+            llm._tokenizer = tokenizer
+            llm._model = ScriptedModel(tokenizer, answer, **generation_options)
+        monkeypatch.setattr(EasyLLM, '_load_model', load)
+        return EasyLLM('scripted')
+    return make
+
+
+def test_stream_yields_the_whole_answer_in_pieces(make_llm):
+    answer = CORPUS[1]
+    llm = make_llm(answer)
+    pieces = list(llm.stream_question("Prompt", max_new_tokens=200))
+
+    assert "".join(pieces) == answer
+    assert len(pieces) > 1
+    assert llm.stream_stats()['stop_reasons'] == {'eos': 1}
+
+
+def test_stop_string_ends_the_answer_before_it(make_llm):
+    llm = make_llm(CORPUS[1])
+    pieces = list(llm.stream_question("Prompt", max_new_tokens=200, stop=["END", "Stop h"]))
+
+    # Text that may start a stop string is held back, so no piece contains part of it
+    assert "".join(pieces) == "Héllo wörld, naïve café. "
+    assert llm.stream_stats()['stop_reasons'] == {'stop': 1}
+
+
+def test_held_back_text_is_released_when_no_stop_string_follows(make_llm):
+    # The unseen characters are split over byte tokens, decoded once complete
+    llm = make_llm("café 日本 STEP STOP")
+    assert llm.ask_question("Prompt", stop=["STOP"]) == "café 日本 STEP "
+
+
+def test_json_end_stops_at_the_brace_closing_the_first_object(make_llm):
+    llm = make_llm(CORPUS[0])
+    answer = llm.ask_question("Prompt", max_new_tokens=200, stop_at_json_end=True)
+
+    assert answer == 'Sure: {"action_type": "post", "message": "a } inside"}'
+    assert llm.stream_stats()['stop_reasons'] == {'json_end': 1}
+
+
+def test_max_new_tokens_limits_the_answer(make_llm, tokenizer):
+    llm = make_llm(CORPUS[1])
+    answer = llm.ask_question("Prompt", max_new_tokens=5)
+
+    assert answer == tokenizer.decode(tokenizer.encode(CORPUS[1])[:5])
+    assert llm.stream_stats()['stop_reasons'] == {'length': 1}
+
+
+def test_generation_config_processors_are_applied(make_llm):
+    llm = make_llm("text", repetition_penalty=1.3, top_k=20, top_p=0.9, no_repeat_ngram_size=3)
+    processors = [type(processor).__name__ for processor in llm._logits_processors(1.4)]
+
+    assert processors == ['RepetitionPenaltyLogitsProcessor', 'NoRepeatNGramLogitsProcessor',
+                          'TemperatureLogitsWarper', 'TopKLogitsWarper', 'TopPLogitsWarper']
@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+from kudos.ai_game_round_runner import AIGameRoundRunner
+from kudos.experiment_runner import ExperimentRunner, expand_sweep, run_single
+
+GROUPS = {'A': 'group a', 'B': 'group b', 'C': 'group c'}
+
+SPEC = {
+    'base': {
+        'network_groups': GROUPS,
+        'network_biography': 'A small test network.',
+        'num_ai_players': 4,
+        'num_rounds': 2,
+        'min_delay': 0,
+        'max_delay': 0,
+        'backend': {'name': 'stub', 'field_choices': {'dominant_group': list(GROUPS)}},
+    },
+    'grid': {'actions_per_user': [1, 2]},
+    'seeds': [1, 2],
+}
+
+
+def outcome(rows):
+    return [{key: value for key, value in row.items() if key != 'duration_s'} for row in rows]
+
+
+def read_rows(path):
+    with open(path) as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def test_sweep_expands_grid_and_seeds():
+    spec = {'base': {'num_rounds': 2}, 'grid': {'network_groups': {'two': {'A': 'a', 'B': 'b'}, 'one': {'A': 'a'}}},
+            'seeds': [1, 2, 3]}
+    runs = expand_sweep(spec)
+    assert len(runs) == 6
+    assert runs[0]['labels'] == {'network_groups': 'two', 'seed': 1}
+    assert runs[0]['parameters'] == {'num_rounds': 2, 'network_groups': {'A': 'a', 'B': 'b'}, 'seed': 1}
+    assert len({run['run_id'] for run in runs}) == 6
+    assert [run['run_id'] for run in expand_sweep(spec)] == [run['run_id'] for run in runs]
+
+
+def test_rerun_only_runs_unfinished_runs(tmp_path):
+    runner = ExperimentRunner(SPEC, str(tmp_path), max_workers=2)
+    rows = runner.run()
+    assert [row['status'] for row in rows] == ['ok'] * 4
+    assert len(read_rows(runner.results_path)) == 4
+
+    assert runner.run() == rows
+    assert len(read_rows(runner.results_path)) == 4
+
+    # A failed run is run again, finished ones are not
+    failed = dict(rows[1], status='error')
+    with open(runner.results_path, 'w') as file:
+        for row in [rows[0], failed, rows[2], rows[3]]:
+            file.write(json.dumps(row) + "\n")
+    assert outcome(runner.run()) == outcome(rows)
+    assert [row['run_id'] for row in read_rows(runner.results_path)][4:] == [rows[1]['run_id']]
+
+
+def test_interrupted_run_resumes_from_its_checkpoint(tmp_path, monkeypatch):
+    run = expand_sweep(SPEC)[3]
+    expected = run_single(run, str(tmp_path / 'uninterrupted'))
+
+    apply_action = AIGameRoundRunner._apply_action
+    applied = [0]
+
+    def interrupted(self, *args):
+        if applied[0] == 10:
+            raise KeyboardInterrupt
+        applied[0] += 1
+        return apply_action(self, *args)
+
+    monkeypatch.setattr(AIGameRoundRunner, '_apply_action', interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        run_single(run, str(tmp_path / 'interrupted'))
+    assert (tmp_path / 'interrupted' / 'checkpoint.json').exists()
+    monkeypatch.undo()
+
+    resumed = run_single(run, str(tmp_path / 'interrupted'))
+    for key in ('status', 'total_posts', 'rounds', 'group_scores', 'winner'):
+        assert resumed[key] == expected[key]
@@ -0,0 +1,70 @@
+import json
+from datetime import datetime
+
+import pytest
+
+from kudos import instrumentation
+from kudos.game_rules import game_rules
+from kudos.game_simulator import GameSimulator
+from kudos.llm_backends import StubBackend
+
+GROUPS = {'A': 'group a', 'B': 'group b', 'C': 'group c'}
+NUM_PLAYERS = 4
+ACTIONS_PER_USER = 3
+
+
+@pytest.fixture(autouse=True)
+def clean_instrumentation():
+    instrumentation.disable()
+    instrumentation.reset()
+    yield
+    instrumentation.disable()
+    instrumentation.reset()
+
+
+def run(tmp_path, max_concurrency, num_rounds=2):
+    simulator = GameSimulator(GROUPS, 'A small test network.', game_rules, num_ai_players=NUM_PLAYERS,
+                              posts_file=str(tmp_path / f'posts_{max_concurrency}.json'),
+                              actions_per_user=ACTIONS_PER_USER,
+                              backend=StubBackend(seed=1, field_choices={'dominant_group': list(GROUPS)}),
+                              seed=3, start_time=datetime(2025, 3, 1))
+    return simulator.run_simulation(num_rounds=num_rounds, pause_between_rounds=False,
+                                    max_concurrency=max_concurrency)
+
+
+def read_trace(path):
+    with open(path) as file:
+        return [json.loads(line) for line in file]
+
+
+def test_disabled_instrumentation_is_a_no_op(tmp_path):
+    assert instrumentation.span("decode") is instrumentation.span("prefill")
+    instrumentation.count("tokens_generated", 5)
+    instrumentation.add_timing("decode", 1.0)
+    with instrumentation.collect('action', username='alice') as record:
+        record['action_type'] = 'post'
+
+    run(tmp_path, max_concurrency=1)
+    run(tmp_path, max_concurrency=3)
+    assert instrumentation.summary() == {'spans': {}, 'counters': {}}
+
+
+@pytest.mark.parametrize('max_concurrency', [1, 3])
+def test_trace_has_one_record_per_action(tmp_path, max_concurrency):
+    trace_path = tmp_path / 'trace.jsonl'
+    instrumentation.enable(str(trace_path))
+    run(tmp_path, max_concurrency)
+    instrumentation.disable()
+
+    records = read_trace(trace_path)
+    actions = [record for record in records if record['kind'] == 'action']
+    rounds = [record for record in records if record['kind'] == 'round']
+    assert [record['round'] for record in rounds] == [1, 2]
+    for round_number in (1, 2):
+        round_actions = [record for record in actions if record['round'] == round_number]
+        assert len(round_actions) == NUM_PLAYERS * ACTIONS_PER_USER
+        for record in round_actions:
+            assert 'action_type' in record and 'username' in record
+            assert 'agent_decision_s' in record['phases'] and 'apply_action_s' in record['phases']
+    summary = instrumentation.summary()
+    assert summary['spans']['apply_action']['count'] == len(actions)
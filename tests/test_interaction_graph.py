@@ -0,0 +1,109 @@
+import random
+
+import pytest
+
+from kudos.interaction_graph import InteractionGraph
+from kudos.misc import create_graph_and_get_centrality, get_mentions
+from kudos.scoring import UserScoreTracker
+
+nx = pytest.importorskip('networkx')
+
+USERS = [f'user{index}' for index in range(12)]
+
+
+def random_posts(seed, count=80):
+    rng = random.Random(seed)
+    posts = []
+    for post_id in range(1, count + 1):
+        # Some mentioned users never post, and some replies point to missing posts
+        mentions = ' '.join(f'@{rng.choice(USERS + ["lurker"])}' for _ in range(rng.choice([0, 0, 1, 2])))
+        posts.append({
+            'post_id': post_id,
+            'username': rng.choice(USERS[:8]) if post_id < 40 else rng.choice(USERS),
+            'message': f'message {post_id} {mentions}',
+            'reply_to': rng.choice([None, None, rng.randint(1, count + 5)]),
+        })
+    return posts
+
+
+def networkx_top(graph, k):
+    """Top-k users by degree centrality, ties in node order."""
+    centrality = nx.degree_centrality(graph)
+    return [user for user, _ in sorted(centrality.items(), key=lambda item: -item[1])][:k]
+
+
+def networkx_graph(posts, authors=None):
+    graph = nx.DiGraph()
+    if authors is None:
+        authors = {post['post_id']: post['username'] for post in posts}
+    for post in posts:
+        graph.add_node(post['username'])
+        if post['reply_to'] in authors:
+            graph.add_edge(post['username'], authors[post['reply_to']])
+        for mention in get_mentions(post):
+            graph.add_edge(post['username'], mention)
+    return graph
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_top_k_matches_networkx(seed):
+    posts = random_posts(seed)
+    graph = InteractionGraph.from_posts(posts)
+    reference = networkx_graph(posts)
+    for k in range(1, len(reference) + 2):
+        assert graph.top(k) == networkx_top(reference, k)
+    assert graph.degree_centrality() == pytest.approx(create_graph_and_get_centrality(posts))
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_top_k_matches_networkx_after_removals(seed):
+    rng = random.Random(seed)
+    posts = random_posts(seed)
+    authors = {post['post_id']: post['username'] for post in posts}
+    graph = InteractionGraph.from_posts(posts)
+    reference = networkx_graph(posts)
+
+    # Withdraw the interactions of some posts, as when posts are removed
+    kept = []
+    for post in posts:
+        if rng.random() < 0.3:
+            if post['reply_to'] in authors:
+                graph.remove_edge(post['username'], authors[post['reply_to']])
+            for mention in get_mentions(post):
+                graph.remove_edge(post['username'], mention)
+        else:
+            kept.append(post)
+    expected = nx.DiGraph()
+    expected.add_nodes_from(reference.nodes)
+    # Replies to withdrawn posts still count, only the withdrawn posts' own edges go
+    expected.add_edges_from(networkx_graph(kept, authors).edges)
+
+    for k in range(1, len(expected) + 2):
+        assert graph.top(k) == networkx_top(expected, k)
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_centrality_points_match_networkx_top_5_percent(seed):
+    rng = random.Random(seed)
+    users = [f'user{index}' for index in range(60)]
+    posts = []
+    for post_id in range(1, 301):
+        round = (post_id - 1) // 100 + 1
+        mentions = ' '.join(f'@{rng.choice(users)}' for _ in range(rng.choice([0, 0, 1, 2])))
+        posts.append({'post_id': post_id, 'username': rng.choice(users), 'round': round,
+                      'message': f'message {post_id} {mentions}',
+                      # Replies to earlier rounds do not count
+                      'reply_to': rng.choice([None, rng.randint(1, post_id)])})
+
+    tracker = UserScoreTracker()
+    # Posts are recorded as they are stored, before the end of their round
+    for post in posts[:250]:
+        tracker.record_post(post)
+    for round in (1, 2, 3):
+        round_posts = [post for post in posts if post['round'] == round]
+        centrality = create_graph_and_get_centrality(round_posts)
+        expected = sorted(centrality, key=centrality.get, reverse=True)[:max(1, len(centrality) // 20)]
+        tracker.centrality_points(round_posts, round)
+        assert [user for user, score in tracker.round_scores(round).items() if score == 2] == \
+            [user for user in tracker.users if user in expected]
+        assert len(expected) > 1
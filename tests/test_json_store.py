@@ -0,0 +1,70 @@
+import json
+import os
+
+from kudos.post_storage import JsonPostStore
+
+
+def new_post(username, round=1):
+    return {'message': f"hello from {username}", 'username': username, 'poster_group': 'A', 'likes': [],
+            'reply_to': None, 'post_id': None, 'is_removed': False, 'round': round, 'timestamp': None}
+
+
+def count_reads(store, monkeypatch):
+    reads = []
+    read_posts = store.read_posts
+
+    def counted():
+        reads.append(1)
+        return read_posts()
+
+    monkeypatch.setattr(store, 'read_posts', counted)
+    return reads
+
+
+def test_unchanged_file_is_read_from_the_cache(tmp_path, monkeypatch):
+    store = JsonPostStore(str(tmp_path / 'posts.json'))
+    for username, round in [('ann', 1), ('bob', 1), ('cat', 2)]:
+        store.add_post(new_post(username, round))
+    reads = count_reads(store, monkeypatch)
+
+    store.like_post(1, 'bob')
+    assert store.get_post(1)['likes'] == ['bob']
+    assert [post['post_id'] for post in store.get_posts_by_round(1)] == [1, 2]
+    assert [post['username'] for post in store.get_all_posts()] == ['ann', 'bob', 'cat']
+    assert store.get_post(9) is None
+    assert not reads
+
+
+def test_returned_posts_do_not_alias_the_cache(tmp_path):
+    store = JsonPostStore(str(tmp_path / 'posts.json'))
+    store.add_post(new_post('ann'))
+    store.get_post(1)['likes'].append('mallory')
+    store.get_all_posts()[0]['message'] = "changed"
+    assert store.get_post(1) == dict(new_post('ann'), post_id=1)
+
+
+def test_other_writers_changes_are_read(tmp_path, monkeypatch):
+    path = str(tmp_path / 'posts.json')
+    first, second = JsonPostStore(path), JsonPostStore(path)
+    first.add_post(new_post('ann'))
+    reads = count_reads(first, monkeypatch)
+
+    assert second.add_post(new_post('bob', 2))['post_id'] == 2
+    assert second.like_post(1, 'bob')
+    assert [post['likes'] for post in first.get_all_posts()] == [['bob'], []]
+    assert [post['username'] for post in first.get_posts_by_round(2)] == ['bob']
+    assert len(reads) == 1
+
+
+def test_files_replaced_outside_the_store_are_read(tmp_path):
+    path = str(tmp_path / 'posts.json')
+    store = JsonPostStore(path)
+    store.add_post(new_post('ann'))
+    with open(path, 'w') as file:
+        json.dump([dict(new_post('zed'), post_id=5)], file)
+    assert [post['username'] for post in store.get_all_posts()] == ['zed']
+    assert store.add_post(new_post('bob'))['post_id'] == 6
+
+    os.remove(path)
+    assert store.get_all_posts() == []
+    assert store.add_post(new_post('cat'))['post_id'] == 1
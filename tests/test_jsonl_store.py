@@ -0,0 +1,93 @@
+import json
+import shutil
+
+from kudos.post_storage import JsonlEventPostStore
+
+
+def new_post(username, round=1):
+    return {'message': f"hello from {username}", 'username': username, 'poster_group': 'A', 'likes': [],
+            'reply_to': None, 'post_id': None, 'is_removed': False, 'round': round, 'timestamp': None}
+
+
+def fill(store):
+    for username in ['ann', 'bob', 'cat']:
+        store.add_post(new_post(username))
+    store.like_post(1, 'bob')
+    store.like_post(1, 'cat')
+    store.remove_post(2)
+    store.set_moderation_status(3, 'approved')
+
+
+def test_reopened_store_matches_writer(tmp_path):
+    path = str(tmp_path / 'posts.jsonl')
+    store = JsonlEventPostStore(path, compact_every=4)
+    fill(store)
+    reopened = JsonlEventPostStore(path)
+    assert reopened.get_all_posts() == store.get_all_posts()
+    assert [post['likes'] for post in reopened.get_all_posts()] == [['bob', 'cat'], [], []]
+    assert reopened.get_all_posts()[1]['is_removed']
+
+
+def test_other_writers_appends_are_read(tmp_path):
+    path = str(tmp_path / 'posts.jsonl')
+    first, second = JsonlEventPostStore(path), JsonlEventPostStore(path)
+    first.add_post(new_post('ann'))
+    assert second.add_post(new_post('bob'))['post_id'] == 2
+    assert second.like_post(1, 'bob')
+    assert [post['likes'] for post in first.get_all_posts()] == [['bob'], []]
+
+
+def test_incomplete_trailing_line_is_ignored(tmp_path):
+    path = str(tmp_path / 'posts.jsonl')
+    fill(JsonlEventPostStore(path))
+    with open(path, 'a') as file:
+        file.write('{"event": "like_added", "post_id": 2, "user')
+    posts = JsonlEventPostStore(path).get_all_posts()
+    assert [post['likes'] for post in posts] == [['bob', 'cat'], [], []]
+
+
+def test_crash_between_snapshot_and_log_truncation(tmp_path):
+    path = str(tmp_path / 'posts.jsonl')
+    store = JsonlEventPostStore(path)
+    fill(store)
+    expected = store.get_all_posts()
+    shutil.copy(path, tmp_path / 'log.bak')
+    store.compact()
+    # As if the process died after replacing the snapshot but before truncating the log
+    shutil.copy(tmp_path / 'log.bak', path)
+
+    reopened = JsonlEventPostStore(path)
+    assert reopened.get_all_posts() == expected
+    assert reopened.get_posts_by_round(1) == expected
+    assert reopened.add_post(new_post('dan'))['post_id'] == 4
+    assert reopened.like_post(3, 'dan')
+    again = JsonlEventPostStore(path)
+    assert [post['likes'] for post in again.get_all_posts()] == [['bob', 'cat'], [], ['dan'], []]
+
+
+def test_events_carry_increasing_sequence_numbers(tmp_path):
+    path = str(tmp_path / 'posts.jsonl')
+    store = JsonlEventPostStore(path, compact_every=4)
+    fill(store)
+    with open(store.snapshot_path) as file:
+        snapshot_seq = json.load(file)['seq']
+    with open(path) as file:
+        sequence = [json.loads(line)['seq'] for line in file]
+    assert snapshot_seq == 4
+    assert sequence == [5, 6, 7]
+
+
+def test_rollback_to_watermark_taken_before_compaction(tmp_path):
+    path = str(tmp_path / 'posts.jsonl')
+    store = JsonlEventPostStore(path, compact_every=3)
+    fill(store)
+    watermark = store.watermark()
+    store.add_post(new_post('dan', round=2))
+    store.like_post(2, 'dan')
+    store.like_post(5, 'ann')
+
+    reopened = JsonlEventPostStore(path)
+    assert reopened.rollback_to(watermark) == 1
+    posts = JsonlEventPostStore(path).get_all_posts()
+    assert [post['post_id'] for post in posts] == [1, 2, 3]
+    assert [post['likes'] for post in posts] == [['bob', 'cat'], [], []]
@@ -0,0 +1,128 @@
+import pytest
+
+from kudos.model_registry import ModelRegistry, estimate_footprint, parse_memory_size
+
+
+class FakeModel:
+    def __init__(self, name, size, events):
+        self.name = name
+        self.size = size
+        self.events = events
+        self.loaded = True
+
+    def memory_footprint(self):
+        return self.size
+
+    def unload_model(self):
+        self.loaded = False
+        self.events.append(('unload', self.name))
+
+
+class FakeLoader:
+    """Loads models of known sizes, recording the resident bytes at each load."""
+
+    def __init__(self, sizes):
+        self.sizes = sizes
+        self.events = []
+        self.models = []
+
+    def resident(self):
+        return sum(model.size for model in self.models if model.loaded)
+
+    def __call__(self, name):
+        self.events.append(('load', name, self.resident()))
+        model = FakeModel(name, self.sizes[name], self.events)
+        self.models.append(model)
+        return model
+
+
+def test_parse_memory_size():
+    assert parse_memory_size("2GiB") == 2 * 2 ** 30
+    assert parse_memory_size("1.5 GB") == 1_500_000_000
+    assert parse_memory_size(123) == 123
+    assert parse_memory_size(None) is None
+    with pytest.raises(ValueError):
+        parse_memory_size("lots")
+
+
+def test_models_stay_resident_and_hits_are_counted():
+    loader = FakeLoader({'a': 10, 'b': 10})
+    registry = ModelRegistry(loader=loader)
+    first = registry.get('a')
+    assert registry.get('a') is first
+    registry.get('b')
+    assert registry.stats() == {'hits': 1, 'loads': 2, 'evictions': 0, 'resident': ['a', 'b'],
+                                'resident_bytes': 20, 'memory_budget': None}
+
+
+def test_least_recently_used_model_is_evicted():
+    loader = FakeLoader({'a': 10, 'b': 10, 'c': 10})
+    registry = ModelRegistry(memory_budget=25, loader=loader)
+    registry.get('a')
+    registry.get('b')
+    registry.get('a')
+    registry.get('c')
+    assert registry.resident_models() == ['a', 'c']
+    assert ('unload', 'b') in loader.events
+    assert registry.stats()['evictions'] == 1
+
+
+def test_room_is_made_before_loading_a_known_model():
+    loader = FakeLoader({'a': 10, 'b': 10, 'c': 10})
+    registry = ModelRegistry(memory_budget=20, loader=loader, footprints={'c': 10})
+    registry.warm_up(['a', 'b'])
+    registry.get('c')
+    # a was unloaded first, so the three models were never resident together
+    assert loader.events[-2:] == [('unload', 'a'), ('load', 'c', 10)]
+    assert max(resident for _, _, resident in (e for e in loader.events if e[0] == 'load')) <= 10
+
+
+def test_footprint_is_remembered_after_eviction():
+    loader = FakeLoader({'a': 15, 'b': 15})
+    registry = ModelRegistry(memory_budget=20, loader=loader)
+    registry.get('a')
+    registry.get('b')
+    # a's footprint is known from its first load, so b is unloaded before a is loaded again
+    registry.get('a')
+    assert loader.events[-2:] == [('unload', 'b'), ('load', 'a', 0)]
+    assert registry.stats()['evictions'] == 2
+
+
+def test_model_larger_than_budget_stays_loaded():
+    loader = FakeLoader({'big': 50, 'small': 5})
+    registry = ModelRegistry(memory_budget=20, loader=loader)
+    registry.get('small')
+    registry.get('big')
+    assert registry.resident_models() == ['big']
+
+
+def test_configure_evicts_down_to_new_budget():
+    loader = FakeLoader({'a': 10, 'b': 10})
+    registry = ModelRegistry(loader=loader)
+    registry.warm_up(['a', 'b'])
+    registry.configure(memory_budget=15)
+    assert registry.resident_models() == ['b']
+
+
+def test_shutdown_unloads_are_counted_as_evictions():
+    loader = FakeLoader({'a': 10, 'b': 10})
+    registry = ModelRegistry(loader=loader)
+    registry.warm_up(['a', 'b'])
+    registry.shutdown()
+    assert registry.resident_models() == []
+    assert not any(model.loaded for model in loader.models)
+    assert registry.stats()['evictions'] == 2
+    assert registry.stats()['resident_bytes'] == 0
+
+
+def test_estimate_footprint_from_weight_files(tmp_path):
+    (tmp_path / 'model.safetensors').write_bytes(b'x' * 300)
+    (tmp_path / 'config.json').write_text('{}')
+    assert estimate_footprint(str(tmp_path)) == 300
+    assert estimate_footprint('org/remote-model') is None
+
+    loader = FakeLoader({'a': 10, str(tmp_path): 300})
+    registry = ModelRegistry(memory_budget=305, loader=loader)
+    registry.get('a')
+    registry.get(str(tmp_path))
+    assert loader.events[-2:] == [('unload', 'a'), ('load', str(tmp_path), 0)]
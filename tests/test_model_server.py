@@ -0,0 +1,125 @@
+import os
+import stat
+import threading
+import time
+from multiprocessing import AuthenticationError
+
+import pytest
+
+from kudos.llm_backends import MODEL_SERVER_KEY_ENV, ModelServerBackend, StubBackend, model_server_key_path
+from kudos.model_server import ModelServer
+
+SCHEMA = {"type": "object", "properties": {"message": {"type": "string"}, "ok": {"type": "boolean"}}}
+
+
+class GatedBackend(StubBackend):
+    """Stub backend whose batches wait until the gate opens, recording their sizes."""
+
+    def __init__(self):
+        super().__init__(seed=1)
+        self.gate = threading.Event()
+        self.batch_sizes = []
+
+    def ask(self, question, schema, max_new_tokens=500, llm_name=None, prefix=None):
+        return self.ask_batch([question], [schema], max_new_tokens, llm_name, prefix)[0]
+
+    def ask_batch(self, questions, schemas, max_new_tokens=500, llm_name=None, prefix=None):
+        self.gate.wait()
+        self.batch_sizes.append(len(questions))
+        return super().ask_batch(questions, schemas, max_new_tokens, llm_name, prefix)
+
+
+@pytest.fixture
+def serve(tmp_path, monkeypatch):
+    monkeypatch.delenv(MODEL_SERVER_KEY_ENV, raising=False)
+    servers = []
+
+    def start(backend, **options):
+        server = ModelServer(str(tmp_path / 'server.sock'), backend, **options)
+        server.start()
+        servers.append(server)
+        return server
+    yield start
+    for server in servers:
+        if isinstance(server.backend, GatedBackend):
+            server.backend.gate.set()
+        server.close()
+
+
+def test_generated_key_is_private_and_required(serve):
+    server = serve(StubBackend(seed=1))
+    key_path = model_server_key_path(server.address)
+    assert stat.S_IMODE(os.stat(key_path).st_mode) == 0o600
+
+    client = ModelServerBackend(server.address)
+    assert client.ask("question", SCHEMA) == StubBackend(seed=1).ask("question", SCHEMA)
+
+    with pytest.raises(AuthenticationError):
+        ModelServerBackend(server.address, authkey=b"wrong key").ask("question", SCHEMA)
+
+    server.close()
+    assert not os.path.exists(key_path)
+
+
+def test_key_from_environment(serve, monkeypatch):
+    monkeypatch.setenv(MODEL_SERVER_KEY_ENV, "shared secret")
+    server = serve(StubBackend(seed=1))
+    assert not os.path.exists(model_server_key_path(server.address))
+    assert ModelServerBackend(server.address).ask("question", SCHEMA) is not None
+    with pytest.raises(AuthenticationError):
+        ModelServerBackend(server.address, authkey=b"wrong key").ask("question", SCHEMA)
+
+
+def test_concurrent_requests_are_batched(serve):
+    backend = GatedBackend()
+    server = serve(backend, max_batch_size=4, max_wait=0.5)
+    client = ModelServerBackend(server.address)
+    futures = [client._ask([f"question {index}"], [SCHEMA], 500, None, None, True) for index in range(8)]
+    deadline = time.monotonic() + 5
+    while server.stats()['queue_depth'] < 4 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    backend.gate.set()
+
+    reference = StubBackend(seed=1)
+    assert [future.result()[0] for future in futures] == [reference.ask(f"question {index}", SCHEMA)
+                                                          for index in range(8)]
+    assert backend.batch_sizes == [4, 4]
+    assert server.stats()['clients'][client.client_name]['questions'] == 8
+
+
+def test_full_queue_stops_reading_from_clients(serve):
+    backend = GatedBackend()
+    server = serve(backend, max_batch_size=1, max_wait=0, max_queue=2)
+    client = ModelServerBackend(server.address, max_in_flight=20)
+    futures = [client._ask([f"question {index}"], [SCHEMA], 500, None, None, True) for index in range(10)]
+    time.sleep(0.2)
+    # One request is being answered and two are queued; the rest wait unread on the socket
+    assert server.stats()['queue_depth'] == 2
+    assert not any(future.done() for future in futures)
+
+    backend.gate.set()
+    assert all(future.result(timeout=5)[0] is not None for future in futures)
+    assert server.stats()['max_queue_depth'] <= 2
+    assert backend.batch_sizes == [1] * 10
+
+
+def test_client_limits_requests_in_flight(serve):
+    backend = GatedBackend()
+    server = serve(backend, max_batch_size=1, max_wait=0)
+    client = ModelServerBackend(server.address, max_in_flight=2)
+    answers = []
+
+    def ask_more():
+        for index in range(3):
+            answers.append(client.ask(f"question {index}", SCHEMA))
+
+    thread = threading.Thread(target=ask_more)
+    futures = [client._ask([f"early {index}"], [SCHEMA], 500, None, None, True) for index in range(2)]
+    thread.start()
+    time.sleep(0.2)
+    assert not answers and len(client._pending) == 2
+
+    backend.gate.set()
+    thread.join(timeout=5)
+    assert len(answers) == 3
+    assert all(future.result()[0] is not None for future in futures)
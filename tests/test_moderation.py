@@ -0,0 +1,110 @@
+import json
+import os
+
+import pytest
+
+from kudos.moderation import EmbeddingClassifier, KeywordRules, ModerationCascade
+
+pytest.importorskip('sklearn')
+
+NETWORK = "A network about gardening."
+OTHER_NETWORK = "A network about motor racing."
+
+
+class CountingClassifier(EmbeddingClassifier):
+    """Embeds messages by counting marker words, so no sentence model is needed."""
+
+    def _encode(self, messages):
+        import numpy as np
+        return np.array([[m.count('good'), m.count('bad'), 1.0] for m in messages], dtype=float)
+
+
+def log_verdicts(cascade, count, description=NETWORK):
+    for index in range(count):
+        aligned = index % 3 != 0
+        cascade.record_llm_verdict(f"{'good ' * 3 if aligned else 'bad ' * 3}{index}", description, aligned)
+
+
+def test_rules_decide_before_the_classifier():
+    rules = KeywordRules(reject_patterns=[r'\bspam\b'], accept_patterns=[r'\btulips?\b'])
+    cascade = ModerationCascade(rules=rules)
+    assert cascade.classify("buy spam tulips", NETWORK) == (False, False)
+    assert cascade.classify("my tulips bloomed", NETWORK) == (True, False)
+    assert cascade.classify("something else", NETWORK) == (None, True)
+    assert cascade.stats()['rule_decisions'] == 2
+    assert cascade.stats()['escalations'] == 1
+
+
+def test_classifier_thresholds(tmp_path):
+    cascade = ModerationCascade(classifier=CountingClassifier(), verdict_log=str(tmp_path / 'verdicts.jsonl'),
+                                retrain_every=None, min_training_examples=30,
+                                accept_threshold=0.9, reject_threshold=0.1)
+    log_verdicts(cascade, 60)
+    assert cascade.train(NETWORK)
+    probability = cascade.classifier.probability_aligned("good good")
+    assert 0.1 < probability < 0.9
+    assert cascade.classify("good good good good", NETWORK) == (True, False)
+    assert cascade.classify("bad bad bad bad", NETWORK) == (False, False)
+    assert cascade.classify("good good", NETWORK) == (None, True)
+    assert cascade.stats()['classifier_decisions'] == 2
+
+
+def test_too_little_data_does_not_train(tmp_path):
+    cascade = ModerationCascade(classifier=CountingClassifier(), verdict_log=str(tmp_path / 'verdicts.jsonl'),
+                                retrain_every=None, min_training_examples=30)
+    log_verdicts(cascade, 20)
+    assert not cascade.train(NETWORK)
+    assert cascade.classify("good good good good", NETWORK) == (None, True)
+
+
+def test_audits_are_logged_and_compared(tmp_path):
+    log = tmp_path / 'verdicts.jsonl'
+    cascade = ModerationCascade(rules=KeywordRules(reject_patterns=['spam']), audit_rate=1.0, verdict_log=str(log))
+    verdict, escalate = cascade.classify("spam", NETWORK)
+    assert (verdict, escalate) == (False, True)
+    cascade.record_llm_verdict("spam", NETWORK, False, local_verdict=verdict)
+    cascade.record_llm_verdict("spam again", NETWORK, True, local_verdict=False)
+    cascade.record_llm_failure(local_verdict=False)
+
+    with open(log) as file:
+        entries = [json.loads(line) for line in file]
+    assert [(entry['message'], entry['verdict']) for entry in entries] == [("spam", False), ("spam again", True)]
+    assert len({entry['description_id'] for entry in entries}) == 1
+    stats = cascade.stats()
+    assert (stats['audits'], stats['audit_agreements'], stats['audit_failures']) == (1, 1, 1)
+
+
+def test_classifier_is_saved_and_reloaded(tmp_path):
+    log = str(tmp_path / 'verdicts.jsonl')
+    cascade = ModerationCascade(classifier=CountingClassifier(), verdict_log=log,
+                                retrain_every=20, min_training_examples=30)
+    log_verdicts(cascade, 60)
+    assert cascade.classifier.is_trained
+    assert os.path.exists(cascade.classifier_path)
+
+    reloaded = ModerationCascade(classifier=CountingClassifier(), verdict_log=log)
+    assert reloaded.classifier.is_trained
+    for message in ["good good good good", "bad bad bad bad"]:
+        assert reloaded.classify(message, NETWORK) == cascade.classify(message, NETWORK)
+
+
+def test_classifier_is_not_used_for_another_network(tmp_path):
+    log = str(tmp_path / 'verdicts.jsonl')
+    cascade = ModerationCascade(classifier=CountingClassifier(), verdict_log=log,
+                                retrain_every=20, min_training_examples=30)
+    log_verdicts(cascade, 60)
+    assert cascade.classify("bad bad bad bad", NETWORK) == (False, False)
+    assert cascade.classify("bad bad bad bad", OTHER_NETWORK) == (None, True)
+
+    reloaded = ModerationCascade(classifier=CountingClassifier(), verdict_log=log)
+    assert reloaded.classify("bad bad bad bad", OTHER_NETWORK) == (None, True)
+
+
+def test_classifier_of_another_embedding_model_is_rejected(tmp_path):
+    path = str(tmp_path / 'classifier.pkl')
+    trained = CountingClassifier()
+    trained.fit(["good good", "bad bad"] * 5, [True, False] * 5)
+    trained.save(path, description_id="x")
+    assert CountingClassifier().load(path) == {"description_id": "x"}
+    with pytest.raises(ValueError):
+        CountingClassifier(model_name="other-model").load(path)
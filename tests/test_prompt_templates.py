@@ -0,0 +1,92 @@
+import pytest
+
+from kudos import prompt_templates
+from kudos.prompt_templates import CHARS_PER_TOKEN, PromptTemplate, encode_prompt
+
+transformers = pytest.importorskip('transformers')
+tokenizers = pytest.importorskip('tokenizers')
+
+CORPUS = [
+    "Recent posts: ['alice: hello there', 'bob: nice weather today', 'carol: I agree']",
+    "You are an agent in a social network. Decide what to do next.",
+]
+
+
+@pytest.fixture(scope='module')
+def tokenizer():
+    tokenizer = tokenizers.Tokenizer(tokenizers.models.BPE())
+    tokenizer.pre_tokenizer = tokenizers.pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tokenizer.decoder = tokenizers.decoders.ByteLevel()
+    tokenizer.train_from_iterator(CORPUS * 20, tokenizers.trainers.BpeTrainer(
+        vocab_size=300, special_tokens=["<|endoftext|>"],
+        initial_alphabet=tokenizers.pre_tokenizers.ByteLevel.alphabet()))
+    return transformers.PreTrainedTokenizerFast(tokenizer_object=tokenizer, eos_token="<|endoftext|>")
+
+
+@pytest.fixture
+def budget_tokenizer(tokenizer):
+    prompt_templates.set_budget_tokenizer(tokenizer)
+    yield tokenizer
+    prompt_templates.set_budget_tokenizer(None)
+
+
+def make_template(max_tokens):
+    return PromptTemplate("Posts: {posts}\nYou are {name}. Decide what to do next.",
+                          prefix="You are an agent in a social network.\n",
+                          list_slots=["posts"], max_tokens=max_tokens)
+
+
+POSTS = [f"user{i}: post number {i} about the weather" for i in range(30)]
+
+
+def test_without_tokenizer_drops_oldest_items_by_character_estimate():
+    template = make_template(max_tokens=100)
+    prompt = template.render(posts=POSTS, name="alice")
+
+    kept = prompt.values["posts"]
+    assert kept == POSTS[-len(kept):]
+    assert 0 < len(kept) < len(POSTS)
+    assert len(prompt) <= 100 * CHARS_PER_TOKEN
+    assert str(prompt) == template._text({"posts": kept, "name": "alice"})
+
+
+def test_without_budget_keeps_every_item():
+    prompt = make_template(max_tokens=None).render(posts=POSTS, name="alice")
+    assert prompt.values["posts"] == POSTS
+
+
+def test_tokenizer_budget_counts_real_tokens(budget_tokenizer):
+    template = make_template(max_tokens=120)
+    prompt = template.render(posts=POSTS, name="alice")
+
+    kept = prompt.values["posts"]
+    ids = budget_tokenizer(str(prompt))["input_ids"]
+    assert kept == POSTS[-len(kept):]
+    assert len(ids) <= 120
+    # Keeping one more item would have exceeded the budget
+    longer = template._text({"posts": POSTS[-len(kept) - 1:], "name": "alice"})
+    assert len(budget_tokenizer(longer)["input_ids"]) > 120
+
+
+def test_token_ids_match_tokenizing_the_text(tokenizer, budget_tokenizer):
+    prompt = make_template(max_tokens=120).render(posts=POSTS, name="bob")
+    assert encode_prompt(tokenizer, prompt) == tokenizer(str(prompt))["input_ids"]
+    # Without a budget the ids are computed on request
+    unfitted = make_template(max_tokens=None).render(posts=POSTS[:3], name="bob")
+    assert unfitted.token_ids(tokenizer) == tokenizer(str(unfitted))["input_ids"]
+
+
+def test_suffix_refits_the_prompt(budget_tokenizer):
+    template = make_template(max_tokens=120)
+    prompt = template.render(posts=POSTS, name="alice")
+    suffix = " Answer with JSON only, then explain why in a few words."
+    extended = prompt + suffix
+
+    assert str(extended).endswith(suffix)
+    assert len(extended.values["posts"]) < len(prompt.values["posts"])
+    assert len(encode_prompt(budget_tokenizer, extended)) <= 120
+
+
+def test_render_requires_every_slot():
+    with pytest.raises(KeyError):
+        make_template(max_tokens=None).render(posts=[])
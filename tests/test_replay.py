@@ -0,0 +1,92 @@
+from datetime import datetime
+
+import pytest
+
+from kudos.game_rules import game_rules
+from kudos.game_simulator import GameSimulator
+from kudos.llm_backends import RecordingBackend, ReplayBackend, StubBackend
+
+NUM_ROUNDS = 3
+SCHEMA = {"type": "object", "properties": {"message": {"type": "string"}}}
+
+
+class FailingBackend(StubBackend):
+    """Stub backend failing every question containing "fail"."""
+
+    def ask(self, question, schema, max_new_tokens=500, llm_name=None, prefix=None):
+        if "fail" in question:
+            raise ValueError("no answer")
+        return super().ask(question, schema, max_new_tokens, llm_name, prefix)
+
+
+def new_simulator(posts_file, network_groups, backend, **options):
+    return GameSimulator(network_groups, 'A small test network.', game_rules, num_ai_players=5,
+                         posts_file=str(posts_file), backend=backend, seed=3, start_time=datetime(2025, 3, 1),
+                         **options)
+
+
+def posts(simulator):
+    return sorted(simulator.post_manager.get_all_posts(), key=lambda post: post['post_id'])
+
+
+def run(simulator, max_concurrency=1):
+    return simulator.run_simulation(num_rounds=NUM_ROUNDS, pause_between_rounds=False,
+                                    max_concurrency=max_concurrency)
+
+
+def record(tmp_path, questions):
+    log_path = str(tmp_path / 'requests.jsonl')
+    recorder = RecordingBackend(FailingBackend(seed=1), log_path)
+    answers = []
+    for question in questions:
+        try:
+            answers.append(recorder.ask(question, SCHEMA, llm_name="model"))
+        except ValueError:
+            answers.append(None)
+    return log_path, answers
+
+
+def test_key_mode_answers_requests_in_any_order(tmp_path):
+    log_path, answers = record(tmp_path, ["a", "b", "a", "c"])
+    replay = ReplayBackend(log_path, "key")
+    assert [replay.ask(question, SCHEMA, llm_name="model") for question in ["c", "a", "b", "a"]] == \
+        [answers[3], answers[0], answers[1], answers[2]]
+    assert replay.model_identity("model") == "stub-1:model"
+    with pytest.raises(KeyError):
+        replay.ask("a", SCHEMA, llm_name="model")
+    assert (replay.replayed, replay.missed) == (4, 1)
+
+
+def test_order_mode_rejects_diverging_requests(tmp_path):
+    log_path, answers = record(tmp_path, ["a", "b"])
+    replay = ReplayBackend(log_path, "order")
+    assert replay.ask("a", SCHEMA, llm_name="model") == answers[0]
+    with pytest.raises(ValueError):
+        replay.ask("c", SCHEMA, llm_name="model")
+
+
+def test_recorded_errors_are_replayed_and_misses_fall_back(tmp_path):
+    log_path, _ = record(tmp_path, ["fail here"])
+    fallback = StubBackend(seed=2)
+    replay = ReplayBackend(log_path, "key", fallback=fallback)
+    with pytest.raises(RuntimeError, match="no answer"):
+        replay.ask("fail here", SCHEMA, llm_name="model")
+    assert replay.ask("new", SCHEMA) == StubBackend(seed=2).ask("new", SCHEMA)
+    assert replay.missed == 1
+
+
+@pytest.mark.parametrize('mode', ['key', 'order'])
+@pytest.mark.parametrize('max_concurrency', [1, 3])
+def test_replay_reproduces_recorded_run(tmp_path, network_groups, make_backend, mode, max_concurrency):
+    log_path = str(tmp_path / 'requests.jsonl')
+    recorded = new_simulator(tmp_path / 'recorded.json', network_groups, RecordingBackend(make_backend(), log_path),
+                             deferred_moderation=True)
+    expected = run(recorded, max_concurrency)
+
+    replay = ReplayBackend(log_path, mode)
+    replayed = new_simulator(tmp_path / 'replayed.json', network_groups, replay, deferred_moderation=True)
+    assert run(replayed, max_concurrency) == expected
+    assert posts(replayed) == posts(recorded)
+    assert replay.missed == 0
+    with open(log_path) as file:
+        assert replay.replayed == sum(1 for line in file if line.strip())
@@ -0,0 +1,46 @@
+from datetime import datetime
+
+from kudos.game_rules import game_rules
+from kudos.game_simulator import GameSimulator
+from kudos.llm_backends import StubBackend
+
+GROUPS = {'A': 'group a', 'B': 'group b', 'C': 'group c'}
+
+
+class BatchLoggingBackend(StubBackend):
+    """Stub backend logging the size of each batch and the most questions outstanding at once."""
+
+    def __init__(self, **options):
+        super().__init__(seed=1, field_choices={'dominant_group': list(GROUPS)}, **options)
+        self.batch_sizes = []
+        self.lone_questions = 0
+
+    def ask(self, question, schema, max_new_tokens=500, llm_name=None, prefix=None):
+        self.lone_questions += 1
+        return super().ask(question, schema, max_new_tokens, llm_name, prefix)
+
+    def ask_batch(self, questions, schemas, max_new_tokens=500, llm_name=None, prefix=None):
+        self.batch_sizes.append(len(questions))
+        return super().ask_batch(questions, schemas, max_new_tokens, llm_name, prefix)
+
+
+def run(tmp_path, backend, max_concurrency):
+    simulator = GameSimulator(GROUPS, 'A small test network.', game_rules, num_ai_players=5,
+                              posts_file=str(tmp_path / f'posts_{max_concurrency}_{id(backend)}.json'),
+                              backend=backend, seed=3, start_time=datetime(2025, 3, 1))
+    return simulator.run_simulation(num_rounds=2, pause_between_rounds=False, max_concurrency=max_concurrency)
+
+
+def test_decisions_in_flight_are_batched(tmp_path):
+    backend = BatchLoggingBackend(latency=0.02)
+    run(tmp_path, backend, max_concurrency=4)
+
+    assert max(backend.batch_sizes) > 1
+    assert max(backend.batch_sizes) <= 4
+
+
+def test_outcome_does_not_depend_on_answer_timing(tmp_path):
+    # The stub draws latencies from each answer's own RNG, so only the timing differs
+    steady = BatchLoggingBackend(latency=(0.0, 0.0001))
+    jittery = BatchLoggingBackend(latency=(0.0, 0.02))
+    assert run(tmp_path, jittery, max_concurrency=4) == run(tmp_path, steady, max_concurrency=4)
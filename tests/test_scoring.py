@@ -0,0 +1,108 @@
+import random
+
+import pytest
+
+from kudos.scoring import UserScoreTracker
+
+
+class DictScoreTracker:
+    """The dict-of-dicts tracker the score matrix replaced, kept as reference."""
+
+    def __init__(self):
+        self.scores = {}
+
+    def add_user(self, user_id):
+        if user_id not in self.scores:
+            self.scores[user_id] = {}
+
+    def add_points(self, user_id, points, round):
+        self.scores[user_id][round] = self.scores[user_id].get(round, 0) + points
+
+    def initialize_round_scores(self, round):
+        for rounds in self.scores.values():
+            rounds.setdefault(round, 0)
+
+    def round_scores(self, round):
+        return {user: rounds.get(round, 0) for user, rounds in self.scores.items()}
+
+    def cumulative_scores(self):
+        return {user: sum(rounds.values()) for user, rounds in self.scores.items()}
+
+    def group_scores(self, user_groups, round=None):
+        values = self.cumulative_scores() if round is None else self.round_scores(round)
+        totals = {group: 0 for group in sorted(set(user_groups.values()))}
+        for user, group in user_groups.items():
+            totals[group] += values.get(user, 0)
+        return totals
+
+    def leaderboard(self, k=None, round=None):
+        values = self.cumulative_scores() if round is None else self.round_scores(round)
+        return sorted(values.items(), key=lambda item: -item[1])[:k]
+
+
+def play(seed, trackers, users=100, rounds=20, actions=2000):
+    # More users and rounds than the initial matrix holds, so it has to grow
+    rng = random.Random(seed)
+    names = [f"user{index}" for index in range(users)]
+    for action in range(actions):
+        round = action * rounds // actions
+        if rng.random() < 0.05:
+            for tracker in trackers:
+                tracker.initialize_round_scores(round)
+        user = rng.choice(names)
+        points = rng.choice([1, 1, 2, 3, -1])
+        for tracker in trackers:
+            tracker.add_user(user)
+            tracker.add_points(user, points, round)
+    return names
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_matrix_matches_dict_implementation(seed):
+    tracker, reference = UserScoreTracker(initial_users=4, initial_rounds=2), DictScoreTracker()
+    names = play(seed, [tracker, reference])
+    user_groups = {name: 'ABC'[index % 3] for index, name in enumerate(names)}
+
+    assert tracker.get_scores() == reference.scores
+    assert tracker.cumulative_scores() == reference.cumulative_scores()
+    assert tracker.group_scores(user_groups) == reference.group_scores(user_groups)
+    for round in (0, 7, 19, 25):
+        assert tracker.round_scores(round) == reference.round_scores(round)
+        assert tracker.group_scores(user_groups, round) == reference.group_scores(user_groups, round)
+        assert tracker.leaderboard(5, round) == reference.leaderboard(5, round)
+    for k in (None, 0, 1, 10, 100, 150):
+        assert tracker.leaderboard(k) == reference.leaderboard(k)
+
+
+def test_leaderboard_ties_keep_insertion_order():
+    tracker = UserScoreTracker()
+    for user, points in [('a', 1), ('b', 3), ('c', 3), ('d', 1), ('e', 3)]:
+        tracker.add_user(user)
+        tracker.add_points(user, points, 0)
+    assert tracker.leaderboard(2) == [('b', 3), ('c', 3)]
+    assert tracker.leaderboard(4) == [('b', 3), ('c', 3), ('e', 3), ('a', 1)]
+
+
+def test_group_scores_ignore_unknown_users():
+    tracker = UserScoreTracker()
+    tracker.add_user('a')
+    tracker.add_points('a', 2, 1)
+    assert tracker.group_scores({'a': 'A', 'ghost': 'B'}) == {'A': 2, 'B': 0}
+
+
+def test_state_round_trip():
+    tracker, reference = UserScoreTracker(initial_users=4, initial_rounds=2), DictScoreTracker()
+    play(0, [tracker, reference], users=10, rounds=5, actions=200)
+    restored = UserScoreTracker()
+    restored.load_state(tracker.get_state())
+    assert restored.get_scores() == reference.scores
+    assert restored.leaderboard() == tracker.leaderboard()
+
+
+def test_scores_view_is_read_only():
+    tracker = UserScoreTracker()
+    tracker.add_user('a')
+    tracker.add_points('a', 1, 0)
+    assert tracker.scores == {'a': {0: 1}}
+    with pytest.raises(TypeError):
+        tracker.scores['a'][0] = 5
@@ -0,0 +1,87 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from kudos import sim_clock
+from kudos.game_rules import game_rules
+from kudos.game_simulator import GameSimulator
+from kudos.llm_backends import StubBackend
+from kudos.sim_clock import EventScheduler, VirtualClock
+
+GROUPS = {'A': 'group a', 'B': 'group b', 'C': 'group c'}
+START = datetime(2025, 3, 1)
+
+
+def test_clock_only_moves_forward():
+    clock = VirtualClock(START)
+    clock.advance(1.5)
+    clock.advance_to(4.0)
+    assert clock.now() == START + timedelta(seconds=4)
+    with pytest.raises(ValueError):
+        clock.advance_to(3.0)
+
+    restored = VirtualClock()
+    restored.load_state(clock.get_state())
+    assert restored.now() == clock.now()
+
+
+def test_events_are_processed_in_time_order():
+    clock = VirtualClock(START)
+    events = EventScheduler(clock)
+    for elapsed, name in [(3.0, 'c'), (1.0, 'a'), (2.0, 'b1'), (2.0, 'b2'), (5.0, 'd')]:
+        events.schedule_at(elapsed, name)
+    order = []
+    while events:
+        order.append((events.pop(), clock.elapsed))
+    assert order == [('a', 1.0), ('b1', 2.0), ('b2', 2.0), ('c', 3.0), ('d', 5.0)]
+
+    # Events scheduled in the past run now, without moving the clock back
+    events.schedule_at(4.0, 'late')
+    events.schedule(0.5, 'next')
+    assert events.pop() == 'late' and clock.elapsed == 5.0
+    assert events.pop() == 'next' and clock.elapsed == 5.5
+
+
+def test_real_time_sleeps_for_the_simulated_gaps(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(sim_clock.time, 'sleep', sleeps.append)
+    events = EventScheduler(VirtualClock(START), real_time=True)
+    for elapsed in (0.5, 0.5, 2.0):
+        events.schedule_at(elapsed, elapsed)
+    while events:
+        events.pop()
+    assert sleeps == [0.5, 1.5]
+
+
+def simulate(tmp_path, name, max_concurrency=1):
+    simulator = GameSimulator(GROUPS, 'A small test network.', game_rules, num_ai_players=5,
+                              posts_file=str(tmp_path / f'{name}.json'),
+                              backend=StubBackend(seed=1, field_choices={'dominant_group': list(GROUPS)}),
+                              seed=3, start_time=START)
+    started = time.perf_counter()
+    simulator.run_simulation(num_rounds=2, min_delay=10, max_delay=20, pause_between_rounds=False,
+                             max_concurrency=max_concurrency)
+    return simulator, time.perf_counter() - started
+
+
+@pytest.mark.parametrize('max_concurrency', [1, 4])
+def test_posts_carry_simulated_timestamps_without_waiting(tmp_path, max_concurrency):
+    simulator, duration = simulate(tmp_path, 'posts', max_concurrency)
+    posts = sorted(simulator.post_manager.get_all_posts(), key=lambda post: post['post_id'])
+    timestamps = [datetime.fromisoformat(post['timestamp']) for post in posts]
+    assert posts
+    # Several minutes of simulated time take no wall-clock time
+    assert duration < 60
+    assert simulator.clock.elapsed > 300
+    assert timestamps == sorted(timestamps)
+    assert timestamps[0] >= START + timedelta(seconds=10)
+    assert timestamps[-1] <= simulator.clock.now()
+    # Every post comes from its own action, at least min_delay after the previous one
+    assert all(later - earlier >= timedelta(seconds=10) for earlier, later in zip(timestamps, timestamps[1:]))
+
+
+def test_action_times_do_not_depend_on_concurrency(tmp_path):
+    sequential, _ = simulate(tmp_path, 'sequential')
+    concurrent, _ = simulate(tmp_path, 'concurrent', max_concurrency=4)
+    assert concurrent.clock.now() == sequential.clock.now()
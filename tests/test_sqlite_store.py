@@ -0,0 +1,137 @@
+import json
+from datetime import datetime
+
+import pytest
+
+from kudos.game_rules import game_rules
+from kudos.game_simulator import GameSimulator
+from kudos.post_manager import PostManager
+from kudos.post_storage import SqlitePostStore, import_json_posts
+from kudos.sim_clock import VirtualClock
+
+ENGINES = ['posts.json', 'posts.jsonl', 'posts.db']
+
+
+def new_post(username, round=1, reply_to=None):
+    return {'message': f"hello from {username}", 'username': username, 'poster_group': 'A', 'likes': [],
+            'reply_to': reply_to, 'post_id': None, 'is_removed': False, 'round': round, 'timestamp': None}
+
+
+def open_manager(path):
+    # A tiny compaction interval makes the jsonl store go through its snapshots
+    options = {'compact_every': 3} if str(path).endswith('.jsonl') else {}
+    manager = PostManager(str(path), **options)
+    manager.clock = VirtualClock(datetime(2025, 1, 1))
+    return manager
+
+
+def exercise(path):
+    """Run the same operations against a store, returning everything observed."""
+    manager = open_manager(path)
+    seen = []
+    for index, username in enumerate(['ann', 'bob', 'cat', 'ann', 'dan']):
+        manager.clock.advance(1.5)
+        post = manager.add_post(f"post {index} @bob", username, 1, 'A', reply_to=index or None,
+                                moderation_status='pending' if index % 2 else None)
+        seen.append(('add', post['post_id']))
+    seen += [('like', manager.like_post(post_id, username))
+             for post_id, username in [(1, 'bob'), (1, 'cat'), (1, 'bob'), (2, 'ann'), (99, 'ann')]]
+    seen.append(('remove', manager.remove_post(3), manager.remove_post(99)))
+    seen.append(('moderate', manager.resolve_moderation(2, True), manager.resolve_moderation(4, False)))
+    watermark = manager.watermark()
+
+    manager.add_post("after the watermark", 'eve', 2, 'B')
+    manager.like_post(1, 'dan')
+    manager.like_post(6, 'ann')
+    manager.like_post(2, 'cat')
+    seen.append(('before rollback', manager.get_all_posts()))
+
+    # The watermark must survive reopening the store, e.g. when resuming
+    reopened = open_manager(path)
+    seen.append(('reopened', reopened.get_all_posts()))
+    seen.append(('rollback', reopened.rollback(watermark)))
+    reopened.clock.advance(60)
+    seen.append(('add after rollback', reopened.add_post("new", 'fay', 2, 'C')['post_id']))
+    reopened.like_post(5, 'fay')
+
+    final = open_manager(path)
+    seen += [
+        ('all', final.get_all_posts()),
+        ('round 1', final.get_posts_by_round(1)),
+        ('round 2', final.get_posts_by_round(2)),
+        ('post 1', final.get_post_by_id(1)),
+        ('missing', final.get_post_by_id(42)),
+    ]
+    return seen
+
+
+def test_storage_engines_are_equivalent(tmp_path):
+    observed = {engine: exercise(tmp_path / engine) for engine in ENGINES}
+    assert observed['posts.jsonl'] == observed['posts.json']
+    assert observed['posts.db'] == observed['posts.json']
+
+
+def test_rollback_undoes_later_posts_and_likes(tmp_path):
+    for engine in ENGINES:
+        all_posts = next(entry[1] for entry in exercise(tmp_path / engine) if entry[0] == 'all')
+        assert [post['post_id'] for post in all_posts] == [1, 2, 3, 4, 5, 6]
+        assert [post['likes'] for post in all_posts] == [['bob', 'cat'], ['ann'], [], [], ['fay'], []]
+
+
+def test_queries_use_the_indexes(tmp_path):
+    store = SqlitePostStore(str(tmp_path / 'posts.db'))
+    for username, round, reply_to in [('ann', 1, None), ('bob', 1, 1), ('ann', 2, 1), ('cat', 2, 3)]:
+        store.add_post(new_post(username, round, reply_to))
+    assert [post['post_id'] for post in store.get_posts_by_user('ann')] == [1, 3]
+    assert [post['post_id'] for post in store.get_replies(1)] == [2, 3]
+    assert [post['post_id'] for post in store.get_posts_by_round(2)] == [3, 4]
+    for column, index in [('round', 'idx_posts_round'), ('username', 'idx_posts_username'),
+                          ('reply_to', 'idx_posts_reply_to')]:
+        plan = store._conn.execute(f"EXPLAIN QUERY PLAN SELECT * FROM posts WHERE {column} = ?", (1,)).fetchall()
+        assert index in str(plan)
+    store.close()
+
+
+def test_connections_share_one_database(tmp_path):
+    path = str(tmp_path / 'posts.db')
+    first, second = SqlitePostStore(path), SqlitePostStore(path)
+    first.add_post(new_post('ann'))
+    assert second.add_post(new_post('bob'))['post_id'] == 2
+    assert second.like_post(1, 'bob')
+    assert not second.like_post(1, 'bob')
+    assert not second.like_post(9, 'bob')
+    assert [post['likes'] for post in first.get_all_posts()] == [['bob'], []]
+    first.close()
+    second.close()
+
+
+def test_json_posts_are_imported_with_their_ids(tmp_path):
+    json_path = tmp_path / 'posts.json'
+    posts = [dict(new_post('ann'), post_id=4, likes=['bob', 'cat'], moderation_status='approved'),
+             dict(new_post('bob', reply_to=4), post_id=7)]
+    json_path.write_text(json.dumps(posts))
+    assert import_json_posts(str(json_path), str(tmp_path / 'posts.db')) == 2
+    store = SqlitePostStore(str(tmp_path / 'posts.db'))
+    assert store.get_all_posts() == posts
+    assert store.add_post(new_post('cat'))['post_id'] == 8
+    store.close()
+
+
+def snapshot(simulator):
+    """Return the posts of a simulation in a form comparable across storage engines."""
+    return sorted((post['post_id'], post['username'], post['message'], post['likes'], post['reply_to'],
+                   post['is_removed'], post['round'], post['timestamp'], post.get('moderation_status'))
+                  for post in simulator.post_manager.get_all_posts())
+
+
+@pytest.mark.parametrize('max_concurrency', [1, 3])
+def test_simulation_results_match_across_storage(tmp_path, network_groups, make_backend, max_concurrency):
+    outcomes = []
+    for engine in ENGINES:
+        simulator = GameSimulator(network_groups, 'A small test network.', game_rules, num_ai_players=5,
+                                  posts_file=str(tmp_path / engine), backend=make_backend(), seed=3,
+                                  start_time=datetime(2025, 3, 1), deferred_moderation=True, moderation_batch_size=4)
+        results = simulator.run_simulation(num_rounds=3, pause_between_rounds=False, max_concurrency=max_concurrency)
+        outcomes.append((results, snapshot(simulator)))
+    assert outcomes[1] == outcomes[0]
+    assert outcomes[2] == outcomes[0]
@@ -0,0 +1,77 @@
+import os
+
+from kudos.llm_backends import StubBackend
+from kudos.posting_interface import PostingInterface
+from kudos.verdict_cache import VerdictCache
+
+NETWORK = "A network about gardening."
+
+
+def entry_paths(cache):
+    return sorted(os.path.join(shard.path, entry.name)
+                  for shard in os.scandir(cache.cache_dir) if shard.is_dir()
+                  for entry in os.scandir(shard.path) if entry.name.endswith('.json'))
+
+
+def test_miss_then_hit(tmp_path):
+    cache = VerdictCache(str(tmp_path))
+    key = VerdictCache.make_key("my tulips bloomed", NETWORK, "model", 1)
+    assert cache.get(key) is None
+    cache.put(key, False, model="model")
+    assert cache.get(key) is False
+    assert VerdictCache(str(tmp_path)).get(key) is False
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['writes']) == (1, 1, 1)
+    assert stats['hit_rate'] == 0.5
+
+
+def test_key_covers_every_field():
+    key = VerdictCache.make_key("message", NETWORK, "model", 1)
+    assert VerdictCache.make_key("message", NETWORK, "model", 1) == key
+    assert VerdictCache.make_key("other message", NETWORK, "model", 1) != key
+    assert VerdictCache.make_key("message", "A network about cars.", "model", 1) != key
+    assert VerdictCache.make_key("message", NETWORK, "other model", 1) != key
+    assert VerdictCache.make_key("message", NETWORK, "model", 2) != key
+
+
+def test_least_recently_used_verdicts_are_evicted(tmp_path):
+    cache = VerdictCache(str(tmp_path), max_entries=3, eviction_check_interval=1000)
+    keys = [VerdictCache.make_key(f"post {index}", NETWORK, "model", 1) for index in range(5)]
+    for age, key in enumerate(keys):
+        cache.put(key, True)
+        # Spread the mtimes so the order does not depend on the filesystem's timestamp resolution
+        os.utime(cache._path(key), (1000 + age, 1000 + age))
+    cache.get(keys[0])
+
+    assert cache.evict() == 2
+    assert len(entry_paths(cache)) == 3
+    assert cache.get(keys[0]) is True
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[2]) is None
+    assert cache.stats()['evictions'] == 2
+
+
+def test_eviction_runs_every_check_interval(tmp_path):
+    cache = VerdictCache(str(tmp_path), max_entries=2, eviction_check_interval=4)
+    for index in range(3):
+        cache.put(VerdictCache.make_key(f"post {index}", NETWORK, "model", 1), True)
+    assert len(entry_paths(cache)) == 3
+    cache.put(VerdictCache.make_key("post 3", NETWORK, "model", 1), True)
+    assert len(entry_paths(cache)) == 2
+
+
+def test_cached_verdicts_skip_the_llm(tmp_path):
+    backend = StubBackend(seed=1)
+    cache = VerdictCache(str(tmp_path))
+    interface = PostingInterface(None, NETWORK, None, None, verdict_cache=cache, backend=backend)
+    verdict = interface.check_post_aligns_with_description("my tulips bloomed", NETWORK)
+    calls = sum(backend.get_state()['call_counts'].values())
+
+    assert interface.check_post_aligns_with_description("my tulips bloomed", NETWORK) == verdict
+    assert sum(backend.get_state()['call_counts'].values()) == calls == 1
+    assert cache.stats()['hits'] == 1
+
+    # Another backend seed is another model, so its verdicts are cached separately
+    other = PostingInterface(None, NETWORK, None, None, verdict_cache=cache, backend=StubBackend(seed=2))
+    other.check_post_aligns_with_description("my tulips bloomed", NETWORK)
+    assert cache.stats()['misses'] == 2